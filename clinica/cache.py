@@ -0,0 +1,139 @@
+# clinica/cache.py
+
+# Bloque de Importaciones
+# ======================================================================
+import hashlib # Claves de caché de largo fijo a partir de la URL o el SQL
+import time # Las versiones son marcas de tiempo en nanosegundos
+from django.conf import settings
+from django.core.checks import Tags, Warning, register # Aviso de 'check --deploy' sin caché compartida
+from django.core.cache import caches # Backend configurable (settings.CACHES)
+from django.core.cache.backends.dummy import DummyCache # No guarda nada
+from django.core.cache.backends.locmem import LocMemCache # Una copia por proceso
+from django.db import transaction
+from django.forms.models import ModelChoiceField, ModelChoiceIterator, ModelChoiceIteratorValue
+from .routers import leer_del_primario
+
+# ======================================================================
+# VERSIONES POR MODELO Y CACHÉ DE DATOS DE REFERENCIA
+# Cada modelo tiene una versión en la caché: la marca de tiempo (ns) de su
+# última escritura. Las señales post_save/post_delete (signals.py) la
+# renuevan y con ella cambian las claves de las respuestas en caché
+# (Departamento, Especialidad, Medicamento) y los ETag de la API; las
+# entradas anteriores dejan de leerse y expiran solas. La invalidación solo
+# alcanza a todos los procesos con un backend compartido (Redis, Memcached):
+# con LocMemCache cada worker tiene sus propias versiones y no se entera de
+# las escrituras que atienden los demás (ver cache_compartida()).
+# ======================================================================
+
+def cache_clinica():
+    """Backend de caché de la aplicación (alias settings.CLINICA_CACHE)."""
+    return caches[getattr(settings, 'CLINICA_CACHE', 'default')]
+
+def cache_compartida():
+    """
+    True si todos los procesos leen las mismas versiones. Con LocMemCache (por
+    proceso) o DummyCache (no guarda nada) un worker seguiría respondiendo 304
+    o datos en caché después de una escritura atendida por otro, por lo que
+    quienes dependen de las versiones se desactivan. settings.CLINICA_CACHE_COMPARTIDA
+    fuerza el resultado (ej: True con un único proceso).
+    """
+    compartida = getattr(settings, 'CLINICA_CACHE_COMPARTIDA', None)
+    if compartida is not None:
+        return compartida
+    return not isinstance(cache_clinica(), (LocMemCache, DummyCache))
+
+@register(Tags.caches, deploy=True)
+def verificar_cache_compartida(app_configs, **kwargs):
+    """'manage.py check --deploy': sin backend compartido se desactivan los ETag y la caché de respuestas."""
+    if cache_compartida():
+        return []
+    return [Warning(
+        f"settings.CLINICA_CACHE ('{getattr(settings, 'CLINICA_CACHE', 'default')}') no es compartido entre procesos: "
+        'los ETag/304 y las respuestas en caché quedan desactivados.',
+        hint='Con varios workers configure Redis o Memcached (CLINICA_CACHE_BACKEND / CLINICA_CACHE_LOCATION).',
+        id='clinica.W001',
+    )]
+
+def _clave_version(modelo):
+    return f'clinica:version:{modelo._meta.label_lower}'
+
+def versiones_modelos(modelos):
+    """Versión actual de cada modelo, leídas con un solo get_many()."""
+    cache = cache_clinica()
+    claves = [_clave_version(modelo) for modelo in modelos]
+    versiones = cache.get_many(claves)
+    for clave in claves:
+        if clave not in versiones:
+            # Sin versión (primera lectura o desalojada): se parte de la hora actual,
+            # distinta de cualquier versión con que se guardaron respuestas antes
+            cache.add(clave, time.time_ns(), timeout=None)
+            versiones[clave] = cache.get(clave)
+    return [versiones[clave] for clave in claves]
+
+def _incrementar_version(modelo):
+    cache = cache_clinica()
+    clave = _clave_version(modelo)
+    # Marca de tiempo actual, siempre mayor que la anterior (sirve como Last-Modified)
+    cache.set(clave, max(time.time_ns(), (cache.get(clave) or 0) + 1), timeout=None)
+
+def invalidar_modelo(modelo):
+    """
+    Invalida las respuestas y opciones que dependen de 'modelo'. Se incrementa
+    la versión de inmediato y otra vez al confirmar la transacción: una lectura
+    concurrente que guardó datos aún no confirmados queda descartada.
+    """
+    _incrementar_version(modelo)
+    transaction.on_commit(lambda: _incrementar_version(modelo))
+
+def clave_respuesta(prefijo, modelos, ruta):
+    """
+    Clave de una respuesta: vista, versiones de sus dependencias y URL
+    absoluta (esquema y host incluidos: los enlaces 'next'/'previous' guardados
+    en la respuesta son absolutos), con filtros y cursor.
+    """
+    versiones = '.'.join(str(version) for version in versiones_modelos(modelos))
+    return f'clinica:respuesta:{prefijo}:{versiones}:{hashlib.md5(ruta.encode()).hexdigest()}'
+
+# ======================================================================
+# OPCIONES DE LOS SELECTORES DE FK EN CACHÉ
+# Los <select> de Especialidad y Departamento listan la tabla completa en
+# cada formulario; las opciones (pk, texto) se guardan en la caché con la
+# misma versión del modelo (solo con una caché compartida, ver cache_compartida()).
+# ======================================================================
+
+class OpcionesEnCacheIterator(ModelChoiceIterator):
+    """ModelChoiceIterator que lee las opciones de la caché en lugar de recorrer el queryset."""
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for pk, texto in self.opciones():
+            yield (ModelChoiceIteratorValue(pk, None), texto)
+
+    def __len__(self):
+        return len(self.opciones()) + (1 if self.field.empty_label is not None else 0)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.opciones())
+
+    def opciones(self):
+        if hasattr(self, '_opciones'): # Un mismo render pide las opciones varias veces
+            return self._opciones
+        queryset = self.queryset
+        if not cache_compartida(): # Otro worker pudo cambiar la tabla sin renovar la versión de este proceso
+            self._opciones = [(obj.pk, self.field.label_from_instance(obj)) for obj in queryset]
+            return self._opciones
+        (version,) = versiones_modelos([queryset.model])
+        sql = hashlib.md5(str(queryset.query).encode()).hexdigest() # Querysets distintos, claves distintas
+        clave = f'clinica:opciones:{queryset.model._meta.label_lower}:{version}:{sql}'
+        cache = cache_clinica()
+        opciones = cache.get(clave)
+        if opciones is None:
+            with leer_del_primario(): # La caché es compartida: no se llena desde una réplica atrasada
+                opciones = [(obj.pk, self.field.label_from_instance(obj)) for obj in queryset]
+            cache.set(clave, opciones, getattr(settings, 'CLINICA_CACHE_SEGUNDOS', 300))
+        self._opciones = opciones
+        return opciones
+
+class ReferenciaCacheadaChoiceField(ModelChoiceField):
+    """ModelChoiceField cuyas opciones salen de la caché (la validación sigue consultando la base de datos)."""
+    iterator = OpcionesEnCacheIterator
@@ -0,0 +1,84 @@
+# clinica/exportacion.py
+
+# Bloque de Importaciones
+# ======================================================================
+import csv # Escritura de filas CSV con el escapado estándar
+import json # Serialización de cada fila NDJSON
+from django.core.serializers.json import DjangoJSONEncoder # Fechas, decimales y UUID a JSON
+from django.http import StreamingHttpResponse # La respuesta se envía a medida que se generan las filas
+
+# ======================================================================
+# EXPORTACIÓN EN STREAMING (CSV / NDJSON)
+# Las filas se leen con un cursor del lado del servidor (QuerySet.iterator)
+# en bloques de TAMANO_BLOQUE y se escriben apenas se producen, por lo que
+# la memoria usada no depende del tamaño de la exportación.
+# ======================================================================
+
+TAMANO_BLOQUE = 2000 # Filas que trae cada FETCH del cursor del servidor
+
+FORMATOS_EXPORTACION = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: write() retorna la línea en lugar de guardarla."""
+    def write(self, valor):
+        return valor
+
+def filas_csv(encabezados, filas):
+    """Genera el encabezado y luego una línea CSV por fila."""
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(encabezados)
+    for fila in filas:
+        yield escritor.writerow(fila)
+
+def filas_ndjson(encabezados, filas):
+    """Genera un objeto JSON por línea (NDJSON)."""
+    for fila in filas:
+        yield json.dumps(dict(zip(encabezados, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+async def afilas_csv(encabezados, filas):
+    """filas_csv() sobre un iterador asíncrono (QuerySet.aiterator)."""
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow(encabezados)
+    async for fila in filas:
+        yield escritor.writerow(fila)
+
+async def afilas_ndjson(encabezados, filas):
+    """filas_ndjson() sobre un iterador asíncrono (QuerySet.aiterator)."""
+    async for fila in filas:
+        yield json.dumps(dict(zip(encabezados, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+def _respuesta(contenido, formato, nombre_archivo):
+    response = StreamingHttpResponse(contenido, content_type=FORMATOS_EXPORTACION[formato])
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}.{formato}"'
+    return response
+
+def respuesta_exportacion(queryset, columnas, formato, nombre_archivo):
+    """
+    StreamingHttpResponse con las 'columnas' del queryset, una lista de pares
+    (encabezado, lookup del ORM). values_list() resuelve los lookups con JOIN
+    ('paciente__nombre') y evita construir instancias de modelo por fila.
+    """
+    encabezados = [encabezado for encabezado, _ in columnas]
+    filas = queryset.values_list(*[lookup for _, lookup in columnas]).iterator(chunk_size=TAMANO_BLOQUE)
+    generador = filas_csv if formato == 'csv' else filas_ndjson
+    return _respuesta(generador(encabezados, filas), formato, nombre_archivo)
+
+def respuesta_exportacion_asincrona(queryset, columnas, formato, nombre_archivo):
+    """
+    Igual que respuesta_exportacion(), pero el contenido es un iterador
+    asíncrono: bajo ASGI el envío de cada bloque no ocupa un hilo mientras
+    espera al cliente o a la base de datos.
+    """
+    encabezados = [encabezado for encabezado, _ in columnas]
+    lookups = [lookup for _, lookup in columnas]
+    generador = afilas_csv if formato == 'csv' else afilas_ndjson
+    return _respuesta(generador(encabezados, _tuplas(queryset.values(*lookups), lookups)), formato, nombre_archivo)
+
+async def _tuplas(queryset, lookups):
+    # values() y no values_list(): en Django 5.2 values_list().aiterator() ejecuta
+    # la consulta al crearse, dentro del event loop (SynchronousOnlyOperation)
+    async for fila in queryset.aiterator(chunk_size=TAMANO_BLOQUE):
+        yield [fila[lookup] for lookup in lookups]
@@ -1,9 +1,16 @@
 # Bloque de Importaciones y Dependencias
 # ======================================================================
 import django_filters # Se importa la librería principal para crear filtros dinámicos basados en modelos.
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity # Texto completo y trigramas
+from django.db.models import F, FloatField, Q
+from django.db.models.functions import Cast, Greatest, Upper
+from rest_framework.exceptions import ValidationError # ?ordering= inválido en la API: respuesta 400
+from rest_framework.filters import BaseFilterBackend # Backend de ordenamiento compartido por los ViewSets
+from .cache import ReferenciaCacheadaChoiceField # Opciones de los selectores de datos de referencia en caché
+from .widgets import AutocompletarSelect # Selector de FK que carga las opciones bajo demanda
 from .models import (
     Departamento, Especialidad, Paciente, Medico, Consulta_Medica,
-    Tratamiento, Medicamento, Receta_Medica
+    Tratamiento, Medicamento, Receta_Medica, CONFIG_BUSQUEDA
 ) # Se importan todos los modelos que serán utilizados como fuente de datos para los filtros.
 
 # ======================================================================
@@ -12,6 +19,62 @@ from .models import (
 # el QuerySet de un modelo específico mediante la URL (parámetros GET).
 # ======================================================================
 
+# ----------------- Selectores de datos de referencia -----------------
+class ReferenciaCacheadaFilter(django_filters.ModelChoiceFilter):
+    """ModelChoiceFilter cuyas opciones (Departamento, Especialidad) se leen de la caché."""
+    field_class = ReferenciaCacheadaChoiceField
+
+# ----------------- Búsqueda aproximada por trigramas -----------------
+def busqueda_trigramas(queryset, value, campos):
+    """
+    Filtra por similitud de trigramas (pg_trgm) sobre UPPER(campo) en cualquiera
+    de los 'campos' y ordena por la mejor similitud (la mayor primero).
+    Las condiciones 'UPPER(campo) %> valor' usan los índices GIN *_trgm del modelo.
+    """
+    valor = value.strip().upper()
+    if not valor:
+        return queryset
+    anotaciones = {f'{campo}_upper': Upper(campo) for campo in campos}
+    condicion = Q()
+    for campo in campos:
+        condicion |= Q(**{f'{campo}_upper__trigram_word_similar': valor})
+    # word_similarity() retorna 'real'; se convierte a double precision para que el
+    # valor leído en Python sea exacto y sirva como posición del cursor de la API
+    similitud = Cast(
+        Greatest(*[TrigramWordSimilarity(valor, Upper(campo)) for campo in campos]),
+        output_field=FloatField(),
+    )
+    return (
+        queryset.annotate(**anotaciones)
+        .filter(condicion)
+        .annotate(similitud=similitud)
+        .order_by('-similitud', 'id') # Desempate por ID: orden estable para paginar
+    )
+
+# ----------------- Búsqueda de texto completo -----------------
+def busqueda_texto_completo(queryset, value, campo_vector):
+    """
+    Filtra por coincidencia de texto completo ('campo_vector' @@ consulta) con
+    la sintaxis de websearch_to_tsquery ("frase", -palabra, or) y ordena por
+    relevancia (ts_rank), la mayor primero. La condición usa el índice GIN
+    del tsvector almacenado; los demás filtros del FilterSet (ej: rango de
+    fechas) se combinan con el mismo WHERE. Ordenar por relevancia calcula
+    ts_rank de todas las coincidencias: con un término muy frecuente conviene
+    acotar por fecha o pedir ?ordering=-fecha_consulta, que recorre el índice
+    por fecha y se detiene al completar la página.
+    """
+    texto = value.strip()
+    if not texto:
+        return queryset
+    consulta = SearchQuery(texto, config=CONFIG_BUSQUEDA, search_type='websearch')
+    # ts_rank() retorna 'real': igual que en busqueda_trigramas, se pasa a double precision
+    relevancia = Cast(SearchRank(F(campo_vector), consulta), output_field=FloatField())
+    return (
+        queryset.filter(**{campo_vector: consulta})
+        .annotate(relevancia=relevancia)
+        .order_by('-relevancia', '-id') # Desempate por ID: orden estable para paginar
+    )
+
 # ----------------- 1. Departamento Filter -----------------
 class DepartamentoFilter(django_filters.FilterSet):
     """
@@ -31,6 +94,7 @@ class EspecialidadFilter(django_filters.FilterSet):
     y ofrece un selector de lista para filtrar por el Departamento asociado (FK).
     """
     nombre = django_filters.CharFilter(lookup_expr='icontains', label='Buscar por Nombre')
+    departamento = ReferenciaCacheadaFilter(queryset=Departamento.objects.all())
     
     class Meta:
         model = Especialidad
@@ -41,42 +105,65 @@ class PacienteFilter(django_filters.FilterSet):
     """
     Define el filtro para Paciente. Permite la búsqueda de texto por 'nombre' y 'rut'.
     También incluye el campo booleano 'activo' para filtrar por el estado del paciente.
+    'buscar' hace una búsqueda aproximada (tolerante a errores de tipeo) sobre
+    nombre, apellido y RUT, ordenada por similitud.
     """
     nombre = django_filters.CharFilter(lookup_expr='icontains', label='Nombre/Apellido')
     rut = django_filters.CharFilter(lookup_expr='icontains', label='RUT')
+    buscar = django_filters.CharFilter(method='filtrar_buscar', label='Búsqueda aproximada')
 
     class Meta:
         model = Paciente
         fields = ['rut', 'nombre', 'activo']
 
+    def filtrar_buscar(self, queryset, name, value):
+        return busqueda_trigramas(queryset, value, ['nombre', 'apellido', 'rut'])
+
 # ----------------- 4. Medico Filter -----------------
 class MedicoFilter(django_filters.FilterSet):
     """
     Define el filtro para Médico. Permite buscar por texto ('nombre', 'rut') y
     filtrar por la 'especialidad' asociada y el estado 'activo' (booleano).
+    'buscar' funciona igual que en PacienteFilter.
     """
     nombre = django_filters.CharFilter(lookup_expr='icontains', label='Nombre/Apellido')
     rut = django_filters.CharFilter(lookup_expr='icontains', label='RUT')
+    buscar = django_filters.CharFilter(method='filtrar_buscar', label='Búsqueda aproximada')
+    especialidad = ReferenciaCacheadaFilter(queryset=Especialidad.objects.all())
 
     class Meta:
         model = Medico
         fields = ['rut', 'nombre', 'especialidad', 'activo'] 
 
+    def filtrar_buscar(self, queryset, name, value):
+        return busqueda_trigramas(queryset, value, ['nombre', 'apellido', 'rut'])
+
 # ----------------- 5. Consulta_Medica Filter -----------------
 class ConsultaMedicaFilter(django_filters.FilterSet):
     """
     Define el filtro para Consulta_Medica. Incluye filtros de rango temporal
     ('fecha_consulta_min' y 'fecha_consulta_max') y selectores para las
     llaves foráneas ('paciente', 'medico') y el campo de opciones ('estado').
+    'buscar' busca por raíz de las palabras en motivo y diagnóstico (columna
+    'busqueda'), ordenado por relevancia.
     """
     # Filtros de fecha_consulta para rangos (mayor/menor o igual)
     fecha_consulta_min = django_filters.DateTimeFilter(field_name='fecha_consulta', lookup_expr='gte', label='Fecha Desde')
     fecha_consulta_max = django_filters.DateTimeFilter(field_name='fecha_consulta', lookup_expr='lte', label='Fecha Hasta')
+    # Selectores con autocompletado: no cargan todas las filas de Paciente/Medico
+    paciente = django_filters.ModelChoiceFilter(
+        queryset=Paciente.objects.all(), widget=AutocompletarSelect('autocompletar-pacientes'))
+    medico = django_filters.ModelChoiceFilter(
+        queryset=Medico.objects.all(), widget=AutocompletarSelect('autocompletar-medicos'))
+    buscar = django_filters.CharFilter(method='filtrar_buscar', label='Motivo o diagnóstico')
     
     class Meta:
         model = Consulta_Medica
         fields = ['paciente', 'medico', 'estado'] 
 
+    def filtrar_buscar(self, queryset, name, value):
+        return busqueda_texto_completo(queryset, value, 'busqueda')
+
 # ----------------- 6. Tratamiento Filter -----------------
 class TratamientoFilter(django_filters.FilterSet):
     """
@@ -84,6 +171,8 @@ class TratamientoFilter(django_filters.FilterSet):
     y filtrar por la 'consulta' médica a la que está asociado el tratamiento.
     """
     descripcion = django_filters.CharFilter(lookup_expr='icontains', label='Descripción')
+    consulta = django_filters.ModelChoiceFilter(
+        queryset=Consulta_Medica.objects.all(), widget=AutocompletarSelect('autocompletar-consultas'))
     
     class Meta:
         model = Tratamiento
@@ -109,7 +198,112 @@ class RecetaMedicaFilter(django_filters.FilterSet):
     y filtrar por las llaves foráneas 'consulta' y 'medicamento'.
     """
     dosis = django_filters.CharFilter(lookup_expr='icontains', label='Dosis')
+    consulta = django_filters.ModelChoiceFilter(
+        queryset=Consulta_Medica.objects.all(), widget=AutocompletarSelect('autocompletar-consultas'))
+    medicamento = django_filters.ModelChoiceFilter(
+        queryset=Medicamento.objects.all(), widget=AutocompletarSelect('autocompletar-medicamentos'))
 
     class Meta:
         model = Receta_Medica
-        fields = ['consulta', 'medicamento']
\ No newline at end of file
+        fields = ['consulta', 'medicamento']
+
+# ======================================================================
+# ORDENAMIENTO VALIDADO (?ordering=)
+# Cada vista declara en 'campos_ordenamiento' los valores que acepta:
+# {valor de ?ordering=: campo o tupla de campos del ORM}. Solo se listan
+# órdenes que resuelve un índice (ver Meta.indexes de cada modelo) y a todos
+# se les agrega el ID como desempate: el orden es total y las páginas (por
+# número o por cursor) no repiten ni saltan filas. '-valor' invierte todos
+# los campos, y el índice se recorre al revés. Las FK se ordenan por su
+# columna (ej: 'paciente_id'); ordenar por la relación haría un JOIN para
+# aplicar el Meta.ordering del modelo relacionado. Se excluyen las columnas
+# que aceptan NULL: el cursor de la API no puede codificar esa posición.
+# ======================================================================
+
+class OrdenamientoInvalido(ValueError):
+    """El valor de ?ordering= no está entre los campos permitidos de la vista."""
+
+def con_desempate(campos):
+    """Agrega 'id' (en la dirección del último campo) si el orden no termina en la llave primaria."""
+    campos = tuple(campos)
+    ultimo = campos[-1] if campos else None
+    if isinstance(ultimo, str) and ultimo.lstrip('-') in ('id', 'pk'):
+        return campos
+    descendente = isinstance(ultimo, str) and ultimo.startswith('-')
+    return (*campos, '-id' if descendente else 'id')
+
+def resolver_ordenamiento(valor, campos_permitidos):
+    """Campos del ORM para un valor de ?ordering= (ej: '-nombre' -> ('-nombre', '-id'))."""
+    descendente = valor.startswith('-')
+    nombre = valor[1:] if descendente else valor
+    if nombre not in campos_permitidos:
+        opciones = ', '.join(sorted(campos_permitidos))
+        raise OrdenamientoInvalido(f"Ordenamiento no permitido: '{valor}'. Opciones: {opciones} (con '-' para invertir).")
+    campos = campos_permitidos[nombre]
+    campos = con_desempate((campos,) if isinstance(campos, str) else campos)
+    if descendente:
+        campos = tuple(campo[1:] if campo.startswith('-') else f'-{campo}' for campo in campos)
+    return campos
+
+class OrdenamientoIndexadoFilter(BaseFilterBackend):
+    """
+    Backend de DRF que aplica ?ordering= según 'campos_ordenamiento' de la
+    vista; un valor fuera de la lista responde 400. El orden resultante
+    termina en el ID, por lo que KeysetCursorPagination lo usa como clave
+    del cursor.
+    """
+    parametro = 'ordering'
+
+    def filter_queryset(self, request, queryset, view):
+        campos_permitidos = getattr(view, 'campos_ordenamiento', None)
+        valor = request.query_params.get(self.parametro)
+        if not campos_permitidos or not valor:
+            return queryset
+        try:
+            return queryset.order_by(*resolver_ordenamiento(valor, campos_permitidos))
+        except OrdenamientoInvalido as error:
+            raise ValidationError({self.parametro: [str(error)]})
+
+    def get_schema_operation_parameters(self, view):
+        campos_permitidos = getattr(view, 'campos_ordenamiento', None)
+        if not campos_permitidos:
+            return []
+        return [{
+            'name': self.parametro,
+            'required': False,
+            'in': 'query',
+            'description': f"Ordenamiento: {', '.join(sorted(campos_permitidos))} (con '-' para invertir).",
+            'schema': {'type': 'string'},
+        }]
+
+# ----------------- Campos de ordenamiento por entidad -----------------
+ORDENAMIENTO_DEPARTAMENTO = {'id': 'id', 'nombre': 'nombre'} # 'nombre' es único (tiene índice)
+ORDENAMIENTO_ESPECIALIDAD = {'id': 'id', 'nombre': 'nombre'} # 'departamento' acepta NULL
+ORDENAMIENTO_PACIENTE = {
+    'id': 'id',
+    'rut': 'rut', # Único
+    'nombre': 'nombre', # paciente_nombre_id_idx
+    'fecha_nacimiento': 'fecha_nacimiento', # paciente_nacimiento_id_idx
+}
+ORDENAMIENTO_MEDICO = {
+    'id': 'id',
+    'rut': 'rut',
+    'nombre': 'nombre', # medico_nombre_id_idx
+    'especialidad': 'especialidad_id', # Índice de la FK
+}
+ORDENAMIENTO_CONSULTA = {
+    'id': 'id',
+    'fecha_consulta': 'fecha_consulta', # consulta_fecha_id_idx (recorrido inverso)
+    # Las consultas de cada paciente/médico siguen de la más reciente a la más antigua
+    'paciente': ('paciente_id', '-fecha_consulta'), # consulta_paciente_fecha_idx
+    'medico': ('medico_id', '-fecha_consulta'), # consulta_medico_fecha_idx
+    'estado': ('estado', '-fecha_consulta'), # consulta_estado_fecha_idx
+}
+ORDENAMIENTO_TRATAMIENTO = {'id': 'id', 'consulta': 'consulta_id'} # Índice de la FK
+ORDENAMIENTO_MEDICAMENTO = {
+    'id': 'id',
+    'nombre': 'nombre', # medicamento_nombre_id_idx
+    'laboratorio': 'laboratorio', # medicamento_laboratorio_id_idx
+    'stock': 'stock', # medicamento_stock_id_idx
+}
+ORDENAMIENTO_RECETA = {'id': 'id', 'consulta': 'consulta_id', 'medicamento': 'medicamento_id'} # Índices de las FK
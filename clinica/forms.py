@@ -1,12 +1,15 @@
 # Bloque de Importaciones
 # ======================================================================
 from django import forms # Módulo base para la creación de formularios en Django
+from django.db import transaction # La edición del medicamento y el ajuste de stock se guardan juntos
 from .models import (
     Departamento, Especialidad, Paciente, Medico, Consulta_Medica,
-    Tratamiento, Medicamento, Receta_Medica
+    Tratamiento, Medicamento, Receta_Medica, normalizar_rut
 ) # Importación de todos los modelos de la aplicación 'clinica'
 from crispy_forms.helper import FormHelper # Clase principal para la personalización de formularios con crispy-forms
 from crispy_forms.layout import Layout, Submit # Clases para definir la estructura y elementos de envío (botones)
+from .cache import ReferenciaCacheadaChoiceField # Opciones de Departamento/Especialidad leídas de la caché
+from .widgets import AutocompletarSelect # Selector de FK que carga las opciones bajo demanda
 
 # ======================================================================
 # FORMULARIOS MODELFORM (CRUD HTML)
@@ -31,13 +34,29 @@ class EspecialidadForm(forms.ModelForm):
     class Meta:
         model = Especialidad
         fields = '__all__'
+        field_classes = {'departamento': ReferenciaCacheadaChoiceField}
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.helper = FormHelper()
         self.helper.add_input(Submit('submit', 'Guardar Especialidad', css_class='btn-primary'))
 
-class PacienteForm(forms.ModelForm):
+class RutUnicoFormMixin:
+    """
+    Para PacienteForm y MedicoForm: rechaza un RUT que ya usa otro registro
+    escrito en otro formato. 'rut_normalizado' no es editable y la validación
+    del ModelForm no revisa su restricción única (terminaría en un error 500).
+    """
+    def clean_rut(self):
+        rut = self.cleaned_data['rut']
+        otros = self._meta.model._default_manager.filter(rut_normalizado=normalizar_rut(rut))
+        if self.instance.pk is not None:
+            otros = otros.exclude(pk=self.instance.pk)
+        if otros.exists():
+            raise forms.ValidationError('Ya existe un registro con este RUT (escrito en otro formato).')
+        return rut
+
+class PacienteForm(RutUnicoFormMixin, forms.ModelForm):
     """
     Formulario ModelForm para la entidad Paciente.
     Personaliza el widget de fecha de nacimiento.
@@ -55,11 +74,12 @@ class PacienteForm(forms.ModelForm):
         self.helper = FormHelper()
         self.helper.add_input(Submit('submit', 'Guardar Paciente', css_class='btn-primary'))
 
-class MedicoForm(forms.ModelForm):
+class MedicoForm(RutUnicoFormMixin, forms.ModelForm):
     """Formulario ModelForm para la entidad Medico."""
     class Meta:
         model = Medico
         fields = '__all__'
+        field_classes = {'especialidad': ReferenciaCacheadaChoiceField}
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -75,6 +95,11 @@ class ConsultaMedicaForm(forms.ModelForm):
         model = Consulta_Medica
         # Lista de campos específicos incluidos en este formulario
         fields = ['paciente', 'medico', 'motivo', 'diagnostico', 'estado'] #vhoices
+        # Pacientes y médicos se buscan con autocompletado en vez de listar toda la tabla
+        widgets = {
+            'paciente': AutocompletarSelect('autocompletar-pacientes'),
+            'medico': AutocompletarSelect('autocompletar-medicos'),
+        }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -86,6 +111,9 @@ class TratamientoForm(forms.ModelForm):
     class Meta:
         model = Tratamiento
         fields = '__all__'
+        widgets = {
+            'consulta': AutocompletarSelect('autocompletar-consultas'),
+        }
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -93,21 +121,48 @@ class TratamientoForm(forms.ModelForm):
         self.helper.add_input(Submit('submit', 'Guardar Tratamiento', css_class='btn-primary'))
 
 class MedicamentoForm(forms.ModelForm):
-    """Formulario ModelForm para la entidad Medicamento."""
+    """
+    Formulario ModelForm para la entidad Medicamento.
+    Al editar, el stock se muestra deshabilitado (las recetas lo reservan
+    mientras el formulario está abierto) y se modifica con 'ajuste_stock',
+    una diferencia que se suma en la base de datos (Medicamento.ajustar_stock).
+    """
+    ajuste_stock = forms.IntegerField(
+        required=False, initial=0, label='Ajuste de stock',
+        help_text='Unidades que ingresan (positivo) o salen (negativo).',
+    )
+
     class Meta:
         model = Medicamento
         fields = '__all__'
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        if self.instance.pk is None:
+            del self.fields['ajuste_stock'] # Al crear, el stock inicial se escribe directamente
+        else:
+            self.fields['stock'].disabled = True
         self.helper = FormHelper()
         self.helper.add_input(Submit('submit', 'Guardar Medicamento', css_class='btn-primary'))
 
+    def save(self, commit=True):
+        with transaction.atomic():
+            medicamento = super().save(commit=commit)
+            ajuste = self.cleaned_data.get('ajuste_stock')
+            if commit and ajuste:
+                Medicamento.ajustar_stock({medicamento.pk: ajuste}) # StockInsuficiente: error del formulario
+                medicamento.refresh_from_db(fields=['stock'])
+        return medicamento
+
 class RecetaMedicaForm(forms.ModelForm):
     """Formulario ModelForm para la entidad Receta_Medica."""
     class Meta:
         model = Receta_Medica
         fields = '__all__'
+        widgets = {
+            'consulta': AutocompletarSelect('autocompletar-consultas'),
+            'medicamento': AutocompletarSelect('autocompletar-medicamentos'),
+        }
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -0,0 +1,145 @@
+# clinica/management/commands/benchmark_asgi.py
+
+# Bloque de Importaciones
+# ======================================================================
+import asyncio
+import io
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from clinica.models import Consulta_Medica, Paciente
+
+# Modo -> (aplicación, prefijo de las rutas)
+#  wsgi:        ViewSets síncronos detrás de un pool de hilos fijo (como gunicorn --threads)
+#  asgi_sync:   los mismos ViewSets bajo ASGI (Django los ejecuta en un hilo por request)
+#  asgi_async:  vistas asíncronas de /api/async/ bajo ASGI
+MODOS = ['wsgi', 'asgi_sync', 'asgi_async']
+
+class Command(BaseCommand):
+    """
+    Prueba de carga en proceso: 'concurrencia' clientes piden en bucle
+    listados y detalles de pacientes, médicos y consultas, sin servidor HTTP
+    de por medio (se llama directamente a la aplicación WSGI o ASGI de
+    Django). Mide solicitudes por segundo y latencias p50/p95/p99 de cada modo.
+    Las conexiones a la BD siguen CLINICA_DB_CONEXIONES (ver settings.py y
+    benchmark_conexiones): con 'nueva' o 'persistente' bajo ASGI, la
+    concurrencia no debe superar max_connections de PostgreSQL.
+    """
+    help = 'Compara la API síncrona bajo WSGI y ASGI con las vistas asíncronas bajo ASGI.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrencia', type=int, default=64, help='Clientes simultáneos.')
+        parser.add_argument('--solicitudes', type=int, default=2000, help='Solicitudes totales por modo.')
+        parser.add_argument('--hilos', type=int, default=8, help='Hilos del servidor WSGI simulado.')
+        parser.add_argument('--modo', choices=MODOS + ['todos'], default='todos')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+
+    def handle(self, *args, **options):
+        paciente = Paciente.objects.values_list('pk', flat=True).first()
+        consulta = Consulta_Medica.objects.values_list('pk', flat=True).first()
+        self.rutas = [
+            ('pacientes/', 'page_size=50'),
+            (f'pacientes/{paciente}/', ''),
+            ('medicos/', 'page_size=50'),
+            ('consultas/', 'page_size=50'),
+            (f'consultas/{consulta}/', ''),
+        ]
+        self.wsgi = get_wsgi_application()
+        self.asgi = get_asgi_application()
+
+        modos = MODOS if options['modo'] == 'todos' else [options['modo']]
+        resultados = {}
+        for modo in modos:
+            resultados[modo] = r = asyncio.run(self.medir(modo, options))
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {modo}'))
+            self.stdout.write(
+                f"{r['solicitudes_por_segundo']:>8.1f} req/s  p50={r['p50_ms']:.1f} ms  p95={r['p95_ms']:.1f} ms  "
+                f"p99={r['p99_ms']:.1f} ms  errores={r['errores']}"
+            )
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+
+    async def medir(self, modo, options):
+        pool = ThreadPoolExecutor(max_workers=options['hilos']) if modo == 'wsgi' else None
+        prefijo = '/api/async/' if modo == 'asgi_async' else '/api/'
+        pendientes = iter(range(options['solicitudes']))
+        tiempos, errores = [], 0
+
+        async def cliente():
+            nonlocal errores
+            for i in pendientes: # Iterador compartido: los clientes se reparten las solicitudes
+                ruta, consulta = self.rutas[i % len(self.rutas)]
+                inicio = time.perf_counter()
+                if pool is not None:
+                    codigo = await asyncio.get_running_loop().run_in_executor(
+                        pool, self.llamar_wsgi, prefijo + ruta, consulta
+                    )
+                else:
+                    codigo = await self.llamar_asgi(prefijo + ruta, consulta)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                errores += codigo != 200
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*[cliente() for _ in range(options['concurrencia'])])
+        duracion = time.perf_counter() - inicio
+        if pool is not None:
+            pool.shutdown()
+
+        tiempos.sort()
+        percentil = lambda p: round(tiempos[max(int(len(tiempos) * p) - 1, 0)], 2)
+        return {
+            'solicitudes': len(tiempos),
+            'errores': errores,
+            'solicitudes_por_segundo': round(len(tiempos) / duracion, 1),
+            'p50_ms': round(statistics.median(tiempos), 2),
+            'p95_ms': percentil(0.95),
+            'p99_ms': percentil(0.99),
+        }
+
+    def llamar_wsgi(self, ruta, consulta):
+        estado = []
+        entorno = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': ruta, 'QUERY_STRING': consulta,
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+            'HTTP_ACCEPT': 'application/json', 'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http',
+        }
+        cuerpo = self.wsgi(entorno, lambda status, headers, exc_info=None: estado.append(status))
+        try:
+            b''.join(cuerpo)
+        finally:
+            cuerpo.close() # Emite request_finished (cierra la conexión a la BD)
+        return int(estado[0].split()[0])
+
+    async def llamar_asgi(self, ruta, consulta):
+        alcance = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': ruta, 'raw_path': ruta.encode(), 'query_string': consulta.encode(),
+            'headers': [(b'host', b'localhost'), (b'accept', b'application/json')],
+            'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+        }
+        desconexion = asyncio.Event()
+        cuerpo_enviado = False
+        estado = []
+
+        async def recibir():
+            nonlocal cuerpo_enviado
+            if not cuerpo_enviado:
+                cuerpo_enviado = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await desconexion.wait() # El cliente no se desconecta antes de tiempo
+            return {'type': 'http.disconnect'}
+
+        async def enviar(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                estado.append(mensaje['status'])
+
+        await self.asgi(alcance, recibir, enviar)
+        desconexion.set()
+        return estado[0]
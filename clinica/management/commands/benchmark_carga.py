@@ -0,0 +1,256 @@
+# clinica/management/commands/benchmark_carga.py
+
+# Bloque de Importaciones
+# ======================================================================
+import json
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Model
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern
+from django.utils import timezone
+from django.views.generic import ListView
+from django_filters import CharFilter
+from clinica.urls import router, urlpatterns
+
+def ruta_exportacion(muestra):
+    """Exportación de las filas de un médico o medicamento: la tabla completa son millones de filas por request."""
+    for campo in ('medico', 'medicamento'):
+        if hasattr(muestra, f'{campo}_id'):
+            return f"export/?{urlencode({'formato': 'ndjson', campo: getattr(muestra, f'{campo}_id')})}"
+    return 'export/?formato=ndjson'
+
+# Acciones extra de los ViewSets (detail=False, GET): ruta relativa a partir de la fila de muestra
+ACCIONES = {
+    'by_rut': lambda muestra: f'by-rut/{muestra.rut}/',
+    'export': ruta_exportacion,
+}
+
+class Command(BaseCommand):
+    """
+    Mide cada listado HTML (ListView), cada acción de lectura de los ViewSets
+    de la API (list, retrieve y acciones extra) y cada filtro y ordenamiento
+    que declaran, uno por uno y todos los filtros juntos. Los casos se
+    descubren desde las URLs, los FilterSet y 'campos_ordenamiento', y los
+    valores de los filtros salen de una fila de muestra de cada tabla.
+    Por caso informa latencias p50/p95/p99 y la cantidad de consultas SQL
+    por request (en todas las bases configuradas, réplicas incluidas). El
+    JSON de salida (--salida) incluye el commit y el tamaño de las tablas;
+    --comparar lee uno anterior y marca los casos que empeoraron. Conviene
+    sembrar antes un volumen realista (ver sembrar_datos).
+    """
+    help = 'Mide latencia y consultas SQL de los listados HTML, los ViewSets y sus filtros.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=10, help='Requests medidos por caso.')
+        parser.add_argument('--solo', help='Mide solo los casos cuyo nombre contiene este texto.')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+        parser.add_argument('--comparar', metavar='ARCHIVO', help='Resultados anteriores (JSON de --salida).')
+        parser.add_argument('--tolerancia', type=float, default=1.25,
+                            help='Razón p50 actual/anterior sobre la cual un caso se marca como regresión.')
+
+    def handle(self, *args, **options):
+        # Un host aceptado por ALLOWED_HOSTS (con DEBUG y la lista vacía, Django acepta 'localhost')
+        host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        self.cliente = Client(SERVER_NAME=host, HTTP_ACCEPT='application/json')
+        casos = [(nombre, url) for nombre, url in self.casos() if not options['solo'] or options['solo'] in nombre]
+        if not casos:
+            raise CommandError('No hay casos que medir (¿la base de datos tiene datos?).')
+
+        resultados = {}
+        for nombre, url in casos:
+            resultados[nombre] = r = self.medir(url, options['repeticiones'])
+            if 'error' in r:
+                self.stdout.write(self.style.ERROR(f"{nombre:<58} {r['error']}"))
+                continue
+            self.stdout.write(
+                f"{nombre:<58} p50={r['p50_ms']:>8.1f} ms  p95={r['p95_ms']:>8.1f} ms  "
+                f"p99={r['p99_ms']:>8.1f} ms  sql={r['consultas_sql']}"
+            )
+
+        informe = {'metadatos': self.metadatos(options), 'casos': resultados}
+        if options['comparar']:
+            self.comparar(options['comparar'], resultados, options['tolerancia'])
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(informe, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+
+    # ------------------------------------------------------------------
+    # Descubrimiento de casos
+    # ------------------------------------------------------------------
+
+    def casos(self):
+        """Pares (nombre, URL) de todos los casos."""
+        for patron in urlpatterns: # Listados HTML y asíncronos
+            if not isinstance(patron, URLPattern) or not (patron.name or '').endswith('-list'):
+                continue # include() de la API, rutas de edición y vistas asíncronas
+            vista = getattr(patron.callback, 'view_class', None)
+            if getattr(vista, 'filterset_class', None):
+                tipo = 'html' if issubclass(vista, ListView) else 'async' # Vistas asíncronas de /api/async/
+                yield from self.casos_listado(f'{tipo}:{patron.name}', f'/{patron.pattern}', vista)
+
+        for prefijo, viewset, basename in router.registry:
+            base = f'/api/{prefijo}/'
+            muestra = self.muestra(viewset.queryset.model)
+            if muestra is None:
+                continue
+            yield from self.casos_listado(f'api:{basename}-list', base, viewset, muestra)
+            yield f'api:{basename}-retrieve', f'{base}{muestra.pk}/'
+            for accion in viewset.get_extra_actions():
+                if not accion.detail and 'get' in accion.mapping and accion.__name__ in ACCIONES:
+                    yield f'api:{basename}-{accion.__name__}', base + ACCIONES[accion.__name__](muestra)
+
+    def casos_listado(self, nombre, url, vista, muestra=None):
+        """Listado sin parámetros, con cada filtro, con todos los filtros y con cada ordenamiento."""
+        muestra = muestra or self.muestra(getattr(vista, 'model', None) or vista.queryset.model)
+        if muestra is None:
+            return
+        yield nombre, url
+        parametros = {}
+        if getattr(vista, 'filterset_class', None):
+            for campo, filtro in vista.filterset_class.base_filters.items():
+                valor = self.valor_filtro(filtro, muestra)
+                if valor is not None:
+                    parametros[campo] = valor
+                    yield f'{nombre}?{campo}', self.url(url, {campo: valor})
+            if len(parametros) > 1:
+                yield f'{nombre}?todos_los_filtros', self.url(url, parametros)
+        for campo in getattr(vista, 'campos_ordenamiento', None) or {}:
+            yield f'{nombre}?ordering={campo}', self.url(url, {'ordering': campo})
+
+    @staticmethod
+    def url(base, parametros):
+        return f'{base}?{urlencode(parametros)}'
+
+    @staticmethod
+    def muestra(modelo):
+        """Fila representativa: la del medio de la tabla por ID (ni la primera ni la última cargada)."""
+        ids = modelo.objects.order_by('id').values_list('id', flat=True)
+        ultimo = ids.last()
+        if ultimo is None:
+            return None
+        return modelo.objects.filter(id__lte=(ultimo + ids.first()) // 2).order_by('-id').first()
+
+    @staticmethod
+    def valor_filtro(filtro, muestra):
+        """Valor del filtro que incluye a la fila de muestra, o None si no se puede derivar."""
+        if filtro.method: # Búsqueda aproximada (nombre) o de texto completo (motivo de la consulta)
+            return getattr(muestra, 'nombre', None) or getattr(muestra, 'motivo', None)
+        valor = muestra
+        for parte in filtro.field_name.split('__'):
+            valor = getattr(valor, parte, None)
+        if isinstance(valor, Model):
+            return valor.pk
+        if valor is None:
+            return None
+        if isinstance(filtro, CharFilter) and filtro.lookup_expr in ('icontains', 'contains'):
+            return str(valor)[:4]
+        if isinstance(valor, datetime): # Rango de un mes que termina en la muestra
+            valor = timezone.localtime(valor)
+            return (valor - timedelta(days=30) if filtro.lookup_expr in ('gt', 'gte') else valor).isoformat()
+        return str(valor)
+
+    # ------------------------------------------------------------------
+    # Medición
+    # ------------------------------------------------------------------
+
+    def pedir(self, url):
+        """GET de la URL consumiendo el cuerpo completo (incluidas las respuestas en streaming)."""
+        response = self.cliente.get(url)
+        # El cliente de pruebas cierra la respuesta (request_finished) al terminar de leerla
+        if response.streaming:
+            tamano = sum(len(parte) for parte in response.streaming_content)
+        else:
+            tamano = len(response.content)
+        return response.status_code, tamano
+
+    def medir(self, url, repeticiones):
+        codigo, tamano = self.pedir(url) # Calentamiento: cachés, plan de la consulta, páginas en memoria
+        if codigo != 200:
+            return {'url': url, 'error': f'HTTP {codigo}'}
+        tiempos, consultas = [], set()
+        for _ in range(repeticiones):
+            with ExitStack() as pila:
+                capturas = [pila.enter_context(CaptureQueriesContext(connections[alias])) for alias in settings.DATABASES]
+                inicio = time.perf_counter()
+                self.pedir(url)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            consultas.add(sum(len(captura.captured_queries) for captura in capturas))
+        tiempos.sort()
+        percentil = lambda p: round(tiempos[max(int(len(tiempos) * p + 0.5) - 1, 0)], 2)
+        return {
+            'url': url,
+            'p50_ms': round(statistics.median(tiempos), 2),
+            'p95_ms': percentil(0.95),
+            'p99_ms': percentil(0.99),
+            'consultas_sql': max(consultas),
+            # Distinto de consultas_sql si la cantidad varía entre requests (ej: caché de respuestas)
+            'consultas_sql_min': min(consultas),
+            'bytes': tamano,
+        }
+
+    def metadatos(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        modelos = {viewset.queryset.model for _, viewset, _ in router.registry}
+        return {
+            'commit': commit,
+            'fecha': timezone.now().isoformat(),
+            'repeticiones': options['repeticiones'],
+            'conexiones': settings.DATABASES['default'].get('CONN_MAX_AGE'),
+            'filas': {modelo._meta.label: self.filas_estimadas(modelo) for modelo in sorted(modelos, key=str)},
+        }
+
+    @staticmethod
+    def filas_estimadas(modelo):
+        """Tamaño de la tabla según el catálogo de PostgreSQL (sin COUNT(*) sobre millones de filas)."""
+        connection = connections['default']
+        if connection.vendor != 'postgresql':
+            return modelo.objects.count()
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [modelo._meta.db_table])
+            fila = cursor.fetchone()
+        return fila[0] if fila and fila[0] >= 0 else modelo.objects.count()
+
+    def comparar(self, archivo, resultados, tolerancia):
+        """Compara p50 y consultas SQL con un archivo anterior y marca las regresiones."""
+        with open(archivo, encoding='utf-8') as entrada:
+            anterior = json.load(entrada)
+        casos_anteriores = anterior.get('casos', {})
+        commit = anterior.get('metadatos', {}).get('commit')
+        self.stdout.write(self.style.MIGRATE_HEADING(f'== Comparación con {archivo} (commit {commit})'))
+        regresiones = 0
+        for nombre, actual in resultados.items():
+            previo = casos_anteriores.get(nombre)
+            if not previo or 'error' in previo or 'error' in actual:
+                continue
+            razon = actual['p50_ms'] / max(previo['p50_ms'], 0.01)
+            mas_sql = actual['consultas_sql'] > previo['consultas_sql']
+            linea = (
+                f"{nombre:<58} p50 {previo['p50_ms']:>8.1f} -> {actual['p50_ms']:>8.1f} ms (x{razon:.2f})  "
+                f"sql {previo['consultas_sql']} -> {actual['consultas_sql']}"
+            )
+            if razon > tolerancia or mas_sql:
+                regresiones += 1
+                self.stdout.write(self.style.ERROR(linea))
+            elif razon < 1 / tolerancia:
+                self.stdout.write(self.style.SUCCESS(linea))
+            else:
+                self.stdout.write(linea)
+        nuevos = sorted(set(resultados) - set(casos_anteriores))
+        if nuevos:
+            self.stdout.write(f"Casos nuevos: {', '.join(nuevos)}")
+        self.stdout.write(f'Regresiones: {regresiones}')
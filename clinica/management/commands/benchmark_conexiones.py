@@ -0,0 +1,69 @@
+# clinica/management/commands/benchmark_conexiones.py
+
+# Bloque de Importaciones
+# ======================================================================
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+MODOS_CONEXION = ['nueva', 'persistente', 'pool']
+
+class Command(BaseCommand):
+    """
+    Ejecuta benchmark_asgi con cada modo de CLINICA_DB_CONEXIONES (ver
+    settings.py), cada uno en un proceso propio para que tome su
+    configuración, y compara solicitudes por segundo, latencias y la cantidad
+    de conexiones que abrió PostgreSQL (pg_stat_database.sessions).
+    """
+    help = 'Compara conexión por request, conexiones persistentes y el pool de psycopg bajo carga.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modos', nargs='+', choices=MODOS_CONEXION, default=MODOS_CONEXION)
+        parser.add_argument('--aplicacion', choices=['wsgi', 'asgi_async'], default='wsgi',
+                            help='Modo de benchmark_asgi a ejecutar.')
+        parser.add_argument('--concurrencia', type=int, default=64)
+        parser.add_argument('--solicitudes', type=int, default=2000)
+        parser.add_argument('--hilos', type=int, default=8)
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+
+    def sesiones(self):
+        """Conexiones abiertas en la base de datos desde el último reinicio de estadísticas (PostgreSQL 14+)."""
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT sessions FROM pg_stat_database WHERE datname = current_database()')
+            return cursor.fetchone()[0]
+
+    def handle(self, *args, **options):
+        resultados = {}
+        for modo in options['modos']:
+            with tempfile.NamedTemporaryFile(suffix='.json') as archivo:
+                antes = self.sesiones()
+                comando = [
+                    sys.executable, '-m', 'django', 'benchmark_asgi',
+                    '--modo', options['aplicacion'], '--salida', archivo.name,
+                    '--concurrencia', str(options['concurrencia']), '--solicitudes', str(options['solicitudes']),
+                    '--hilos', str(options['hilos']),
+                ]
+                proceso = subprocess.run(
+                    comando, cwd=settings.BASE_DIR, env={**os.environ, 'CLINICA_DB_CONEXIONES': modo},
+                    capture_output=True, text=True,
+                )
+                if proceso.returncode != 0:
+                    raise CommandError(f'benchmark_asgi falló con CLINICA_DB_CONEXIONES={modo}:\n{proceso.stderr}')
+                r = json.load(archivo)[options['aplicacion']]
+            r['conexiones_abiertas'] = self.sesiones() - antes - 1 # Sin la conexión de este comando
+            resultados[modo] = r
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {modo}'))
+            self.stdout.write(
+                f"{r['solicitudes_por_segundo']:>8.1f} req/s  p50={r['p50_ms']:.1f} ms  p95={r['p95_ms']:.1f} ms  "
+                f"p99={r['p99_ms']:.1f} ms  errores={r['errores']}  conexiones={r['conexiones_abiertas']}"
+            )
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
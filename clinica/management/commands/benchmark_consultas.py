@@ -0,0 +1,147 @@
+# clinica/management/commands/benchmark_consultas.py
+
+# Bloque de Importaciones
+# ======================================================================
+import json
+import statistics
+import time
+from datetime import timedelta
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from clinica.filters import ConsultaMedicaFilter
+from clinica.models import Consulta_Medica
+
+# Índices compuestos agregados en la migración 0004_indices_consulta
+INDICES_CONSULTA = [
+    'consulta_fecha_id_idx',
+    'consulta_medico_fecha_idx',
+    'consulta_paciente_fecha_idx',
+    'consulta_pendiente_fecha_idx',
+]
+
+# Datos sintéticos: un médico cada 10.000 consultas y un paciente cada 20
+SQL_SEMBRAR = [
+    """INSERT INTO clinica_departamento (nombre) VALUES ('Benchmark') ON CONFLICT DO NOTHING""",
+    """INSERT INTO clinica_especialidad (nombre, departamento_id)
+       SELECT 'Benchmark', id FROM clinica_departamento WHERE nombre = 'Benchmark'
+       ON CONFLICT DO NOTHING""",
+    """INSERT INTO clinica_medico (rut, rut_normalizado, nombre, apellido, correo, activo, especialidad_id)
+       SELECT 'BM' || i, 'BM' || i, 'Medico' || i, 'Benchmark', 'bm' || i || '@benchmark.cl', true,
+              (SELECT id FROM clinica_especialidad WHERE nombre = 'Benchmark')
+       FROM generate_series(1, GREATEST(%(filas)s / 10000, 10)) AS i""",
+    """INSERT INTO clinica_paciente (rut, rut_normalizado, nombre, apellido, fecha_nacimiento,
+                                    tipo_sangre, correo, activo)
+       SELECT 'BP' || i, 'BP' || i, 'Paciente' || i, 'Benchmark', DATE '1950-01-01' + (i %% 20000),
+              'O+', 'bp' || i || '@benchmark.cl', true
+       FROM generate_series(1, GREATEST(%(filas)s / 20, 10)) AS i""",
+    # ~5% pendientes, fechas repartidas en los últimos 5 años
+    """INSERT INTO clinica_consulta_medica (paciente_id, medico_id, fecha_consulta, motivo, estado)
+       SELECT p.min_id + (random() * (p.max_id - p.min_id))::bigint,
+              m.min_id + (random() * (m.max_id - m.min_id))::bigint,
+              now() - random() * interval '5 years',
+              'Control',
+              CASE WHEN random() < 0.05 THEN 'PENDIENTE'
+                   WHEN random() < 0.9 THEN 'REALIZADA' ELSE 'CANCELADA' END
+       FROM generate_series(1, %(filas)s),
+            (SELECT min(id) AS min_id, max(id) AS max_id FROM clinica_paciente WHERE rut LIKE 'BP%%') AS p,
+            (SELECT min(id) AS min_id, max(id) AS max_id FROM clinica_medico WHERE rut LIKE 'BM%%') AS m""",
+    """ANALYZE clinica_medico, clinica_paciente, clinica_consulta_medica""",
+]
+
+class Command(BaseCommand):
+    """
+    Mide los accesos frecuentes a Consulta_Medica (filtros de ConsultaMedicaFilter
+    más el orden de la paginación por cursor) con y sin los índices compuestos.
+    La fase 'sin índices' los elimina dentro de una transacción que se revierte,
+    por lo que debe ejecutarse en una base de datos de pruebas, no en producción.
+    """
+    help = 'Compara planes EXPLAIN y latencia de Consulta_Medica con y sin los índices compuestos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sembrar', type=int, default=0, metavar='FILAS',
+                            help='Inserta esta cantidad de consultas sintéticas antes de medir.')
+        parser.add_argument('--repeticiones', type=int, default=20,
+                            help='Ejecuciones por consulta para calcular la latencia.')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('El benchmark requiere PostgreSQL.')
+
+        if options['sembrar']:
+            self.stdout.write(f"Sembrando {options['sembrar']} consultas...")
+            with transaction.atomic(), connection.cursor() as cursor:
+                for sql in SQL_SEMBRAR:
+                    cursor.execute(sql, {'filas': options['sembrar']})
+            # El INSERT directo no pasa por las señales: se reconstruye el resumen diario
+            call_command('recalcular_estadisticas', stdout=self.stdout)
+
+        muestra = Consulta_Medica.objects.order_by('-fecha_consulta').first()
+        if muestra is None:
+            raise CommandError('No hay consultas: use --sembrar FILAS.')
+
+        resultados = {}
+        for fase, sin_indices in (('sin_indices', True), ('con_indices', False)):
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {fase}'))
+            resultados[fase] = self.medir_fase(muestra, sin_indices, options['repeticiones'])
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+
+    def consultas(self, muestra):
+        """Consultas representativas, construidas con el mismo FilterSet de las vistas."""
+        orden = ('-fecha_consulta', '-id')
+        rango = {
+            'fecha_consulta_min': (muestra.fecha_consulta - timedelta(days=365)).isoformat(),
+            'fecha_consulta_max': muestra.fecha_consulta.isoformat(),
+        }
+        casos = {
+            'listado': {},
+            'por_medico': {'medico': muestra.medico_id},
+            'por_paciente': {'paciente': muestra.paciente_id},
+            'pendientes': {'estado': 'PENDIENTE'},
+            'medico_y_rango': {'medico': muestra.medico_id, **rango},
+        }
+        for nombre, parametros in casos.items():
+            filtro = ConsultaMedicaFilter(parametros, queryset=Consulta_Medica.objects.all())
+            if not filtro.is_valid():
+                raise CommandError(f'{nombre}: {filtro.errors}')
+            yield nombre, filtro.qs.order_by(*orden)[:50]
+
+    def medir_fase(self, muestra, sin_indices, repeticiones):
+        resultados = {}
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                if sin_indices:
+                    for indice in INDICES_CONSULTA:
+                        cursor.execute(f'DROP INDEX IF EXISTS "{indice}"')
+
+                for nombre, queryset in self.consultas(muestra):
+                    sql, params = queryset.query.sql_with_params()
+                    cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+                    plan = '\n'.join(fila[0] for fila in cursor.fetchall())
+
+                    tiempos = []
+                    for _ in range(repeticiones):
+                        inicio = time.perf_counter()
+                        cursor.execute(sql, params)
+                        cursor.fetchall()
+                        tiempos.append((time.perf_counter() - inicio) * 1000)
+                    tiempos.sort()
+
+                    resultados[nombre] = {
+                        'p50_ms': round(statistics.median(tiempos), 3),
+                        'p95_ms': round(tiempos[max(int(len(tiempos) * 0.95) - 1, 0)], 3),
+                        'plan': plan,
+                    }
+                    self.stdout.write(
+                        f"{nombre:<16} p50={resultados[nombre]['p50_ms']:>9.3f} ms  "
+                        f"p95={resultados[nombre]['p95_ms']:>9.3f} ms"
+                    )
+                    self.stdout.write(plan, style_func=lambda texto: texto)
+            # Se revierte siempre: en la fase 'sin índices' los índices vuelven a existir
+            transaction.set_rollback(True)
+        return resultados
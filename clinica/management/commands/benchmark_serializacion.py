@@ -0,0 +1,81 @@
+# clinica/management/commands/benchmark_serializacion.py
+
+# Bloque de Importaciones
+# ======================================================================
+import json
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from clinica.models import Consulta_Medica, Paciente
+from clinica.serializers import ConsultaMedicaSerializer, PacienteSerializer, PlanLectura
+
+# (nombre, queryset del ViewSet, serializador)
+CASOS = [
+    ('pacientes', Paciente.objects.order_by('id'), PacienteSerializer),
+    ('consultas', Consulta_Medica.objects.select_related('paciente', 'medico').order_by('-fecha_consulta', '-id'),
+     ConsultaMedicaSerializer),
+]
+
+class Command(BaseCommand):
+    """
+    Compara el tiempo de armar y renderizar a JSON un listado de N filas con
+    el serializador de DRF (instancias de modelo) y con PlanLectura (filas de
+    values(), ver ListadoRapidoMixin). Verifica además que ambos JSON sean
+    idénticos. Usa los datos existentes: para 100.000 filas de consultas,
+    ejecutar antes benchmark_consultas o cargar datos equivalentes.
+    """
+    help = 'Mide la serialización de listados: ModelSerializer vs lectura rápida desde values().'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Tamaños de listado a medir.')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Mediciones por caso (se informa la mediana).')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        resultados = {}
+        for nombre, queryset, serializador in CASOS:
+            plan = PlanLectura.para(serializador())
+            disponibles = queryset.count()
+            self.stdout.write(self.style.MIGRATE_HEADING(f'== {nombre} ({disponibles} filas disponibles)'))
+            resultados[nombre] = {}
+            for filas in options['filas']:
+                if filas > disponibles:
+                    self.stdout.write(self.style.WARNING(f'{filas:>8} filas: omitido, no hay suficientes datos'))
+                    continue
+
+                def con_serializador():
+                    return renderer.render(serializador(queryset[:filas], many=True).data)
+
+                def con_plan():
+                    return renderer.render(plan.representar(queryset.values(*plan.rutas)[:filas]))
+
+                if con_serializador() != con_plan():
+                    self.stdout.write(self.style.ERROR(f'{filas:>8} filas: los JSON no coinciden'))
+                    continue
+                lento = self.medir(con_serializador, options['repeticiones'])
+                rapido = self.medir(con_plan, options['repeticiones'])
+                resultados[nombre][filas] = {
+                    'serializador_ms': lento, 'lectura_rapida_ms': rapido, 'aceleracion': round(lento / rapido, 2),
+                }
+                self.stdout.write(
+                    f'{filas:>8} filas: serializador={lento:>9.1f} ms  lectura_rapida={rapido:>9.1f} ms  '
+                    f'x{lento / rapido:.2f}'
+                )
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+
+    @staticmethod
+    def medir(funcion, repeticiones):
+        """Mediana en milisegundos de 'repeticiones' ejecuciones (consulta + representación + JSON)."""
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return round(statistics.median(tiempos), 1)
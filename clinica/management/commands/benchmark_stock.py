@@ -0,0 +1,132 @@
+# clinica/management/commands/benchmark_stock.py
+
+# Bloque de Importaciones
+# ======================================================================
+import json
+import random
+import statistics
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from clinica.models import Medicamento, StockInsuficiente, descontar_stock
+
+PREFIJO = 'Benchmark stock' # Nombre de los medicamentos sintéticos (se borran al terminar)
+
+class Command(BaseCommand):
+    """
+    Prueba de contención sobre el stock de Medicamento: muchos escritores
+    concurrentes reservan lotes de varios medicamentos a la vez.
+    - 'condicional': descontar_stock() (UPDATE ... WHERE stock >= n, en orden de ID).
+    - 'lectura_escritura': SELECT del stock y UPDATE con el valor calculado en
+      Python, en orden aleatorio; es el patrón anterior y sirve de referencia.
+    Al final compara el stock restante con las unidades reservadas: cualquier
+    diferencia son actualizaciones perdidas (sobreventa).
+    """
+    help = 'Mide reservas de stock concurrentes (UPDATE condicional vs lectura-escritura).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escritores', type=int, default=16, help='Hilos concurrentes (una conexión cada uno).')
+        parser.add_argument('--reservas', type=int, default=200, help='Lotes que reserva cada escritor.')
+        parser.add_argument('--medicamentos', type=int, default=10, help='Medicamentos en disputa.')
+        parser.add_argument('--lote', type=int, default=3, help='Medicamentos distintos por lote de recetas.')
+        parser.add_argument('--stock', type=int, default=5000, help='Stock inicial de cada medicamento.')
+        parser.add_argument('--modo', choices=['condicional', 'lectura_escritura', 'ambos'], default='ambos')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+
+    def handle(self, *args, **options):
+        if options['lote'] > options['medicamentos']:
+            raise CommandError('--lote no puede superar a --medicamentos.')
+
+        ids = [
+            medicamento.pk for medicamento in Medicamento.objects.bulk_create([
+                Medicamento(nombre=f'{PREFIJO} {i}', laboratorio='Benchmark', stock=options['stock'],
+                            precio_unitario=1)
+                for i in range(options['medicamentos'])
+            ])
+        ]
+        modos = ['condicional', 'lectura_escritura'] if options['modo'] == 'ambos' else [options['modo']]
+        resultados = {}
+        try:
+            for modo in modos:
+                Medicamento.objects.filter(pk__in=ids).update(stock=options['stock'])
+                resultados[modo] = self.medir(modo, ids, options)
+                r = resultados[modo]
+                self.stdout.write(self.style.MIGRATE_HEADING(f'== {modo}'))
+                self.stdout.write(
+                    f"{r['lotes_por_segundo']:>9.1f} lotes/s  p50={r['p50_ms']:.2f} ms  p95={r['p95_ms']:.2f} ms  "
+                    f"aceptados={r['aceptados']}  rechazados={r['rechazados']}  deadlocks={r['deadlocks']}  "
+                    f"unidades_perdidas={r['unidades_perdidas']}"
+                )
+        finally:
+            Medicamento.objects.filter(pk__in=ids).delete()
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+
+    def medir(self, modo, ids, options):
+        reservar = self.reservar_condicional if modo == 'condicional' else self.reservar_lectura_escritura
+        tiempos = []
+        contadores = {'aceptados': 0, 'rechazados': 0, 'deadlocks': 0, 'unidades': 0}
+        candado = threading.Lock()
+        inicio_barrera = threading.Barrier(options['escritores'])
+
+        def escritor(semilla):
+            azar = random.Random(semilla)
+            propios, locales = [], dict.fromkeys(contadores, 0)
+            try:
+                inicio_barrera.wait()
+                for _ in range(options['reservas']):
+                    unidades = {pk: azar.randint(1, 3) for pk in azar.sample(ids, options['lote'])}
+                    inicio = time.perf_counter()
+                    try:
+                        with transaction.atomic():
+                            reservar(unidades, azar)
+                        locales['aceptados'] += 1
+                        locales['unidades'] += sum(unidades.values())
+                    except StockInsuficiente:
+                        locales['rechazados'] += 1
+                    except OperationalError:
+                        locales['deadlocks'] += 1 # PostgreSQL aborta una de las transacciones del ciclo
+                    propios.append((time.perf_counter() - inicio) * 1000)
+            finally:
+                connection.close() # Cada hilo usa su propia conexión
+            with candado:
+                tiempos.extend(propios)
+                for clave, valor in locales.items():
+                    contadores[clave] += valor
+
+        hilos = [threading.Thread(target=escritor, args=(i,)) for i in range(options['escritores'])]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        restante = sum(Medicamento.objects.filter(pk__in=ids).values_list('stock', flat=True))
+        tiempos.sort()
+        return {
+            'aceptados': contadores['aceptados'],
+            'rechazados': contadores['rechazados'],
+            'deadlocks': contadores['deadlocks'],
+            'lotes_por_segundo': round(len(tiempos) / duracion, 1),
+            'p50_ms': round(statistics.median(tiempos), 3),
+            'p95_ms': round(tiempos[max(int(len(tiempos) * 0.95) - 1, 0)], 3),
+            # Unidades que se entregaron pero no se descontaron del stock (actualizaciones perdidas)
+            'unidades_perdidas': restante - (options['stock'] * len(ids) - contadores['unidades']),
+        }
+
+    def reservar_condicional(self, unidades, azar):
+        descontar_stock(unidades)
+
+    def reservar_lectura_escritura(self, unidades, azar):
+        pendientes = list(unidades.items())
+        azar.shuffle(pendientes) # Sin un orden común entre transacciones
+        for pk, cantidad in pendientes:
+            stock = Medicamento.objects.values_list('stock', flat=True).get(pk=pk)
+            if stock < cantidad:
+                raise StockInsuficiente({'cantidad': 'Stock insuficiente.'})
+            Medicamento.objects.filter(pk=pk).update(stock=stock - cantidad)
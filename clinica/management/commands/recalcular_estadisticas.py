@@ -0,0 +1,72 @@
+# clinica/management/commands/recalcular_estadisticas.py
+
+# Bloque de Importaciones
+# ======================================================================
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from clinica.models import Consulta_Medica, Estadistica_Diaria_Consulta
+
+TAMANO_LOTE = 5000 # Filas del resumen por INSERT
+
+class Command(BaseCommand):
+    """
+    Reconstruye Estadistica_Diaria_Consulta a partir de Consulta_Medica para
+    un rango de días (por defecto, todo el historial). Se usa para la carga
+    inicial del resumen y después de cargas o cambios masivos que no pasan
+    por las señales (QuerySet.update(), SQL directo). Es idempotente: borra
+    y vuelve a calcular solo los días del rango.
+    """
+    help = 'Recalcula el resumen diario de consultas por médico y estado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=self.fecha, help='Primer día a recalcular (AAAA-MM-DD).')
+        parser.add_argument('--hasta', type=self.fecha, help='Último día a recalcular (AAAA-MM-DD).')
+
+    @staticmethod
+    def fecha(valor):
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+
+    def handle(self, *args, **options):
+        desde, hasta = options['desde'], options['hasta']
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde debe ser anterior o igual a --hasta.')
+
+        consultas = Consulta_Medica.objects.all()
+        resumen = Estadistica_Diaria_Consulta.objects.all()
+        # Límites como instantes (no fecha_consulta__date) para usar el índice sobre fecha_consulta
+        if desde:
+            consultas = consultas.filter(fecha_consulta__gte=timezone.make_aware(datetime.combine(desde, time.min)))
+            resumen = resumen.filter(fecha__gte=desde)
+        if hasta:
+            fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+            consultas = consultas.filter(fecha_consulta__lt=fin)
+            resumen = resumen.filter(fecha__lte=hasta)
+
+        filas = (
+            consultas.order_by()
+            .annotate(dia=TruncDate('fecha_consulta')) # Día en la zona horaria activa, igual que las señales
+            .values('dia', 'medico_id', 'estado')
+            .annotate(cantidad=Count('id'))
+            .iterator(chunk_size=TAMANO_LOTE)
+        )
+
+        total = 0
+        with transaction.atomic():
+            resumen.delete()
+            lote = []
+            for fila in filas:
+                lote.append(Estadistica_Diaria_Consulta(
+                    fecha=fila['dia'], medico_id=fila['medico_id'], estado=fila['estado'], cantidad=fila['cantidad'],
+                ))
+                if len(lote) >= TAMANO_LOTE:
+                    Estadistica_Diaria_Consulta.objects.bulk_create(lote)
+                    total += len(lote)
+                    lote = []
+            Estadistica_Diaria_Consulta.objects.bulk_create(lote)
+            total += len(lote)
+
+        self.stdout.write(self.style.SUCCESS(f'Resumen recalculado: {total} filas.'))
@@ -0,0 +1,58 @@
+# clinica/management/commands/reindexar_busqueda.py
+
+# Bloque de Importaciones
+# ======================================================================
+from datetime import datetime, time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from clinica.models import Consulta_Medica, Documento_Busqueda, Paciente
+
+TAMANO_LOTE = 5000 # Documentos por sentencia INSERT ... ON CONFLICT
+
+class Command(BaseCommand):
+    """
+    Recalcula los documentos de la búsqueda unificada (Documento_Busqueda)
+    de todos los pacientes y consultas, o solo de las consultas desde una
+    fecha. Se usa para la carga inicial de la tabla y después de cargas o
+    cambios masivos que no pasan por las señales (QuerySet.update(), COPY,
+    SQL directo). Es idempotente y cada lote se confirma por separado: no
+    mantiene una transacción abierta sobre toda la tabla.
+    """
+    help = 'Recalcula los documentos de la búsqueda unificada.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desde', type=self.fecha,
+            help='Solo las consultas desde este día (AAAA-MM-DD) y sin los documentos de pacientes.',
+        )
+
+    @staticmethod
+    def fecha(valor):
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+
+    def handle(self, *args, **options):
+        consultas = Consulta_Medica.objects.all()
+        total = 0
+        if options['desde']:
+            consultas = consultas.filter(
+                fecha_consulta__gte=timezone.make_aware(datetime.combine(options['desde'], time.min))
+            )
+        else:
+            for lote in self.lotes(Paciente.objects.all()):
+                Documento_Busqueda.indexar(pacientes=lote)
+                total += len(lote)
+        for lote in self.lotes(consultas):
+            Documento_Busqueda.indexar(consultas=lote)
+            total += len(lote)
+        self.stdout.write(self.style.SUCCESS(f'Documentos de búsqueda recalculados: {total}.'))
+
+    @staticmethod
+    def lotes(queryset):
+        """IDs en orden, de a TAMANO_LOTE (paginación por ID: no se relee la tabla desde el inicio)."""
+        ultimo = 0
+        while True:
+            lote = list(queryset.filter(id__gt=ultimo).order_by('id').values_list('id', flat=True)[:TAMANO_LOTE])
+            if not lote:
+                return
+            yield lote
+            ultimo = lote[-1]
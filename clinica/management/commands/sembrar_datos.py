@@ -0,0 +1,283 @@
+# clinica/management/commands/sembrar_datos.py
+
+# Bloque de Importaciones
+# ======================================================================
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from clinica.cache import invalidar_modelo
+from clinica.models import (
+    Departamento, Especialidad, Paciente, Medico, Consulta_Medica,
+    Tratamiento, Medicamento, Receta_Medica, Documento_Busqueda
+)
+
+# ======================================================================
+# CATÁLOGOS PARA LOS DATOS SINTÉTICOS
+# ======================================================================
+
+DEPARTAMENTOS = {
+    'Medicina Interna': ['Medicina General', 'Cardiología', 'Endocrinología', 'Gastroenterología', 'Nefrología', 'Neumología'],
+    'Cirugía': ['Cirugía General', 'Traumatología', 'Urología', 'Neurocirugía'],
+    'Pediatría': ['Pediatría General', 'Neonatología'],
+    'Ginecología y Obstetricia': ['Ginecología', 'Obstetricia'],
+    'Salud Mental': ['Psiquiatría', 'Psicología Clínica'],
+    'Especialidades Médicas': ['Dermatología', 'Oftalmología', 'Otorrinolaringología', 'Neurología', 'Reumatología', 'Oncología'],
+}
+# Las especialidades de atención primaria concentran la mayor parte de los médicos
+PESO_ESPECIALIDAD = {'Medicina General': 8, 'Pediatría General': 4, 'Ginecología': 3, 'Traumatología': 3}
+
+NOMBRES = [
+    'María', 'José', 'Juan', 'Ana', 'Francisca', 'Carlos', 'Camila', 'Luis', 'Catalina', 'Jorge',
+    'Valentina', 'Diego', 'Javiera', 'Pedro', 'Constanza', 'Felipe', 'Fernanda', 'Cristián', 'Daniela', 'Sebastián',
+    'Carolina', 'Matías', 'Paula', 'Tomás', 'Isidora', 'Benjamín', 'Sofía', 'Vicente', 'Antonia', 'Ignacio',
+]
+APELLIDOS = [
+    'González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda',
+    'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya', 'Flores', 'Espinoza', 'Valenzuela',
+    'Castillo', 'Tapia', 'Reyes', 'Gutiérrez', 'Castro', 'Pizarro', 'Álvarez', 'Vásquez', 'Sánchez', 'Fernández',
+]
+TIPOS_SANGRE = ['O+'] * 56 + ['A+'] * 28 + ['B+'] * 8 + ['O-'] * 4 + ['A-', 'A-', 'AB+', 'B-'] # Frecuencias aproximadas
+COMUNAS = ['Santiago', 'Providencia', 'Ñuñoa', 'Maipú', 'La Florida', 'Puente Alto', 'Las Condes', 'Valparaíso', 'Concepción', 'Temuco']
+
+PRINCIPIOS_ACTIVOS = [
+    'Paracetamol', 'Ibuprofeno', 'Amoxicilina', 'Losartán', 'Metformina', 'Omeprazol', 'Atorvastatina', 'Salbutamol',
+    'Enalapril', 'Levotiroxina', 'Sertralina', 'Clonazepam', 'Loratadina', 'Prednisona', 'Azitromicina', 'Naproxeno',
+    'Ciprofloxacino', 'Amlodipino', 'Insulina Glargina', 'Ácido Acetilsalicílico',
+]
+PRESENTACIONES = ['5 mg', '10 mg', '20 mg', '50 mg', '100 mg', '250 mg', '500 mg', '1 g']
+LABORATORIOS = ['Laboratorio Chile', 'Saval', 'Andrómaco', 'Recalcine', 'Bagó', 'Pfizer', 'Bayer', 'Roche', 'Novartis', 'Sanofi']
+
+MOTIVOS = ['Control', 'Dolor abdominal', 'Cefalea', 'Fiebre', 'Tos persistente', 'Control de presión arterial',
+           'Dolor lumbar', 'Chequeo preventivo', 'Control de diabetes', 'Resultados de exámenes', 'Lesión deportiva']
+DIAGNOSTICOS = ['Hipertensión arterial', 'Diabetes mellitus tipo 2', 'Infección respiratoria alta', 'Gastritis',
+                'Lumbago mecánico', 'Migraña', 'Bronquitis aguda', 'Sin hallazgos', 'Dislipidemia', 'Esguince de tobillo']
+TRATAMIENTOS = ['Reposo relativo', 'Kinesioterapia', 'Dieta hiposódica', 'Control en 30 días', 'Ejercicio aeróbico',
+                'Curación de herida', 'Fisioterapia respiratoria']
+DOSIS = ['1 comprimido', '2 comprimidos', '5 ml', '10 ml', '1 inhalación', '2 inhalaciones']
+FRECUENCIAS = ['Cada 8 horas', 'Cada 12 horas', 'Cada 24 horas', 'Cada 6 horas', 'En caso de dolor']
+DURACIONES = ['5 días', '7 días', '10 días', '14 días', '30 días', 'Uso crónico']
+
+# Columnas que se escriben con COPY (el 'id' se asigna aquí para conocer los rangos de cada tabla)
+COLUMNAS = {
+    Paciente: ['id', 'rut', 'rut_normalizado', 'nombre', 'apellido', 'fecha_nacimiento', 'tipo_sangre', 'correo',
+               'telefono', 'direccion', 'activo'],
+    Medico: ['id', 'rut', 'rut_normalizado', 'nombre', 'apellido', 'correo', 'telefono', 'activo', 'especialidad_id'],
+    Medicamento: ['id', 'nombre', 'laboratorio', 'stock', 'precio_unitario'],
+    Consulta_Medica: ['id', 'paciente_id', 'medico_id', 'fecha_consulta', 'motivo', 'diagnostico', 'estado'],
+    Tratamiento: ['consulta_id', 'descripcion', 'duracion_dias', 'observaciones'],
+    Receta_Medica: ['consulta_id', 'medicamento_id', 'dosis', 'frecuencia', 'duracion', 'cantidad'],
+}
+
+TAMANO_LOTE_BUSQUEDA = 5000 # Documentos de búsqueda por INSERT ... ON CONFLICT
+
+def digito_verificador(numero):
+    """Dígito verificador del RUT (módulo 11)."""
+    suma, factor = 0, 2
+    for digito in reversed(str(numero)):
+        suma += int(digito) * factor
+        factor = 2 if factor == 7 else factor + 1
+    resto = 11 - suma % 11
+    return {11: '0', 10: 'K'}.get(resto, str(resto))
+
+class Command(BaseCommand):
+    """
+    Carga datos sintéticos en las ocho tablas de la clínica a escala de
+    millones de filas. Departamentos y especialidades (catálogo fijo) se
+    insertan con bulk_create; el resto con COPY ... FROM STDIN, que evita el
+    costo de un INSERT por fila. Las distribuciones imitan una clínica real:
+    pocos pacientes y médicos concentran muchas consultas, las consultas
+    recientes son las pendientes y solo las realizadas tienen diagnóstico,
+    tratamientos y recetas. Los IDs se asignan aquí (sobre el máximo actual)
+    para repartir las FK sin volver a leer las tablas; se puede ejecutar
+    varias veces sobre una base con datos. COPY no pasa por save() ni por
+    las señales: al final se recalcula el resumen diario, se indexan los
+    documentos de búsqueda, se renuevan las versiones de la caché y no se
+    descuenta stock por las recetas.
+    """
+    help = 'Siembra datos sintéticos (millones de filas con COPY) para pruebas de carga.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consultas', type=int, default=1_000_000, help='Consultas médicas a generar.')
+        parser.add_argument('--pacientes', type=int, help='Pacientes (por defecto, uno cada 20 consultas).')
+        parser.add_argument('--medicos', type=int, help='Médicos (por defecto, uno cada 5.000 consultas; mínimo 30).')
+        parser.add_argument('--medicamentos', type=int, default=500, help='Medicamentos del catálogo.')
+        parser.add_argument('--anios', type=int, default=5, help='Años de historial de consultas.')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla del generador (datos reproducibles).')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('La carga con COPY requiere PostgreSQL.')
+        consultas = options['consultas']
+        pacientes = options['pacientes'] or max(consultas // 20, 100)
+        medicos = options['medicos'] or max(consultas // 5000, 30)
+        if min(consultas, pacientes, medicos, options['medicamentos']) < 1:
+            raise CommandError('Las cantidades deben ser positivas.')
+        self.azar = random.Random(options['semilla'])
+        self.ahora = timezone.now()
+
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            especialidades = self.sembrar_catalogo()
+            with connection.cursor() as cursor:
+                # Los IDs se calculan sobre el máximo actual: nadie más debe insertar mientras tanto
+                tablas = ', '.join(modelo._meta.db_table for modelo in COLUMNAS)
+                cursor.execute(f'LOCK TABLE {tablas} IN SHARE ROW EXCLUSIVE MODE')
+                self.cursor = cursor
+                self.pacientes = self.copiar(Paciente, self.filas_pacientes, pacientes)
+                self.medicos = self.copiar(Medico, lambda base, n: self.filas_medicos(base, n, especialidades), medicos)
+                self.medicamentos = self.copiar(Medicamento, self.filas_medicamentos, options['medicamentos'])
+                self.realizadas = bytearray(consultas) # 1 si la consulta i quedó REALIZADA
+                self.consultas = self.copiar(
+                    Consulta_Medica, lambda base, n: self.filas_consultas(base, n, options['anios']), consultas
+                )
+                self.copiar(Tratamiento, self.filas_tratamientos)
+                self.copiar(Receta_Medica, self.filas_recetas)
+                for modelo in COLUMNAS: # COPY con IDs explícitos no avanza la secuencia
+                    tabla = modelo._meta.db_table
+                    cursor.execute(
+                        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), (SELECT max(id) FROM {tabla}))", [tabla]
+                    )
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {', '.join(modelo._meta.db_table for modelo in COLUMNAS)}")
+        desde = (self.ahora - timedelta(days=365 * options['anios'] + 1)).date()
+        call_command('recalcular_estadisticas', desde=desde, stdout=self.stdout)
+        self.indexar_busqueda()
+        for modelo in (Departamento, Especialidad, *COLUMNAS):
+            invalidar_modelo(modelo)
+        self.stdout.write(self.style.SUCCESS(f'Datos sembrados en {time.perf_counter() - inicio:.1f} s'))
+
+    def sembrar_catalogo(self):
+        """Departamentos y especialidades del catálogo fijo; retorna [(id, peso)] de las especialidades."""
+        Departamento.objects.bulk_create(
+            [Departamento(nombre=nombre) for nombre in DEPARTAMENTOS], ignore_conflicts=True
+        )
+        departamentos = dict(Departamento.objects.filter(nombre__in=DEPARTAMENTOS).values_list('nombre', 'id'))
+        Especialidad.objects.bulk_create(
+            [
+                Especialidad(nombre=nombre, departamento_id=departamentos[departamento])
+                for departamento, nombres in DEPARTAMENTOS.items() for nombre in nombres
+            ],
+            ignore_conflicts=True,
+        )
+        nombres = [nombre for lista in DEPARTAMENTOS.values() for nombre in lista]
+        return [
+            (pk, PESO_ESPECIALIDAD.get(nombre, 1))
+            for nombre, pk in Especialidad.objects.filter(nombre__in=nombres).values_list('nombre', 'id')
+        ]
+
+    def copiar(self, modelo, generador, cantidad=None):
+        """
+        Escribe con COPY las filas de generador(base, cantidad) y retorna el
+        rango de IDs asignados. Sin 'cantidad', la tabla no recibe IDs propios.
+        """
+        tabla = modelo._meta.db_table
+        self.cursor.execute(f'SELECT COALESCE(max(id), 0) FROM {tabla}')
+        base = self.cursor.fetchone()[0] + 1
+        inicio = time.perf_counter()
+        filas = 0
+        columnas = ', '.join(COLUMNAS[modelo])
+        # Cursor de psycopg: Django no expone COPY
+        with self.cursor.cursor.copy(f'COPY {tabla} ({columnas}) FROM STDIN') as copia:
+            for fila in generador(base, cantidad):
+                copia.write_row(fila)
+                filas += 1
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(f'{tabla:<28} {filas:>10} filas  {filas / max(duracion, 1e-9):>10.0f} filas/s')
+        return range(base, base + filas)
+
+    def indexar_busqueda(self):
+        """Documentos de búsqueda de los pacientes y consultas sembrados (COPY no emite señales)."""
+        inicio = time.perf_counter()
+        for clave, ids in (('pacientes', self.pacientes), ('consultas', self.consultas)):
+            for desde in range(0, len(ids), TAMANO_LOTE_BUSQUEDA):
+                Documento_Busqueda.indexar(**{clave: ids[desde:desde + TAMANO_LOTE_BUSQUEDA]})
+        self.stdout.write(f'Documentos de búsqueda indexados en {time.perf_counter() - inicio:.1f} s')
+
+    def nombre_persona(self):
+        azar = self.azar
+        return azar.choice(NOMBRES), f'{azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}'
+
+    def rut(self, numero):
+        dv = digito_verificador(numero)
+        return f'{numero}-{dv}', f'{numero}{dv}'
+
+    def filas_pacientes(self, base, cantidad):
+        azar = self.azar
+        hoy = self.ahora.date()
+        for pk in range(base, base + cantidad):
+            nombre, apellido = self.nombre_persona()
+            rut, rut_normalizado = self.rut(30_000_000 + pk) # Rango propio: no choca con RUT reales
+            yield (
+                pk, rut, rut_normalizado, nombre, apellido,
+                hoy - timedelta(days=azar.randint(0, 95 * 365)), azar.choice(TIPOS_SANGRE),
+                f'paciente{pk}@clinica.test',
+                f'+569{azar.randint(10_000_000, 99_999_999)}' if azar.random() < 0.9 else None,
+                f'{azar.choice(COMUNAS)} {azar.randint(1, 9999)}' if azar.random() < 0.8 else None,
+                azar.random() < 0.97,
+            )
+
+    def filas_medicos(self, base, cantidad, especialidades):
+        ids, pesos = zip(*especialidades)
+        for pk, especialidad in zip(range(base, base + cantidad), self.azar.choices(ids, pesos, k=cantidad)):
+            nombre, apellido = self.nombre_persona()
+            rut, rut_normalizado = self.rut(20_000_000 + pk)
+            yield (
+                pk, rut, rut_normalizado, nombre, apellido, f'medico{pk}@clinica.test',
+                f'+569{self.azar.randint(10_000_000, 99_999_999)}', self.azar.random() < 0.95, especialidad,
+            )
+
+    def filas_medicamentos(self, base, cantidad):
+        azar = self.azar
+        for pk in range(base, base + cantidad):
+            yield (
+                pk, f'{azar.choice(PRINCIPIOS_ACTIVOS)} {azar.choice(PRESENTACIONES)}', azar.choice(LABORATORIOS),
+                azar.randint(1_000, 100_000), Decimal(azar.randint(50_000, 5_000_000)) / 100,
+            )
+
+    def sesgado(self, rango, exponente):
+        """Elemento de 'rango' con sesgo hacia el inicio: unos pocos concentran la mayoría de las filas."""
+        return rango[int(len(rango) * self.azar.random() ** exponente)]
+
+    def filas_consultas(self, base, cantidad, anios):
+        azar = self.azar
+        segundos = anios * 365 * 86400
+        reciente = self.ahora - timedelta(days=30)
+        for i in range(cantidad):
+            fecha = self.ahora - timedelta(seconds=azar.random() * segundos)
+            fecha = fecha.replace(hour=azar.randint(8, 19), minute=azar.choice((0, 15, 30, 45)), second=0, microsecond=0)
+            if fecha > self.ahora:
+                fecha -= timedelta(days=1)
+            if fecha > reciente:
+                estado = 'PENDIENTE' if azar.random() < 0.7 else 'REALIZADA'
+            else:
+                estado = 'REALIZADA' if azar.random() < 0.88 else 'CANCELADA'
+            realizada = estado == 'REALIZADA'
+            self.realizadas[i] = realizada
+            yield (
+                base + i, self.sesgado(self.pacientes, 2), self.sesgado(self.medicos, 1.5), fecha,
+                azar.choice(MOTIVOS), azar.choice(DIAGNOSTICOS) if realizada else None, estado,
+            )
+
+    def consultas_realizadas(self):
+        return (pk for pk, realizada in zip(self.consultas, self.realizadas) if realizada)
+
+    def filas_tratamientos(self, base, cantidad):
+        azar = self.azar
+        for consulta in self.consultas_realizadas():
+            if azar.random() < 0.4: # Cuatro de cada diez consultas realizadas indican un tratamiento
+                for _ in range(azar.choice((1, 1, 1, 2))):
+                    yield (consulta, azar.choice(TRATAMIENTOS), azar.choice((3, 5, 7, 14, 30, 90)),
+                           'Sin observaciones' if azar.random() < 0.3 else None)
+
+    def filas_recetas(self, base, cantidad):
+        azar = self.azar
+        for consulta in self.consultas_realizadas():
+            for _ in range(azar.choice((0, 0, 1, 1, 1, 2, 3))): # ~1,1 recetas por consulta realizada
+                yield (consulta, self.sesgado(self.medicamentos, 2), azar.choice(DOSIS), azar.choice(FRECUENCIAS),
+                       azar.choice(DURACIONES), azar.randint(1, 3))
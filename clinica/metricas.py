@@ -0,0 +1,164 @@
+# clinica/metricas.py
+
+# Bloque de Importaciones
+# ======================================================================
+import threading # Las métricas del proceso se actualizan desde varios hilos
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar # Registro del request en curso (hilo o tarea asíncrona)
+
+# ======================================================================
+# TIEMPOS POR FASE DEL REQUEST (Server-Timing)
+# TiemposServidorMiddleware (middleware.py) instala un RegistroTiempos por
+# request; el SQL se mide con un execute_wrapper, el render con las
+# devoluciones de TemplateResponse, y el resto del código marca sus fases
+# con medir_fase(). Las fases pueden superponerse: el SQL que se ejecuta
+# mientras se serializa (ej: un queryset sin paginar) cuenta en ambas.
+# Sin CLINICA_METRICAS el middleware no se carga y medir_fase() solo lee
+# una ContextVar vacía.
+# ======================================================================
+
+# Fase -> descripción de la cabecera Server-Timing (ASCII: es una cabecera HTTP)
+FASES = {
+    'db': 'SQL',
+    'filtros': 'Filtros y ordenamiento',
+    'serializacion': 'Serializacion',
+    'render': 'Render (plantilla o JSON)',
+}
+
+_registro_request = ContextVar('clinica_tiempos_request', default=None)
+
+class RegistroTiempos:
+    """Segundos acumulados por fase y cantidad de consultas SQL de un request."""
+
+    def __init__(self):
+        self.fases = dict.fromkeys(FASES, 0.0)
+        self.consultas_sql = 0
+        self.abiertas = set() # Una fase anidada en sí misma (ej: serializadores expandidos) se mide una vez
+        self.inicio_render = None
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper de las conexiones: tiempo y cantidad de consultas SQL."""
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.fases['db'] += time.perf_counter() - inicio
+            self.consultas_sql += 1
+
+    @contextmanager
+    def fase(self, nombre):
+        if nombre in self.abiertas:
+            yield
+            return
+        self.abiertas.add(nombre)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fases[nombre] += time.perf_counter() - inicio
+            self.abiertas.discard(nombre)
+
+    def server_timing(self, total):
+        """Valor de la cabecera Server-Timing (duraciones en milisegundos)."""
+        metricas = [f'db;dur={self.fases["db"] * 1000:.1f};desc="SQL ({self.consultas_sql} consultas)"']
+        metricas += [
+            f'{fase};dur={segundos * 1000:.1f};desc="{FASES[fase]}"'
+            for fase, segundos in self.fases.items() if fase != 'db' and segundos
+        ]
+        metricas.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metricas)
+
+@contextmanager
+def registrar_request():
+    """Instala un RegistroTiempos para el request en curso (lo usa el middleware)."""
+    registro = RegistroTiempos()
+    token = _registro_request.set(registro)
+    try:
+        yield registro
+    finally:
+        _registro_request.reset(token)
+
+def registro_actual():
+    """RegistroTiempos del request en curso, o None si las métricas están desactivadas."""
+    return _registro_request.get()
+
+@contextmanager
+def medir_fase(nombre):
+    """Suma la duración del bloque a la fase 'nombre' del request en curso."""
+    registro = _registro_request.get()
+    if registro is None:
+        yield
+        return
+    with registro.fase(nombre):
+        yield
+
+# ======================================================================
+# MÉTRICAS DEL PROCESO EN FORMATO PROMETHEUS (GET /metrics/)
+# Histograma de latencia por ruta (nombre de la URL), método y código de
+# estado, más los totales por fase y de consultas SQL. Son por proceso:
+# con varios workers, Prometheus debe leer cada uno.
+# ======================================================================
+
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Segundos
+
+def _etiquetas(**valores):
+    escapar = lambda valor: str(valor).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return ','.join(f'{clave}="{escapar(valor)}"' for clave, valor in valores.items())
+
+class MetricasProceso:
+    """Acumuladores de las métricas de los requests atendidos por este proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {} # (ruta, método, código) -> [conteo por límite..., suma, total]
+        self.fases = {} # (ruta, fase) -> segundos
+        self.consultas_sql = {} # ruta -> consultas
+
+    def registrar(self, ruta, metodo, codigo, duracion, registro):
+        with self._lock:
+            serie = self.latencias.setdefault((ruta, metodo, codigo), [0] * len(LIMITES_LATENCIA) + [0.0, 0])
+            for i, limite in enumerate(LIMITES_LATENCIA):
+                if duracion <= limite:
+                    serie[i] += 1
+            serie[-2] += duracion
+            serie[-1] += 1
+            for fase, segundos in registro.fases.items():
+                if segundos:
+                    self.fases[(ruta, fase)] = self.fases.get((ruta, fase), 0.0) + segundos
+            self.consultas_sql[ruta] = self.consultas_sql.get(ruta, 0) + registro.consultas_sql
+
+    def exposicion(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)."""
+        with self._lock:
+            latencias = {clave: list(serie) for clave, serie in self.latencias.items()}
+            fases, consultas = dict(self.fases), dict(self.consultas_sql)
+
+        lineas = [
+            '# HELP clinica_request_duracion_segundos Latencia de los requests por ruta.',
+            '# TYPE clinica_request_duracion_segundos histogram',
+        ]
+        for (ruta, metodo, codigo), serie in sorted(latencias.items()):
+            etiquetas = _etiquetas(ruta=ruta, metodo=metodo, codigo=codigo)
+            for limite, conteo in zip(LIMITES_LATENCIA, serie):
+                lineas.append(f'clinica_request_duracion_segundos_bucket{{{etiquetas},le="{limite}"}} {conteo}')
+            lineas.append(f'clinica_request_duracion_segundos_bucket{{{etiquetas},le="+Inf"}} {serie[-1]}')
+            lineas.append(f'clinica_request_duracion_segundos_sum{{{etiquetas}}} {serie[-2]:.6f}')
+            lineas.append(f'clinica_request_duracion_segundos_count{{{etiquetas}}} {serie[-1]}')
+
+        lineas += [
+            '# HELP clinica_fase_segundos_total Tiempo acumulado por fase del request (db, filtros, serializacion, render).',
+            '# TYPE clinica_fase_segundos_total counter',
+        ]
+        for (ruta, fase), segundos in sorted(fases.items()):
+            lineas.append(f'clinica_fase_segundos_total{{{_etiquetas(ruta=ruta, fase=fase)}}} {segundos:.6f}')
+
+        lineas += [
+            '# HELP clinica_sql_consultas_total Consultas SQL ejecutadas por ruta.',
+            '# TYPE clinica_sql_consultas_total counter',
+        ]
+        for ruta, total in sorted(consultas.items()):
+            lineas.append(f'clinica_sql_consultas_total{{{_etiquetas(ruta=ruta)}}} {total}')
+        return '\n'.join(lineas) + '\n'
+
+metricas_proceso = MetricasProceso()
@@ -0,0 +1,239 @@
+# clinica/middleware.py
+
+# Bloque de Importaciones
+# ======================================================================
+import logging # Reporte de excesos de consultas y patrones N+1
+import re # Normalización de la "forma" de cada consulta SQL
+import time # Medición del tiempo de cada consulta
+from collections import Counter # Conteo de consultas idénticas por request
+from contextlib import ExitStack # Permite instalar el wrapper en todas las conexiones a la vez
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async # Middleware síncrono y asíncrono
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from .metricas import metricas_proceso, registrar_request, registro_actual # Server-Timing y /metrics/
+from .routers import estado_request, replicas_configuradas # Lecturas en réplicas
+
+logger = logging.getLogger('clinica.sql')
+
+# ======================================================================
+# MONITOR DE CONSULTAS SQL POR REQUEST (opt-in con CLINICA_MONITOR_SQL)
+# Registra la cantidad y el tiempo de las consultas de cada request,
+# detecta consultas repetidas con la misma forma (patrón N+1) y controla
+# el presupuesto de consultas que cada vista declara.
+# ======================================================================
+
+class PresupuestoConsultasExcedido(Exception):
+    """Se lanza en modo estricto cuando una vista supera su presupuesto de consultas SQL."""
+
+# Colapsa listas de parámetros (IN (%s, %s, ...)) para que su largo no cambie la forma
+_PARAMETROS_REPETIDOS = re.compile(r'%s(?:\s*,\s*%s)+')
+
+def forma_consulta(sql):
+    """Retorna la consulta SQL normalizada: mismas tablas y condiciones = misma forma."""
+    return _PARAMETROS_REPETIDOS.sub('%s', sql)
+
+class RegistroConsultas:
+    """
+    Wrapper de ejecución (connection.execute_wrapper) que acumula la cantidad,
+    el tiempo total y la forma de las consultas ejecutadas durante un request.
+    """
+    def __init__(self):
+        self.cantidad = 0
+        self.tiempo = 0.0 # Segundos
+        self.formas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo += time.perf_counter() - inicio
+            self.cantidad += 1
+            self.formas[forma_consulta(sql)] += 1
+
+    def patrones_n_mas_1(self, umbral):
+        """Formas de consulta que se repitieron al menos 'umbral' veces."""
+        return {forma: veces for forma, veces in self.formas.items() if veces >= umbral}
+
+def presupuesto_de_vista(request):
+    """
+    Presupuesto de consultas declarado por la vista que atendió el request
+    (atributo 'presupuesto_consultas' de la vista basada en clase o del ViewSet).
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    vista = getattr(match.func, 'view_class', None) or getattr(match.func, 'cls', None)
+    return getattr(vista, 'presupuesto_consultas', None)
+
+class ConsultasSQLMiddleware:
+    """
+    Middleware opt-in (CLINICA_MONITOR_SQL = True) que agrega a cada respuesta
+    las cabeceras X-SQL-Consultas, X-SQL-Tiempo-ms y X-SQL-N-Mas-1, registra en
+    el logger 'clinica.sql' los patrones N+1 y los excesos de presupuesto, y en
+    modo estricto (CLINICA_PRESUPUESTO_ESTRICTO, pensado para las pruebas)
+    lanza PresupuestoConsultasExcedido.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'CLINICA_MONITOR_SQL', False):
+            raise MiddlewareNotUsed # Desactivado: no agrega ningún costo por request
+        self.get_response = get_response
+
+    def __call__(self, request):
+        registro = RegistroConsultas()
+        request.consultas_sql = registro # Disponible para vistas y herramientas de depuración
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(registro))
+            response = self.get_response(request)
+
+        umbral = getattr(settings, 'CLINICA_N_MAS_1_UMBRAL', 5)
+        patrones = registro.patrones_n_mas_1(umbral)
+        response['X-SQL-Consultas'] = str(registro.cantidad)
+        response['X-SQL-Tiempo-ms'] = f'{registro.tiempo * 1000:.1f}'
+        response['X-SQL-N-Mas-1'] = str(len(patrones))
+
+        for forma, veces in patrones.items():
+            logger.warning('Posible N+1 en %s: %d consultas con la forma %s', request.path, veces, forma)
+
+        presupuesto = presupuesto_de_vista(request)
+        if presupuesto is not None and registro.cantidad > presupuesto:
+            mensaje = (
+                f'{request.path} ejecutó {registro.cantidad} consultas SQL '
+                f'(presupuesto de la vista: {presupuesto})'
+            )
+            if getattr(settings, 'CLINICA_PRESUPUESTO_ESTRICTO', False):
+                raise PresupuestoConsultasExcedido(mensaje)
+            logger.warning(mensaje)
+
+        return response
+
+# ======================================================================
+# LECTURAS EN RÉPLICAS CON FIJACIÓN AL PRIMARIO (ver clinica/routers.py)
+# ======================================================================
+
+class LecturaEnReplicaMiddleware:
+    """
+    Habilita las lecturas en réplicas (settings.CLINICA_DB_REPLICAS) para los
+    requests seguros. Tras un request que escribe (método no seguro o una
+    escritura durante el request) se envía la cookie COOKIE_FIJACION, y
+    durante CLINICA_REPLICA_FIJACION_SEGUNDOS las lecturas de ese cliente van
+    al primario: ve sus propios cambios aunque las réplicas vayan atrasadas.
+    Sin réplicas configuradas se desactiva. Soporta vistas síncronas y asíncronas.
+    """
+    sync_capable = True
+    async_capable = True
+    METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+    COOKIE_FIJACION = 'clinica_primario_hasta'
+
+    def __init__(self, get_response):
+        if not replicas_configuradas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.ventana = getattr(settings, 'CLINICA_REPLICA_FIJACION_SEGUNDOS', 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with estado_request(self.lectura_en_replica(request)) as estado:
+            response = self.get_response(request)
+        return self.fijar_si_escribio(request, response, estado)
+
+    async def __acall__(self, request):
+        with estado_request(self.lectura_en_replica(request)) as estado:
+            response = await self.get_response(request)
+        return self.fijar_si_escribio(request, response, estado)
+
+    def lectura_en_replica(self, request):
+        if request.method not in self.METODOS_SEGUROS:
+            return False
+        try:
+            fijado_hasta = float(request.COOKIES.get(self.COOKIE_FIJACION, 0))
+        except ValueError:
+            fijado_hasta = 0
+        return fijado_hasta <= time.time()
+
+    def fijar_si_escribio(self, request, response, estado):
+        if request.method not in self.METODOS_SEGUROS or estado['escritura']:
+            response.set_cookie(
+                self.COOKIE_FIJACION, f'{time.time() + self.ventana:.3f}',
+                max_age=self.ventana, httponly=True, samesite='Lax',
+            )
+        return response
+
+# ======================================================================
+# TIEMPOS POR FASE Y MÉTRICAS (opt-in con CLINICA_METRICAS, ver clinica/metricas.py)
+# ======================================================================
+
+class TiemposServidorMiddleware:
+    """
+    Middleware opt-in (CLINICA_METRICAS = True) que mide cada request por
+    fases (SQL, filtros, serialización y render), agrega la cabecera
+    Server-Timing (visible en las herramientas de desarrollo del navegador)
+    y acumula el histograma de latencia por ruta que expone /metrics/.
+    Desactivado no se carga. Soporta vistas síncronas y asíncronas.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'CLINICA_METRICAS', False):
+            raise MiddlewareNotUsed # Desactivado: no agrega ningún costo por request
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inicio = time.perf_counter()
+        with registrar_request() as registro, self.medir_sql(registro):
+            response = self.get_response(request)
+        return self.registrar(request, response, registro, inicio)
+
+    async def __acall__(self, request):
+        inicio = time.perf_counter()
+        with registrar_request() as registro:
+            # El ORM asíncrono ejecuta el SQL en el hilo de sync_to_async (thread_sensitive),
+            # que tiene sus propias conexiones: el wrapper se instala y se quita en ese hilo
+            pila = await sync_to_async(self.medir_sql)(registro)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(pila.close)()
+        return self.registrar(request, response, registro, inicio)
+
+    @staticmethod
+    def medir_sql(registro):
+        """Instala el registro como execute_wrapper de todas las conexiones (réplicas incluidas)."""
+        pila = ExitStack()
+        for connection in connections.all():
+            pila.enter_context(connection.execute_wrapper(registro))
+        return pila
+
+    def process_template_response(self, request, response):
+        # Es el último process_template_response antes del render (TemplateResponse o Response de DRF)
+        registro = registro_actual()
+        if registro is not None:
+            registro.inicio_render = time.perf_counter()
+            response.add_post_render_callback(self.fin_render)
+        return response
+
+    @staticmethod
+    def fin_render(response):
+        registro = registro_actual()
+        if registro is not None and registro.inicio_render is not None:
+            registro.fases['render'] += time.perf_counter() - registro.inicio_render
+            registro.inicio_render = None
+
+    def registrar(self, request, response, registro, inicio):
+        # En respuestas en streaming el total no incluye el envío del cuerpo
+        total = time.perf_counter() - inicio
+        response['Server-Timing'] = registro.server_timing(total)
+        match = getattr(request, 'resolver_match', None)
+        ruta = match.view_name if match is not None else 'sin_ruta' # Nombre de la URL: cardinalidad acotada
+        metricas_proceso.registrar(ruta, request.method, response.status_code, total, registro)
+        return response
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:04
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently, TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Los índices se crean con CREATE INDEX CONCURRENTLY (sin bloquear escrituras),
+    # lo que no puede ejecutarse dentro de una transacción.
+    atomic = False
+
+    dependencies = [
+        ('clinica', '0001_initial'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='medico',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('nombre'), name='gin_trgm_ops'), name='medico_nombre_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='medico',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('apellido'), name='gin_trgm_ops'), name='medico_apellido_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='medico',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('rut'), name='gin_trgm_ops'), name='medico_rut_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='paciente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('nombre'), name='gin_trgm_ops'), name='paciente_nombre_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='paciente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('apellido'), name='gin_trgm_ops'), name='paciente_apellido_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='paciente',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('rut'), name='gin_trgm_ops'), name='paciente_rut_trgm'),
+        ),
+    ]
@@ -0,0 +1,145 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:05
+
+from django.db import migrations, models, transaction
+from django.db.models import Count
+
+# Filas por lote del backfill: cada lote es una transacción corta, así las
+# filas se bloquean solo mientras se actualiza su propio lote.
+TAMANO_LOTE = 1000
+
+
+def normalizar_rut(rut):
+    """Copia de clinica.models.normalizar_rut (las migraciones no importan código del modelo)."""
+    if rut is None:
+        return None
+    return ''.join(caracter for caracter in rut if caracter.isalnum()).upper()
+
+
+def rellenar_rut_normalizado(apps, schema_editor):
+    """Calcula rut_normalizado de las filas existentes, en lotes ordenados por ID."""
+    for nombre_modelo in ('Paciente', 'Medico'):
+        modelo = apps.get_model('clinica', nombre_modelo)
+        ultimo_id = 0
+        while True:
+            with transaction.atomic():
+                lote = list(
+                    modelo.objects.filter(id__gt=ultimo_id, rut_normalizado__isnull=True)
+                    .order_by('id')
+                    .only('id', 'rut')[:TAMANO_LOTE]
+                )
+                if not lote:
+                    break
+                for fila in lote:
+                    fila.rut_normalizado = normalizar_rut(fila.rut)
+                modelo.objects.bulk_update(lote, ['rut_normalizado'])
+            ultimo_id = lote[-1].id
+
+
+def verificar_ruts_duplicados(apps, schema_editor):
+    """
+    RUTs escritos en distintos formatos ('12.345.678-5' y '12345678-5') son
+    justamente el caso que resuelve esta columna: si ya existen, el índice
+    único no se puede construir. Se detiene la migración con la lista de
+    filas a corregir, antes de dejar un índice INVALID a medio crear.
+    """
+    problemas = []
+    for nombre_modelo in ('Paciente', 'Medico'):
+        modelo = apps.get_model('clinica', nombre_modelo)
+        repetidos = (
+            modelo.objects.filter(rut_normalizado__isnull=False)
+            .values('rut_normalizado').annotate(filas=Count('id')).filter(filas__gt=1)
+            .order_by('rut_normalizado').values_list('rut_normalizado', flat=True)
+        )
+        for rut_normalizado in repetidos:
+            filas = modelo.objects.filter(rut_normalizado=rut_normalizado).order_by('id').values_list('id', 'rut')
+            problemas.append(f'  {nombre_modelo} {rut_normalizado}: ' + ', '.join(f'ID {pk} ({rut!r})' for pk, rut in filas))
+    if problemas:
+        raise RuntimeError(
+            'Hay RUTs repetidos en distinto formato; unifique o elimine estas filas y vuelva a migrar:\n'
+            + '\n'.join(problemas)
+        )
+
+
+def indice_unico_concurrente(tabla, nombre):
+    """
+    Crea el índice UNIQUE con CONCURRENTLY (sin bloquear escrituras) y luego lo
+    asocia como constraint, que es la operación que Django registra en el estado.
+    Se puede reintentar: si un intento anterior dejó el índice INVALID (CREATE
+    INDEX CONCURRENTLY que falló), se elimina antes de volver a crearlo.
+    """
+    def crear(apps, schema_editor):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('SELECT 1 FROM pg_constraint WHERE conname = %s', [nombre])
+            if cursor.fetchone(): # Ya asociado en un intento anterior
+                return
+            cursor.execute(
+                'SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = %s',
+                [nombre],
+            )
+            fila = cursor.fetchone()
+            if fila is not None and not fila[0]:
+                cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{nombre}";')
+            cursor.execute(f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "{nombre}" ON "{tabla}" ("rut_normalizado");')
+            cursor.execute(f'ALTER TABLE "{tabla}" ADD CONSTRAINT "{nombre}" UNIQUE USING INDEX "{nombre}";')
+
+    def eliminar(apps, schema_editor):
+        schema_editor.execute(f'ALTER TABLE "{tabla}" DROP CONSTRAINT IF EXISTS "{nombre}";')
+
+    return migrations.RunPython(crear, eliminar)
+
+
+class Migration(migrations.Migration):
+    # El backfill maneja sus propias transacciones por lote y CREATE INDEX
+    # CONCURRENTLY no puede ejecutarse dentro de una transacción.
+    atomic = False
+
+    dependencies = [
+        ('clinica', '0002_busqueda_trigramas'),
+    ]
+
+    operations = [
+        # 1. Columna nullable sin default: no reescribe la tabla. IF NOT EXISTS
+        #    porque la migración no es atómica y puede reintentarse tras el paso 3
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql=f'ALTER TABLE "{tabla}" ADD COLUMN IF NOT EXISTS "rut_normalizado" varchar(12) NULL;',
+                    reverse_sql=f'ALTER TABLE "{tabla}" DROP COLUMN IF EXISTS "rut_normalizado";',
+                )
+                for tabla in ('clinica_medico', 'clinica_paciente')
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='medico',
+                    name='rut_normalizado',
+                    field=models.CharField(editable=False, max_length=12, null=True),
+                ),
+                migrations.AddField(
+                    model_name='paciente',
+                    name='rut_normalizado',
+                    field=models.CharField(editable=False, max_length=12, null=True),
+                ),
+            ],
+        ),
+        # 2. Backfill por lotes
+        migrations.RunPython(rellenar_rut_normalizado, migrations.RunPython.noop),
+        # 3. Sin RUTs repetidos en distinto formato (el índice único fallaría)
+        migrations.RunPython(verificar_ruts_duplicados, migrations.RunPython.noop),
+        # 4. Índice único construido sin bloquear la tabla
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                indice_unico_concurrente('clinica_medico', 'medico_rut_normalizado_unico'),
+                indice_unico_concurrente('clinica_paciente', 'paciente_rut_normalizado_unico'),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='medico',
+                    constraint=models.UniqueConstraint(fields=('rut_normalizado',), name='medico_rut_normalizado_unico'),
+                ),
+                migrations.AddConstraint(
+                    model_name='paciente',
+                    constraint=models.UniqueConstraint(fields=('rut_normalizado',), name='paciente_rut_normalizado_unico'),
+                ),
+            ],
+        ),
+    ]
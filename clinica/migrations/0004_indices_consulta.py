@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:05
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY: no bloquea las escrituras en Consulta_Medica
+    atomic = False
+
+    dependencies = [
+        ('clinica', '0003_rut_normalizado'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='consulta_medica',
+            index=models.Index(fields=['-fecha_consulta', '-id'], name='consulta_fecha_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='consulta_medica',
+            index=models.Index(fields=['medico', '-fecha_consulta', '-id'], name='consulta_medico_fecha_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='consulta_medica',
+            index=models.Index(fields=['paciente', '-fecha_consulta', '-id'], name='consulta_paciente_fecha_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='consulta_medica',
+            index=models.Index(condition=models.Q(('estado', 'PENDIENTE')), fields=['-fecha_consulta', '-id'], name='consulta_pendiente_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:07
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY: no bloquea las escrituras en Medicamento
+    atomic = False
+
+    dependencies = [
+        ('clinica', '0004_indices_consulta'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='medicamento',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('nombre'), name='gin_trgm_ops'), name='medicamento_nombre_trgm'),
+        ),
+        AddIndexConcurrently(
+            model_name='medicamento',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('laboratorio'), name='gin_trgm_ops'), name='medicamento_laboratorio_trgm'),
+        ),
+    ]
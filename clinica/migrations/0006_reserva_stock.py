@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:15
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0005_indices_medicamento'),
+    ]
+
+    operations = [
+        # Default constante: en PostgreSQL 11+ no reescribe la tabla de recetas
+        migrations.AddField(
+            model_name='receta_medica',
+            name='cantidad',
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        # Medicamento es un catálogo pequeño: validar el CHECK en línea es inmediato
+        migrations.AddConstraint(
+            model_name='medicamento',
+            constraint=models.CheckConstraint(condition=models.Q(('stock__gte', 0)), name='medicamento_stock_no_negativo'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+# Filas del resumen por INSERT (igual que 'manage.py recalcular_estadisticas')
+TAMANO_LOTE = 5000
+
+
+def rellenar_resumen(apps, schema_editor):
+    """
+    Carga inicial del resumen con la misma agregación que
+    'manage.py recalcular_estadisticas': un GROUP BY por día (en la zona
+    horaria activa, igual que las señales), médico y estado, leído con un
+    cursor de servidor e insertado en lotes. Las consultas que escriba una
+    versión anterior de la aplicación mientras se despliega no pasan por las
+    señales: en ese caso se corre el comando después del despliegue.
+    """
+    Consulta_Medica = apps.get_model('clinica', 'Consulta_Medica')
+    Estadistica_Diaria_Consulta = apps.get_model('clinica', 'Estadistica_Diaria_Consulta')
+    filas = (
+        Consulta_Medica.objects.order_by()
+        .annotate(dia=TruncDate('fecha_consulta'))
+        .values('dia', 'medico_id', 'estado')
+        .annotate(cantidad=Count('id'))
+        .iterator(chunk_size=TAMANO_LOTE)
+    )
+    lote = []
+    for fila in filas:
+        lote.append(Estadistica_Diaria_Consulta(
+            fecha=fila['dia'], medico_id=fila['medico_id'], estado=fila['estado'], cantidad=fila['cantidad'],
+        ))
+        if len(lote) >= TAMANO_LOTE:
+            Estadistica_Diaria_Consulta.objects.bulk_create(lote)
+            lote = []
+    Estadistica_Diaria_Consulta.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0006_reserva_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Estadistica_Diaria_Consulta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('REALIZADA', 'Realizada'), ('CANCELADA', 'Cancelada')], max_length=20)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('medico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clinica.medico')),
+            ],
+            options={
+                'verbose_name_plural': 'Estadísticas Diarias de Consultas',
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'medico', 'estado'), include=('cantidad',), name='estadistica_fecha_medico_estado')],
+            },
+        ),
+        # La tabla se crea vacía: se llena con el historial (revertir la borra con CreateModel)
+        migrations.RunPython(rellenar_resumen, migrations.RunPython.noop),
+    ]
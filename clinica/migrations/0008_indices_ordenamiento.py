@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:46
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY: no bloquea las escrituras en las tablas
+    atomic = False
+
+    dependencies = [
+        ('clinica', '0007_estadistica_diaria_consulta'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='consulta_medica',
+            index=models.Index(fields=['estado', '-fecha_consulta', '-id'], name='consulta_estado_fecha_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='medicamento',
+            index=models.Index(fields=['nombre', 'id'], name='medicamento_nombre_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='medicamento',
+            index=models.Index(fields=['laboratorio', 'id'], name='medicamento_laboratorio_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='medicamento',
+            index=models.Index(fields=['stock', 'id'], name='medicamento_stock_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='medico',
+            index=models.Index(fields=['nombre', 'id'], name='medico_nombre_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='paciente',
+            index=models.Index(fields=['nombre', 'id'], name='paciente_nombre_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='paciente',
+            index=models.Index(fields=['fecha_nacimiento', 'id'], name='paciente_nacimiento_id_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:58
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Documentos por sentencia INSERT ... SELECT (igual que 'manage.py reindexar_busqueda')
+TAMANO_LOTE = 5000
+
+# Copia de los documentos de clinica.models.Documento_Busqueda (las migraciones
+# no importan código del modelo): A paciente, B consulta, C tratamientos y recetas
+VECTOR_PACIENTE = "setweight(to_tsvector('spanish', concat_ws(' ', p.nombre, p.apellido, p.rut, p.rut_normalizado)), 'A')"
+VECTOR_CONSULTA = f"""{VECTOR_PACIENTE}
+    || setweight(to_tsvector('spanish', concat_ws(' ', c.motivo, c.diagnostico)), 'B')
+    || setweight(to_tsvector('spanish', concat_ws(' ',
+        (SELECT string_agg(t.descripcion, ' ') FROM clinica_tratamiento t WHERE t.consulta_id = c.id),
+        (SELECT string_agg(m.nombre, ' ') FROM clinica_receta_medica r JOIN clinica_medicamento m ON m.id = r.medicamento_id
+         WHERE r.consulta_id = c.id)
+    )), 'C')"""
+
+
+def indexar_existentes(apps, schema_editor):
+    """
+    Carga inicial de la tabla, como 'manage.py reindexar_busqueda': los
+    documentos de pacientes y de consultas por rangos de ID de a TAMANO_LOTE,
+    una sentencia INSERT ... SELECT por lote. La tabla es nueva y los lotes no
+    se repiten: no hace falta ON CONFLICT (los índices de CreateModel se crean
+    al final de la migración, después de la carga). La migración es atómica,
+    pero solo se leen las demás tablas, así que ninguna escritura espera por
+    ella. Lo que escriba una versión anterior de la aplicación durante el
+    despliegue se corrige corriendo el comando después.
+    """
+    sentencias = [
+        ('Paciente', f"""INSERT INTO clinica_documento_busqueda (paciente_id, consulta_id, fecha, documento)
+            SELECT p.id, NULL, NULL, {VECTOR_PACIENTE}
+            FROM clinica_paciente p WHERE p.id = ANY(%s)"""),
+        ('Consulta_Medica', f"""INSERT INTO clinica_documento_busqueda (paciente_id, consulta_id, fecha, documento)
+            SELECT c.paciente_id, c.id, c.fecha_consulta, {VECTOR_CONSULTA}
+            FROM clinica_consulta_medica c JOIN clinica_paciente p ON p.id = c.paciente_id
+            WHERE c.id = ANY(%s)"""),
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        for nombre_modelo, sql in sentencias:
+            modelo = apps.get_model('clinica', nombre_modelo)
+            ultimo = 0
+            while True:
+                lote = list(modelo.objects.filter(id__gt=ultimo).order_by('id').values_list('id', flat=True)[:TAMANO_LOTE])
+                if not lote:
+                    break
+                cursor.execute(sql, [lote])
+                ultimo = lote[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clinica', '0008_indices_ordenamiento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Documento_Busqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(null=True)),
+                ('documento', django.contrib.postgres.search.SearchVectorField()),
+                ('consulta', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, to='clinica.consulta_medica')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clinica.paciente')),
+            ],
+            options={
+                'verbose_name_plural': 'Documentos de Búsqueda',
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['documento'], name='busqueda_documento_gin')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('consulta__isnull', True)), fields=('paciente',), name='busqueda_paciente_unico')],
+            },
+        ),
+        # La tabla se crea vacía: se llena con los pacientes y consultas existentes
+        migrations.RunPython(indexar_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:01
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # La columna generada se agrega reescribiendo la tabla (ACCESS EXCLUSIVE durante
+    # el cálculo); el índice GIN se crea después con CONCURRENTLY, fuera de una transacción
+    atomic = False
+
+    dependencies = [
+        ('clinica', '0009_documento_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consulta_medica',
+            name='busqueda',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('motivo', config='spanish', weight='A'), '||', django.contrib.postgres.search.SearchVector('diagnostico', config='spanish', weight='B'), django.contrib.postgres.search.SearchConfig('spanish')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        AddIndexConcurrently(
+            model_name='consulta_medica',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['busqueda'], name='consulta_busqueda_gin'),
+        ),
+    ]
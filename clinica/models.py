@@ -3,7 +3,16 @@ from django.db import models
 # Create your models here.
 # clinica/models.py
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import F
+from django.db.models.functions import Upper
+from django.utils import timezone
+from collections import defaultdict
+from .cache import invalidar_modelo
 from datetime import date
 from decimal import Decimal
 
@@ -15,6 +24,16 @@ Consulta_Medica, Tratamiento, Medicamento, Receta_Medica),
 la mejora de la tabla 'Departamento' y CHOICES para 'estado'.
 """
 
+# ----------------------------------------------------------------------
+# Normalización de RUT: '12.345.678-9', '12345678-9' y '123456789' se
+# guardan con la misma llave ('123456789'), indexada con UNIQUE.
+# ----------------------------------------------------------------------
+def normalizar_rut(rut):
+    """Quita puntos, guiones y espacios del RUT y pasa el dígito verificador a mayúscula."""
+    if rut is None:
+        return None
+    return ''.join(caracter for caracter in rut if caracter.isalnum()).upper()
+
 # ----------------------------------------------------------------------
 # MEJORA: Nueva Tabla Adicional: Departamento
 # ----------------------------------------------------------------------
@@ -40,6 +59,8 @@ class Especialidad(models.Model):
 
 class Paciente(models.Model):
     rut = models.CharField(max_length=12, unique=True)
+    # Llave de búsqueda exacta por RUT, calculada al guardar (ver normalizar_rut)
+    rut_normalizado = models.CharField(max_length=12, null=True, editable=False)
     nombre = models.CharField(max_length=100)
     apellido = models.CharField(max_length=100)
     fecha_nacimiento = models.DateField()
@@ -49,11 +70,45 @@ class Paciente(models.Model):
     direccion = models.CharField(max_length=255, blank=True, null=True)
     activo = models.BooleanField(default=True)
 
+    class Meta:
+        # Índices de trigramas (pg_trgm) sobre UPPER(campo): sirven tanto a los
+        # filtros 'icontains' (UPPER(...) LIKE '%x%') como a la búsqueda aproximada
+        indexes = [
+            GinIndex(OpClass(Upper('nombre'), name='gin_trgm_ops'), name='paciente_nombre_trgm'),
+            GinIndex(OpClass(Upper('apellido'), name='gin_trgm_ops'), name='paciente_apellido_trgm'),
+            GinIndex(OpClass(Upper('rut'), name='gin_trgm_ops'), name='paciente_rut_trgm'),
+            # Ordenamientos permitidos en los listados (ver ORDENAMIENTO_PACIENTE en filters.py)
+            models.Index(fields=['nombre', 'id'], name='paciente_nombre_id_idx'),
+            models.Index(fields=['fecha_nacimiento', 'id'], name='paciente_nacimiento_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['rut_normalizado'], name='paciente_rut_normalizado_unico'),
+        ]
+
+    # Campos que calcula preparar_para_guardar() (bulk_update debe escribirlos también)
+    campos_calculados = ['rut_normalizado']
+
+    def preparar_para_guardar(self):
+        """Calcula los campos derivados. Lo usan save() y las cargas masivas (bulk_create no llama a save())."""
+        self.rut_normalizado = normalizar_rut(self.rut)
+
+    def save(self, *args, **kwargs):
+        self.preparar_para_guardar()
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def despues_de_guardar_lote(cls, pacientes, creados=False):
+        """Hook de las cargas masivas: documentos de búsqueda de los pacientes (y de sus consultas al editarlos)."""
+        ids = sorted(paciente.pk for paciente in pacientes)
+        Documento_Busqueda.indexar(pacientes=ids, consultas_de_pacientes=[] if creados else ids)
+
     def __str__(self):
         return f"{self.nombre} {self.apellido} ({self.rut})"
 
 class Medico(models.Model):
     rut = models.CharField(max_length=12, unique=True)
+    # Llave de búsqueda exacta por RUT, calculada al guardar (ver normalizar_rut)
+    rut_normalizado = models.CharField(max_length=12, null=True, editable=False)
     nombre = models.CharField(max_length=100)
     apellido = models.CharField(max_length=100)
     correo = models.EmailField(unique=True)
@@ -62,9 +117,40 @@ class Medico(models.Model):
     # FK a Especialidad
     especialidad = models.ForeignKey(Especialidad, on_delete=models.PROTECT)
 
+    class Meta:
+        # Mismos índices de trigramas que Paciente (ver comentario arriba)
+        indexes = [
+            GinIndex(OpClass(Upper('nombre'), name='gin_trgm_ops'), name='medico_nombre_trgm'),
+            GinIndex(OpClass(Upper('apellido'), name='gin_trgm_ops'), name='medico_apellido_trgm'),
+            GinIndex(OpClass(Upper('rut'), name='gin_trgm_ops'), name='medico_rut_trgm'),
+            models.Index(fields=['nombre', 'id'], name='medico_nombre_id_idx'), # Ordenamiento por nombre
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['rut_normalizado'], name='medico_rut_normalizado_unico'),
+        ]
+
+    # Campos que calcula preparar_para_guardar() (bulk_update debe escribirlos también)
+    campos_calculados = ['rut_normalizado']
+
+    def preparar_para_guardar(self):
+        """Calcula los campos derivados. Lo usan save() y las cargas masivas (bulk_create no llama a save())."""
+        self.rut_normalizado = normalizar_rut(self.rut)
+
+    def save(self, *args, **kwargs):
+        self.preparar_para_guardar()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Dr. {self.nombre} {self.apellido}"
 
+# ----------------------------------------------------------------------
+# Búsqueda de texto completo (PostgreSQL): configuración en español, que
+# reduce cada palabra a su raíz ('diabético' y 'diabetes' -> 'diabet') y
+# descarta las palabras vacías. La usan Consulta_Medica.busqueda y
+# Documento_Busqueda; las consultas deben usar la misma configuración.
+# ----------------------------------------------------------------------
+CONFIG_BUSQUEDA = 'spanish'
+
 # ----------------------------------------------------------------------
 # MEJORA: Uso de CHOICES para el campo 'estado' en Consulta_Medica
 # ----------------------------------------------------------------------
@@ -84,10 +170,44 @@ class Consulta_Medica(models.Model):
     diagnostico = models.TextField(blank=True, null=True)
     # Uso del CHOICES definido
     estado = models.CharField(max_length=20, choices=ESTADO_CONSULTA_CHOICES, default='PENDIENTE')
+    # tsvector de motivo (peso A) y diagnóstico (peso B), calculado por PostgreSQL al
+    # escribir la fila (columna generada almacenada) e indexado con GIN (filtro 'buscar')
+    busqueda = models.GeneratedField(
+        expression=(
+            SearchVector('motivo', weight='A', config=CONFIG_BUSQUEDA)
+            + SearchVector('diagnostico', weight='B', config=CONFIG_BUSQUEDA)
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
 
     class Meta:
         verbose_name_plural = "Consultas Médicas"
         ordering = ['-fecha_consulta']
+        # Índices compuestos para los accesos frecuentes (ConsultaMedicaFilter y la
+        # paginación por cursor de la API, que ordena por (-fecha_consulta, -id))
+        indexes = [
+            models.Index(fields=['-fecha_consulta', '-id'], name='consulta_fecha_id_idx'),
+            models.Index(fields=['medico', '-fecha_consulta', '-id'], name='consulta_medico_fecha_idx'),
+            models.Index(fields=['paciente', '-fecha_consulta', '-id'], name='consulta_paciente_fecha_idx'),
+            models.Index(fields=['estado', '-fecha_consulta', '-id'], name='consulta_estado_fecha_idx'), # ?ordering=estado
+            GinIndex(fields=['busqueda'], name='consulta_busqueda_gin'), # Búsqueda de texto en motivo y diagnóstico
+            # Índice parcial: la agenda de pendientes es una fracción pequeña de la tabla
+            models.Index(
+                fields=['-fecha_consulta', '-id'],
+                condition=models.Q(estado='PENDIENTE'),
+                name='consulta_pendiente_fecha_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Atómico junto con la actualización del resumen diario (señales en signals.py)
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+    def clave_estadistica(self):
+        """(fecha, medico_id, estado) de la fila de Estadistica_Diaria_Consulta que cuenta esta consulta."""
+        return (timezone.localdate(self.fecha_consulta), self.medico_id, self.estado)
 
     def __str__(self):
         return f"Consulta {self.id} de {self.paciente}"
@@ -100,6 +220,13 @@ class Tratamiento(models.Model):
     duracion_dias = models.IntegerField(validators=[MinValueValidator(1)])
     observaciones = models.TextField(blank=True, null=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        if 'consulta_id' in instancia.__dict__:
+            instancia._consulta_indexada = instancia.consulta_id # Documento de búsqueda que lo incluye (signals.py)
+        return instancia
+
     def __str__(self):
         return f"Tratamiento {self.id} para Consulta {self.consulta.id}"
 
@@ -109,9 +236,121 @@ class Medicamento(models.Model):
     stock = models.IntegerField(validators=[MinValueValidator(0)])
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
 
+    class Meta:
+        # Índices de trigramas: búsqueda por prefijo del autocompletado y filtros 'icontains'
+        indexes = [
+            GinIndex(OpClass(Upper('nombre'), name='gin_trgm_ops'), name='medicamento_nombre_trgm'),
+            GinIndex(OpClass(Upper('laboratorio'), name='gin_trgm_ops'), name='medicamento_laboratorio_trgm'),
+            # Ordenamientos permitidos en los listados (ver ORDENAMIENTO_MEDICAMENTO en filters.py)
+            models.Index(fields=['nombre', 'id'], name='medicamento_nombre_id_idx'),
+            models.Index(fields=['laboratorio', 'id'], name='medicamento_laboratorio_id_idx'),
+            models.Index(fields=['stock', 'id'], name='medicamento_stock_id_idx'),
+        ]
+        constraints = [
+            # Última barrera contra la sobreventa, aunque alguien escriba el stock a mano
+            models.CheckConstraint(condition=models.Q(stock__gte=0), name='medicamento_stock_no_negativo'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        if 'nombre' in instancia.__dict__:
+            instancia._nombre_indexado = instancia.nombre # Un cambio de nombre reindexa la búsqueda (signals.py)
+        if 'stock' in instancia.__dict__:
+            instancia._stock_leido = instancia.stock # Base de la diferencia que aplica save()
+        return instancia
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        if 'stock' in self.__dict__:
+            self._stock_leido = self.stock
+
+    def save(self, *args, **kwargs):
+        """
+        Al editar, el stock leído puede estar desactualizado: las recetas lo
+        reservan mientras tanto. La fila se bloquea (SELECT ... FOR UPDATE) y
+        se escribe el stock actual más el cambio hecho sobre el valor leído
+        (m.stock = n equivale a ajustar n - leído); StockInsuficiente si
+        quedaría negativo. Si la fila ya no existe, se inserta como siempre.
+        """
+        if self._state.adding or kwargs.get('update_fields') is not None or 'stock' not in self.__dict__:
+            return super().save(*args, **kwargs)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            actual = (
+                Medicamento.objects.using(using).select_for_update()
+                .filter(pk=self.pk).values_list('stock', flat=True).first()
+            )
+            if actual is not None:
+                # Instancia armada a mano (sin lectura previa): el valor es absoluto
+                stock = actual + self.stock - getattr(self, '_stock_leido', actual)
+                if stock < 0:
+                    raise StockInsuficiente({'stock': 'El stock quedaría negativo con este cambio.'})
+                self.stock = stock
+            super().save(*args, **kwargs)
+        self._stock_leido = self.stock
+
+    @classmethod
+    def ajustar_stock(cls, ajustes):
+        """
+        Aplica {medicamento_id: diferencia} (positiva: ingreso; negativa: egreso)
+        con UPDATE ... SET stock = stock + n (ver descontar_stock). Lanza
+        StockInsuficiente si un egreso dejaría el stock negativo.
+        """
+        try:
+            descontar_stock({medicamento_id: -diferencia for medicamento_id, diferencia in ajustes.items()})
+        except StockInsuficiente:
+            raise StockInsuficiente({'ajuste_stock': 'El stock quedaría negativo con este ajuste.'})
+
+    @classmethod
+    def despues_de_guardar_lote(cls, medicamentos, creados=False):
+        """Hook de las cargas masivas: aplica los 'ajuste_stock' y reindexa las consultas que recetan un medicamento renombrado."""
+        ajustes = {m.pk: m.ajuste_stock for m in medicamentos if getattr(m, 'ajuste_stock', None)}
+        if ajustes:
+            cls.ajustar_stock(ajustes)
+        renombrados = [m.pk for m in medicamentos if getattr(m, '_nombre_indexado', m.nombre) != m.nombre]
+        if renombrados:
+            Documento_Busqueda.indexar(consultas_de_medicamentos=renombrados)
+        for medicamento in medicamentos:
+            medicamento._nombre_indexado = medicamento.nombre
+
     def __str__(self):
         return f"{self.nombre} ({self.laboratorio})"
 
+# ----------------------------------------------------------------------
+# Reserva de stock: cada receta descuenta 'cantidad' unidades de su
+# medicamento con un UPDATE condicional, sin leer el stock antes.
+# ----------------------------------------------------------------------
+class StockInsuficiente(ValidationError):
+    """El medicamento no tiene las unidades que pide la receta (o el egreso de ajustar_stock)."""
+
+def descontar_stock(unidades):
+    """
+    Descuenta {medicamento_id: unidades} con un
+    UPDATE ... SET stock = stock - n WHERE id = ... AND stock >= n
+    por medicamento: la verificación y la escritura son una sola sentencia,
+    por lo que dos reservas simultáneas no pueden sobrevender ni perder
+    actualizaciones. Unidades negativas devuelven stock.
+    Los UPDATE se emiten en orden de ID para que dos lotes concurrentes
+    bloqueen las filas en el mismo orden (sin deadlocks). Si un medicamento
+    no alcanza se lanza StockInsuficiente y la transacción que envuelve la
+    llamada revierte los descuentos ya hechos.
+    """
+    with transaction.atomic(savepoint=False):
+        for medicamento_id in sorted(unidades):
+            cantidad = unidades[medicamento_id]
+            if cantidad == 0:
+                continue
+            filas = Medicamento.objects.filter(pk=medicamento_id)
+            if cantidad > 0:
+                filas = filas.filter(stock__gte=cantidad)
+            if not filas.update(stock=F('stock') - cantidad):
+                raise StockInsuficiente({
+                    'cantidad': f'Stock insuficiente del medicamento {medicamento_id} para reservar {cantidad} unidades.'
+                })
+    if any(unidades.values()):
+        invalidar_modelo(Medicamento) # QuerySet.update() no emite post_save: el stock cacheado cambió
+
 class Receta_Medica(models.Model):
     # FKs
     consulta = models.ForeignKey(Consulta_Medica, on_delete=models.CASCADE)
@@ -120,10 +359,206 @@ class Receta_Medica(models.Model):
     dosis = models.CharField(max_length=150)
     frecuencia = models.CharField(max_length=150)
     duracion = models.CharField(max_length=100)
+    # Unidades que la receta reserva del stock del medicamento (ver descontar_stock)
+    cantidad = models.PositiveIntegerField(default=1, validators=[MinValueValidator(1)])
     
     class Meta:
         verbose_name_plural = "Recetas Médicas"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        if 'consulta_id' in instancia.__dict__:
+            instancia._consulta_indexada = instancia.consulta_id # Documento de búsqueda que la incluye (signals.py)
+        return instancia
+
+    @classmethod
+    def reservas_guardadas(cls, pks):
+        """
+        {pk: (medicamento_id, cantidad)} con que las recetas están guardadas,
+        leídos con SELECT ... FOR UPDATE en orden de ID. Dos ediciones
+        simultáneas de una receta se serializan: la segunda devuelve la reserva
+        que dejó la primera y no la que leyó al cargar el formulario.
+        Se llama dentro de la transacción que escribe las recetas.
+        """
+        if not pks:
+            return {}
+        filas = (
+            cls.objects.select_for_update().filter(pk__in=pks).order_by('pk')
+            .values_list('pk', 'medicamento_id', 'cantidad')
+        )
+        return {pk: (medicamento_id, cantidad) for pk, medicamento_id, cantidad in filas}
+
+    @classmethod
+    def reservar_stock(cls, recetas):
+        """
+        Reserva el stock de un lote de recetas nuevas o editadas: devuelve la
+        reserva guardada de las editadas, suma las unidades por medicamento y
+        las descuenta con descontar_stock().
+        """
+        guardadas = cls.reservas_guardadas([receta.pk for receta in recetas if not receta._state.adding])
+        unidades = defaultdict(int)
+        for receta in recetas:
+            guardada = None if receta._state.adding else guardadas.get(receta.pk)
+            if guardada is not None:
+                unidades[guardada[0]] -= guardada[1]
+            unidades[receta.medicamento_id] += receta.cantidad
+        descontar_stock(unidades)
+
+    @classmethod
+    def antes_de_guardar_lote(cls, recetas):
+        """Hook de las cargas masivas: bulk_create/bulk_update no llaman a save()."""
+        cls.reservar_stock(recetas)
+
+    @classmethod
+    def despues_de_guardar_lote(cls, recetas, creados=False):
+        """Hook de las cargas masivas: reindexa las consultas de las recetas (y las de origen si se movieron)."""
+        consultas = set()
+        for receta in recetas:
+            consultas.update((receta.consulta_id, getattr(receta, '_consulta_indexada', None)))
+            receta._consulta_indexada = receta.consulta_id
+        consultas.discard(None)
+        Documento_Busqueda.indexar(consultas=sorted(consultas))
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            Receta_Medica.reservar_stock([self])
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Receta para {self.consulta.paciente} - {self.medicamento.nombre}"
 
+# ----------------------------------------------------------------------
+# Resumen diario de consultas: cantidad por (día, médico, estado),
+# mantenido en línea por las señales de Consulta_Medica (signals.py).
+# Los totales por especialidad y departamento se obtienen agrupando
+# este resumen a través de médico, sin leer Consulta_Medica.
+# ----------------------------------------------------------------------
+class Estadistica_Diaria_Consulta(models.Model):
+    fecha = models.DateField()
+    medico = models.ForeignKey(Medico, on_delete=models.CASCADE)
+    estado = models.CharField(max_length=20, choices=ESTADO_CONSULTA_CHOICES)
+    cantidad = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Estadísticas Diarias de Consultas"
+        constraints = [
+            # Llave del UPSERT y, con 'cantidad' incluida, índice de solo lectura para los rangos de fechas
+            models.UniqueConstraint(
+                fields=['fecha', 'medico', 'estado'], include=['cantidad'], name='estadistica_fecha_medico_estado',
+            ),
+        ]
+
+    @classmethod
+    def sumar(cls, cambios, using=DEFAULT_DB_ALIAS):
+        """
+        Aplica {(fecha, medico_id, estado): diferencia} con un
+        INSERT ... ON CONFLICT DO UPDATE SET cantidad = cantidad + n por clave,
+        en orden para que dos transacciones no se bloqueen mutuamente.
+        """
+        tabla = connections[using].ops.quote_name(cls._meta.db_table)
+        with connections[using].cursor() as cursor:
+            for (fecha, medico_id, estado), diferencia in sorted(cambios.items()):
+                if diferencia == 0:
+                    continue
+                cursor.execute(
+                    f"""INSERT INTO {tabla} (fecha, medico_id, estado, cantidad) VALUES (%s, %s, %s, %s)
+                        ON CONFLICT (fecha, medico_id, estado)
+                        DO UPDATE SET cantidad = {tabla}.cantidad + EXCLUDED.cantidad""",
+                    [fecha, medico_id, estado, diferencia],
+                )
+
+    def __str__(self):
+        return f"{self.fecha} {self.medico_id} {self.estado}: {self.cantidad}"
+
+
+# ----------------------------------------------------------------------
+# Documentos de búsqueda: una fila por paciente (nombre y RUT) y una por
+# consulta (paciente, motivo, diagnóstico, tratamientos y medicamentos
+# recetados) con el texto ya convertido a tsvector e indexado con GIN.
+# La búsqueda unificada (/api/busqueda/) lee solo esta tabla; las señales
+# (signals.py) la actualizan en la misma transacción de cada escritura y
+# 'manage.py reindexar_busqueda' la reconstruye tras cargas por SQL o COPY.
+# ----------------------------------------------------------------------
+# Partes del documento por peso (A: identifican al paciente; B: la consulta; C: tratamientos y recetas)
+_VECTOR_PACIENTE = f"setweight(to_tsvector('{CONFIG_BUSQUEDA}', concat_ws(' ', p.nombre, p.apellido, p.rut, p.rut_normalizado)), 'A')"
+_VECTOR_CONSULTA = f"""{_VECTOR_PACIENTE}
+    || setweight(to_tsvector('{CONFIG_BUSQUEDA}', concat_ws(' ', c.motivo, c.diagnostico)), 'B')
+    || setweight(to_tsvector('{CONFIG_BUSQUEDA}', concat_ws(' ',
+        (SELECT string_agg(t.descripcion, ' ') FROM {{tratamiento}} t WHERE t.consulta_id = c.id),
+        (SELECT string_agg(m.nombre, ' ') FROM {{receta}} r JOIN {{medicamento}} m ON m.id = r.medicamento_id
+         WHERE r.consulta_id = c.id)
+    )), 'C')"""
+
+class Documento_Busqueda(models.Model):
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE)
+    # Nulo en el documento del paciente; las bajas de consultas y pacientes lo borran en cascada
+    consulta = models.OneToOneField(Consulta_Medica, on_delete=models.CASCADE, null=True)
+    fecha = models.DateTimeField(null=True) # fecha_consulta: desempate de los resultados
+    documento = SearchVectorField()
+
+    class Meta:
+        verbose_name_plural = "Documentos de Búsqueda"
+        indexes = [
+            GinIndex(fields=['documento'], name='busqueda_documento_gin'),
+        ]
+        constraints = [
+            # Llave del UPSERT del documento del paciente
+            models.UniqueConstraint(
+                fields=['paciente'], condition=models.Q(consulta__isnull=True), name='busqueda_paciente_unico',
+            ),
+        ]
+
+    @classmethod
+    def indexar(cls, pacientes=(), consultas=(), consultas_de_pacientes=(), consultas_de_medicamentos=(),
+                using=DEFAULT_DB_ALIAS):
+        """
+        Recalcula con INSERT ... SELECT ... ON CONFLICT DO UPDATE (una sentencia
+        por grupo, en orden de ID) los documentos de los pacientes y consultas
+        indicados por ID; también los de todas las consultas de ciertos
+        pacientes (cambió su nombre o RUT) o con recetas de ciertos
+        medicamentos (cambió su nombre). El texto se lee de la base de datos,
+        así que sirve igual tras un save() que tras un bulk_create().
+        """
+        connection = connections[using]
+        tablas = {
+            modelo._meta.model_name: connection.ops.quote_name(modelo._meta.db_table)
+            for modelo in (cls, Paciente, Consulta_Medica, Tratamiento, Receta_Medica, Medicamento)
+        }
+        documento, receta = tablas['documento_busqueda'], tablas['receta_medica']
+        condiciones = []
+        if consultas:
+            condiciones.append(('c.id = ANY(%s)', list(consultas)))
+        if consultas_de_pacientes:
+            condiciones.append(('c.paciente_id = ANY(%s)', list(consultas_de_pacientes)))
+        if consultas_de_medicamentos:
+            condiciones.append(
+                (f'c.id IN (SELECT consulta_id FROM {receta} WHERE medicamento_id = ANY(%s))', list(consultas_de_medicamentos))
+            )
+
+        with connection.cursor() as cursor:
+            if pacientes:
+                cursor.execute(
+                    f"""INSERT INTO {documento} (paciente_id, consulta_id, fecha, documento)
+                        SELECT p.id, NULL, NULL, {_VECTOR_PACIENTE}
+                        FROM {tablas['paciente']} p WHERE p.id = ANY(%s) ORDER BY p.id
+                        ON CONFLICT (paciente_id) WHERE consulta_id IS NULL
+                        DO UPDATE SET documento = EXCLUDED.documento""",
+                    [list(pacientes)],
+                )
+            for condicion, parametros in condiciones:
+                vector = _VECTOR_CONSULTA.format(
+                    tratamiento=tablas['tratamiento'], receta=receta, medicamento=tablas['medicamento'],
+                )
+                cursor.execute(
+                    f"""INSERT INTO {documento} (paciente_id, consulta_id, fecha, documento)
+                        SELECT c.paciente_id, c.id, c.fecha_consulta, {vector}
+                        FROM {tablas['consulta_medica']} c JOIN {tablas['paciente']} p ON p.id = c.paciente_id
+                        WHERE {condicion} ORDER BY c.id
+                        ON CONFLICT (consulta_id) DO UPDATE SET
+                            paciente_id = EXCLUDED.paciente_id, fecha = EXCLUDED.fecha, documento = EXCLUDED.documento""",
+                    [parametros],
+                )
+
+    def __str__(self):
+        return f"Documento de la consulta {self.consulta_id}" if self.consulta_id else f"Documento del paciente {self.paciente_id}"
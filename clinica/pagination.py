@@ -0,0 +1,300 @@
+# clinica/pagination.py
+
+# Bloque de Importaciones
+# ======================================================================
+import json # Plan de ejecución (EXPLAIN en formato JSON) y posiciones del cursor
+from datetime import date, time # Valores de fecha y hora en las posiciones del cursor
+from django.conf import settings # Umbral configurable del conteo estimado
+from django.core.exceptions import FieldDoesNotExist, ValidationError # Campos de ordenamiento y valores inválidos del cursor
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator # Paginación clásica por número de página (vistas HTML)
+from django.db import connections # Acceso directo a la conexión para consultar el catálogo de PostgreSQL
+from django.db.models import Q, QuerySet # Q permite construir la condición compuesta del keyset
+from django.utils.functional import cached_property # El conteo se calcula una sola vez por request
+from rest_framework.exceptions import NotFound # Error estándar de DRF para cursores inválidos
+from rest_framework.pagination import CursorPagination, _reverse_ordering # Paginación por cursor de DRF
+
+# ======================================================================
+# PAGINACIÓN POR CURSOR (KEYSET) PARA LA API
+# A diferencia de la paginación por OFFSET, cada página se obtiene con un
+# WHERE sobre la última fila vista, por lo que el costo es constante sin
+# importar la profundidad de la página solicitada.
+# ======================================================================
+
+def codificar_posicion(valores):
+    """
+    Posición compuesta del cursor como lista JSON: los textos pueden contener
+    cualquier carácter y NULL se conserva como null. Fechas y horas van en
+    ISO 8601 con microsegundos (DjangoJSONEncoder los trunca a milisegundos).
+    """
+    return json.dumps(
+        [valor if valor is None or isinstance(valor, (bool, int, float, str)) else
+         valor.isoformat() if isinstance(valor, (date, time)) else str(valor) for valor in valores],
+        separators=(',', ':'), ensure_ascii=False,
+    )
+
+def decodificar_posicion(posicion):
+    """Lista de valores de una posición, o None si el cursor no es una lista JSON."""
+    try:
+        valores = json.loads(posicion)
+    except ValueError:
+        return None
+    return valores if isinstance(valores, list) else None
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Paginación por cursor sobre una clave compuesta y única (ej: '-fecha_consulta', '-id').
+    El cursor de DRF solo guarda la posición del primer campo de ordenamiento y
+    resuelve los empates con un OFFSET; aquí la posición incluye todos los campos,
+    de modo que el OFFSET siempre es 0 y cada página es una sola búsqueda por índice.
+    """
+    ordering = ('id',) # Clave por defecto: la llave primaria
+    page_size_query_param = 'page_size' # El cliente puede pedir otro tamaño de página...
+    max_page_size = 500 # ...con un tope para proteger a los workers
+
+    def _get_position_from_instance(self, instance, ordering):
+        """Codifica los valores de todos los campos de ordenamiento de la fila."""
+        valores = []
+        for campo in ordering:
+            nombre = campo.lstrip('-')
+            valor = instance[nombre] if isinstance(instance, dict) else getattr(instance, nombre)
+            valores.append(valor)
+        return codificar_posicion(valores)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Si un filtro ya ordenó el queryset (ej: por similitud en la búsqueda
+        aproximada) y ese orden termina en la llave primaria, se respeta como clave
+        del cursor; de lo contrario se usa el 'ordering' de la clase.
+        """
+        orden = queryset.query.order_by
+        if (
+            orden
+            and all(isinstance(campo, str) and '__' not in campo for campo in orden)
+            and orden[-1].lstrip('-') in ('id', 'pk')
+        ):
+            return tuple(orden)
+        return super().get_ordering(request, queryset, view)
+
+    def _filtro_keyset(self, posicion, reverse, queryset):
+        """
+        Construye la condición (a, b) > (x, y) expandida como
+        a > x OR (a = x AND b > y), respetando la dirección de cada campo.
+        En las columnas que aceptan NULL, estos siguen el orden por defecto de
+        PostgreSQL: al final en orden ascendente y al principio en descendente.
+        El cursor viene del cliente: cada valor se convierte con to_python() del
+        campo de ordenamiento y uno que no corresponde lanza ValidationError.
+        """
+        valores = decodificar_posicion(posicion)
+        if valores is None or len(valores) != len(self.ordering):
+            raise ValidationError('Posición del cursor inválida.')
+
+        condicion = Q()
+        iguales = Q()
+        for campo, valor in zip(self.ordering, valores):
+            nombre = campo.lstrip('-')
+            descendente = campo.startswith('-')
+            campo_orden = self._campo_orden(queryset, nombre)
+            if isinstance(valor, (list, dict)):
+                raise ValidationError('Posición del cursor inválida.')
+            if valor is not None and campo_orden is not None:
+                valor = campo_orden.to_python(valor)
+            # (cursor invertido) XOR (campo descendente) => se busca hacia valores menores
+            lookup = 'lt' if reverse != descendente else 'gt'
+            if valor is None:
+                # Después de NULL: nada en orden ascendente; todos los no nulos en descendente
+                siguientes = Q(**{f'{nombre}__isnull': False}) if lookup == 'lt' else Q(pk__in=[])
+                iguales_campo = Q(**{f'{nombre}__isnull': True})
+            else:
+                siguientes = Q(**{f'{nombre}__{lookup}': valor})
+                # Las anotaciones (similitud, relevancia) y las columnas NOT NULL no agregan 'OR campo IS NULL'
+                if lookup == 'gt' and getattr(campo_orden, 'null', False) and nombre not in queryset.query.annotations:
+                    siguientes |= Q(**{f'{nombre}__isnull': True})
+                iguales_campo = Q(**{nombre: valor})
+            condicion |= iguales & siguientes
+            iguales &= iguales_campo
+        return condicion
+
+    @staticmethod
+    def _campo_orden(queryset, nombre):
+        """Campo del modelo o de la anotación por el que se ordena (None si no se puede determinar)."""
+        if nombre in queryset.query.annotations:
+            return getattr(queryset.query.annotations[nombre], 'output_field', None)
+        try:
+            return queryset.model._meta.get_field(nombre)
+        except FieldDoesNotExist:
+            return None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """
+        Igual que CursorPagination.paginate_queryset, pero filtrando por la
+        posición compuesta completa en lugar de solo el primer campo.
+        """
+        consulta = self.preparar_pagina(queryset, request, view)
+        if consulta is None:
+            return None
+        return self.completar_pagina(list(consulta))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Versión para vistas asíncronas: la página se lee con el ORM asíncrono."""
+        consulta = self.preparar_pagina(queryset, request, view)
+        if consulta is None:
+            return None
+        return self.completar_pagina([fila async for fila in consulta])
+
+    def preparar_pagina(self, queryset, request, view=None):
+        """Retorna el queryset (sin evaluar) de la página pedida más una fila extra."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        # La paginación por cursor siempre impone un ordenamiento
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        # Si el cursor trae una posición, se continúa desde esa fila (keyset)
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(self._filtro_keyset(current_position, reverse, queryset))
+            except (ValidationError, ValueError, TypeError): # Cursor alterado por el cliente
+                raise NotFound(self.invalid_cursor_message)
+
+        self._reverse, self._current_position, self._offset = reverse, current_position, offset
+        # Se pide una fila extra para saber si existe una página siguiente
+        return queryset[offset:offset + self.page_size + 1]
+
+    def completar_pagina(self, results):
+        """Con las filas leídas calcula la página y las posiciones de los cursores vecinos."""
+        reverse, current_position, offset = self._reverse, self._current_position, self._offset
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # El queryset se recorrió al revés: se restaura el orden para el cliente
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def datos_paginados(self, data):
+        """Cuerpo de la respuesta paginada (el mismo de get_paginated_response)."""
+        return {'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data}
+
+class ConsultaMedicaCursorPagination(KeysetCursorPagination):
+    """Paginación de Consultas Médicas: de la más reciente a la más antigua, desempate por ID."""
+    ordering = ('-fecha_consulta', '-id')
+
+# ======================================================================
+# PAGINACIÓN POR NÚMERO DE PÁGINA CON CONTEO ESTIMADO (VISTAS HTML)
+# Un COUNT(*) exacto recorre toda la tabla. Sobre cierto tamaño se usa la
+# estimación del planificador de PostgreSQL, que se obtiene sin leer filas.
+# ======================================================================
+
+class PaginaEstimada(Page):
+    """Página cuyo 'has_next' no depende del total (que puede ser aproximado)."""
+    hay_siguiente = False # Se fija en ConteoEstimadoPaginator.page()
+
+    def has_next(self):
+        """Existe una página siguiente si se leyó una fila más allá de esta página."""
+        return self.hay_siguiente
+
+class ConteoEstimadoPaginator(Paginator):
+    """
+    Paginator que reemplaza el COUNT(*) por la estimación del planificador de
+    PostgreSQL cuando ésta supera settings.CLINICA_CONTEO_ESTIMADO_UMBRAL.
+    Bajo el umbral (o en otros motores) el conteo es exacto.
+    """
+    conteo_estimado = False # Indica al template si el total es aproximado
+
+    def _estimar_filas(self):
+        """Retorna la cantidad estimada de filas del queryset, o None si no es posible."""
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        if not queryset.query.where:
+            # Tabla completa: estadística del catálogo (la mantiene ANALYZE/autovacuum)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table],
+                )
+                fila = cursor.fetchone()
+            estimado = fila[0] if fila else -1
+        else:
+            # Queryset filtrado: filas estimadas por el plan de ejecución
+            plan = json.loads(queryset.explain(format='json'))
+            estimado = plan[0]['Plan']['Plan Rows']
+
+        # reltuples vale -1 si la tabla nunca fue analizada
+        return int(estimado) if estimado >= 0 else None
+
+    @cached_property
+    def count(self):
+        """Total de filas: estimado sobre el umbral configurado, exacto bajo él."""
+        umbral = getattr(settings, 'CLINICA_CONTEO_ESTIMADO_UMBRAL', 10000)
+        estimado = self._estimar_filas()
+        if estimado is not None and estimado >= umbral:
+            self.conteo_estimado = True
+            return estimado
+        return super().count
+
+    def validate_number(self, number):
+        """Con un total estimado no se puede acotar el número de página por arriba."""
+        if not (self.count and self.conteo_estimado):
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        """Lee una fila extra para saber si hay página siguiente sin depender del total."""
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        filas = list(self.object_list[bottom:bottom + self.per_page + 1])
+        pagina = self._get_page(filas[:self.per_page], number, self)
+        pagina.hay_siguiente = len(filas) > self.per_page
+        return pagina
+
+    def _get_page(self, *args, **kwargs):
+        """Usa PaginaEstimada como clase de página."""
+        return PaginaEstimada(*args, **kwargs)
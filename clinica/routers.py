@@ -0,0 +1,81 @@
+# clinica/routers.py
+
+# Bloque de Importaciones
+# ======================================================================
+import random # Reparto de las lecturas entre las réplicas
+from contextlib import contextmanager
+from contextvars import ContextVar # Estado por request (hilo o tarea asíncrona)
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# ======================================================================
+# LECTURAS EN RÉPLICAS (settings.CLINICA_DB_REPLICAS)
+# Las escrituras van siempre al primario ('default'). Las lecturas van a una
+# réplica solo dentro de un request seguro (GET/HEAD/OPTIONS) que
+# LecturaEnReplicaMiddleware habilitó: un cliente que acaba de escribir queda
+# fijado al primario por CLINICA_REPLICA_FIJACION_SEGUNDOS para leer sus
+# propios cambios. Cada request elige una réplica al empezar y hace todas
+# sus lecturas en ella (todas ven el mismo atraso de replicación). Fuera de
+# un request (comandos, shell, señales) todo va al primario.
+# ======================================================================
+
+# {'replica': bool, 'escritura': bool, 'alias': réplica elegida o None} del
+# request en curso. Es un diccionario mutable para que una escritura
+# registrada en una copia del contexto (ej: sync_to_async) se vea al
+# terminar el request.
+_estado_request = ContextVar('clinica_estado_replica', default=None)
+
+def replicas_configuradas():
+    """Alias de DATABASES que son réplicas de lectura."""
+    return getattr(settings, 'CLINICA_DB_REPLICAS', [])
+
+@contextmanager
+def estado_request(lectura_en_replica):
+    """Instala el estado de réplica de un request (lo usa el middleware) y elige su réplica."""
+    replicas = replicas_configuradas() if lectura_en_replica else []
+    estado = {'replica': bool(replicas), 'escritura': False, 'alias': random.choice(replicas) if replicas else None}
+    token = _estado_request.set(estado)
+    try:
+        yield estado
+    finally:
+        _estado_request.reset(token)
+
+@contextmanager
+def leer_del_primario():
+    """
+    Fuerza las lecturas del bloque al primario. Se usa al llenar la caché
+    compartida: una réplica atrasada no debe dejar datos anteriores guardados
+    con la versión nueva del modelo.
+    """
+    estado = _estado_request.get()
+    if estado is None or not estado['replica']:
+        yield
+        return
+    estado['replica'] = False
+    try:
+        yield
+    finally:
+        estado['replica'] = not estado['escritura']
+
+class ReplicaRouter:
+    """Router de base de datos: lecturas a las réplicas (si el request lo permite), escrituras al primario."""
+
+    def db_for_read(self, model, **hints):
+        estado = _estado_request.get()
+        if estado is not None and estado['replica']:
+            return estado['alias']
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        estado = _estado_request.get()
+        if estado is not None:
+            # El resto del request lee lo que escribió, y el cliente queda fijado al primario
+            estado['replica'] = False
+            estado['escritura'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True # Primario y réplicas tienen los mismos datos
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS # Las réplicas reciben el esquema por replicación
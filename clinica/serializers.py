@@ -2,25 +2,428 @@
 
 # Bloque de Importaciones
 # ======================================================================
+from operator import itemgetter # Lectura de columnas en el plan de lectura rápida
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError # Errores que lanza el modelo al guardar
+from django.db import transaction # La edición y el ajuste de stock se aplican juntos
 from rest_framework import serializers # Importa la librería principal de serializadores de DRF
+from rest_framework.validators import UniqueValidator # Se reemplaza por una verificación por lote en las cargas masivas
+from .cache import invalidar_modelo # Las escrituras masivas no emiten señales
+from .metricas import medir_fase, registro_actual # Fase 'serializacion' de Server-Timing
 from .models import (
     Departamento, Especialidad, Paciente, Medico, Consulta_Medica,
-    Tratamiento, Medicamento, Receta_Medica
+    Tratamiento, Medicamento, Receta_Medica, normalizar_rut
 ) # Importa todos los modelos de la aplicación 'clinica'
 
+# ----------------------------------------------------------------------
+# CARGAS MASIVAS: validación por lote para las rutas <recurso>/bulk/
+# ----------------------------------------------------------------------
+# El serializador de cada modelo valida cada elemento igual que en un POST
+# individual, pero lo que haría una consulta por fila (existencia de las
+# llaves foráneas y campos únicos) se resuelve con una consulta por campo
+# para todo el lote, y la escritura se hace con bulk_create/bulk_update.
+
+def pk_entero(valor):
+    """Convierte un ID recibido en el JSON a entero, o retorna None si no es válido."""
+    if isinstance(valor, bool):
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+class PrimaryKeyPrecargadoField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField que, durante una carga masiva, toma los objetos
+    relacionados de un diccionario precargado con un solo in_bulk() en lugar
+    de hacer un SELECT por fila.
+    """
+    precargados = None # {pk: instancia}, lo completa CargaMasivaListSerializer
+
+    def to_internal_value(self, data):
+        pk = pk_entero(data)
+        if self.precargados is None or pk is None:
+            return super().to_internal_value(data)
+        if pk not in self.precargados:
+            self.fail('does_not_exist', pk_value=data)
+        return self.precargados[pk]
+
+class CargaMasivaListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer de las cargas masivas (Meta.list_serializer_class).
+    - Creación: data=[{...}, ...]
+    - Actualización: instance={pk: objeto}, data=[{'id': pk, ...}, ...]
+    Los errores se reportan por elemento, en una lista alineada con los datos
+    recibidos ({} para los elementos válidos). Si algún elemento es inválido
+    no se escribe ninguno.
+    """
+    tamano_lote = 1000 # Filas por sentencia INSERT/UPDATE
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            raise serializers.ValidationError({'non_field_errors': ['Se esperaba una lista de elementos.']})
+        if not data and not self.allow_empty:
+            raise serializers.ValidationError({'non_field_errors': ['La lista no puede estar vacía.']})
+        if self.max_length is not None and len(data) > self.max_length:
+            raise serializers.ValidationError(
+                {'non_field_errors': [f'Se aceptan a lo más {self.max_length} elementos por solicitud.']}
+            )
+
+        campos_unicos = self._quitar_validadores_unicos()
+        self._precargar_relaciones(data)
+        try:
+            validados, errores, self._objetivos = [], [], []
+            for elemento in data:
+                error = {}
+                try:
+                    objetivo = self._objetivo(elemento)
+                    self.child.instance = objetivo
+                    validados.append(self.child.run_validation(elemento))
+                    self._objetivos.append(objetivo)
+                except serializers.ValidationError as exc:
+                    error = exc.detail
+                    validados.append(None)
+                    self._objetivos.append(None)
+                errores.append(error)
+        finally:
+            self.child.instance = None
+            for campo in self.child.fields.values():
+                if isinstance(campo, PrimaryKeyPrecargadoField):
+                    campo.precargados = None
+
+        self._validar_unicos(campos_unicos, validados, errores)
+        if any(errores):
+            raise serializers.ValidationError(errores)
+        return validados
+
+    def _objetivo(self, elemento):
+        """Instancia que actualiza el elemento (None en una creación)."""
+        if self.instance is None:
+            return None
+        pk = pk_entero(elemento.get('id')) if isinstance(elemento, dict) else None
+        if pk is None:
+            raise serializers.ValidationError({'id': ['Este campo es requerido para actualizar.']})
+        if pk not in self.instance:
+            raise serializers.ValidationError({'id': [f'No existe un objeto con ID {pk}.']})
+        return self.instance[pk]
+
+    def _quitar_validadores_unicos(self):
+        """
+        Retira los UniqueValidator de los campos (un SELECT por fila y campo) y
+        retorna (source, queryset, columna, normalizar) para verificarlos por lote
+        en _validar_unicos(), junto con los 'unicos_normalizados' del serializador.
+        """
+        campos_unicos = []
+        for campo in self.child.fields.values():
+            unicos = [v for v in campo.validators if isinstance(v, UniqueValidator)]
+            if unicos:
+                campos_unicos.append((campo.source, unicos[0].queryset, campo.source, None))
+                campo.validators = [v for v in campo.validators if not isinstance(v, UniqueValidator)]
+        # Columnas únicas calculadas a partir de un campo (ej: rut -> rut_normalizado)
+        modelo = self.child.Meta.model
+        for source, (columna, normalizar) in getattr(self.child, 'unicos_normalizados', {}).items():
+            campos_unicos.append((source, modelo._default_manager.all(), columna, normalizar))
+        return campos_unicos
+
+    def _precargar_relaciones(self, data):
+        """Precarga con un in_bulk() por campo los objetos que referencian las FKs del lote."""
+        for nombre, campo in self.child.fields.items():
+            if not isinstance(campo, PrimaryKeyPrecargadoField) or campo.read_only:
+                continue
+            ids = {pk_entero(elemento.get(nombre)) for elemento in data if isinstance(elemento, dict)}
+            ids.discard(None)
+            campo.precargados = campo.get_queryset().in_bulk(ids)
+
+    def _validar_unicos(self, campos_unicos, validados, errores):
+        """Valores repetidos dentro del lote o ya usados por otra fila: una consulta por campo."""
+        for source, queryset, columna, normalizar in campos_unicos:
+            indices = {}
+            for indice, attrs in enumerate(validados):
+                if attrs is not None and attrs.get(source) is not None:
+                    valor = normalizar(attrs[source]) if normalizar else attrs[source]
+                    indices.setdefault(valor, []).append(indice)
+            if not indices:
+                continue
+
+            existentes = dict(queryset.filter(**{f'{columna}__in': list(indices)}).values_list(columna, 'pk'))
+            for valor, posiciones in indices.items():
+                for indice in posiciones:
+                    objetivo = self._objetivos[indice]
+                    if len(posiciones) > 1:
+                        mensaje = f'El valor {valor} se repite en los elementos {posiciones}.'
+                    elif valor in existentes and (objetivo is None or existentes[valor] != objetivo.pk):
+                        mensaje = f'Ya existe un registro con este {source}.'
+                    else:
+                        continue
+                    errores[indice] = {**errores[indice], source: [mensaje]}
+
+    def create(self, validated_data):
+        modelo = self.child.Meta.model
+        objetos = []
+        for attrs in validated_data:
+            objeto = modelo()
+            self._asignar(objeto, attrs)
+            self._preparar(objeto)
+            objetos.append(objeto)
+        self._antes_de_guardar(modelo, objetos)
+        creados = modelo.objects.bulk_create(objetos, batch_size=self.tamano_lote)
+        self._despues_de_guardar(modelo, creados, creados=True)
+        invalidar_modelo(modelo) # bulk_create no emite post_save
+        return creados
+
+    def update(self, instance, validated_data):
+        modelo = self.child.Meta.model
+        campos = set()
+        for objeto, attrs in zip(self._objetivos, validated_data):
+            campos.update(self._asignar(objeto, attrs))
+            self._preparar(objeto)
+        if campos:
+            campos.update(getattr(modelo, 'campos_calculados', []))
+        self._antes_de_guardar(modelo, self._objetivos)
+        if campos:
+            modelo.objects.bulk_update(self._objetivos, sorted(campos), batch_size=self.tamano_lote)
+        self._despues_de_guardar(modelo, self._objetivos)
+        invalidar_modelo(modelo) # bulk_update tampoco
+        return self._objetivos
+
+    def _asignar(self, objeto, attrs):
+        """
+        Asigna los valores validados y retorna los nombres de las columnas
+        asignadas. Los campos que no son columnas (ej: 'ajuste_stock' de
+        Medicamento) quedan como atributos para los hooks del modelo.
+        """
+        columnas = {campo.name for campo in objeto._meta.concrete_fields}
+        for campo, valor in attrs.items():
+            setattr(objeto, campo, valor)
+        return columnas.intersection(attrs)
+
+    def _preparar(self, objeto):
+        """bulk_create/bulk_update no llaman a save(): se calculan aquí los campos derivados."""
+        preparar = getattr(objeto, 'preparar_para_guardar', None)
+        if preparar is not None:
+            preparar()
+
+    def _antes_de_guardar(self, modelo, objetos):
+        """Hook del modelo para el lote completo (ej: Receta_Medica reserva el stock)."""
+        antes_de_guardar = getattr(modelo, 'antes_de_guardar_lote', None)
+        if antes_de_guardar is not None:
+            antes_de_guardar(objetos)
+
+    def _despues_de_guardar(self, modelo, objetos, creados=False):
+        """Hook del modelo tras escribir el lote (ej: documentos de búsqueda, que las señales no actualizan)."""
+        despues_de_guardar = getattr(modelo, 'despues_de_guardar_lote', None)
+        if despues_de_guardar is not None:
+            despues_de_guardar(objetos, creados=creados)
+
+class ValidacionAlGuardarMixin:
+    """
+    Convierte los ValidationError de Django que el modelo lanza al guardar
+    (ej: StockInsuficiente) en errores 400 de DRF en lugar de un error 500.
+    """
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        except DjangoValidationError as error:
+            raise serializers.ValidationError(serializers.as_serializer_error(error))
+
+class RutUnicoMixin:
+    """
+    Para los serializadores de Paciente y Médico: rechaza un RUT que ya usa
+    otro registro escrito en otro formato ('12.345.678-9' y '12345678-9').
+    'rut_normalizado' no es editable, así que ModelSerializer no valida su
+    restricción única y el INSERT terminaría en IntegrityError (error 500).
+    En las cargas masivas lo verifica CargaMasivaListSerializer por lote.
+    """
+    unicos_normalizados = {'rut': ('rut_normalizado', normalizar_rut)} # source -> (columna única, normalización)
+
+    def validate_rut(self, valor):
+        if isinstance(self.parent, CargaMasivaListSerializer):
+            return valor # Una consulta para todo el lote en _validar_unicos()
+        otros = self.Meta.model._default_manager.filter(rut_normalizado=normalizar_rut(valor))
+        if self.instance is not None:
+            otros = otros.exclude(pk=self.instance.pk)
+        if otros.exists():
+            raise serializers.ValidationError('Ya existe un registro con este RUT (escrito en otro formato).')
+        return valor
+
+# ----------------------------------------------------------------------
+# CAMPOS DINÁMICOS: ?fields= y ?expand= en las lecturas de la API
+# ----------------------------------------------------------------------
+# ?fields=id,estado deja solo esos campos en la respuesta y ?expand=paciente
+# reemplaza el ID de la FK por el objeto relacionado completo. El ViewSet
+# usa rutas_modelo() para leer solo esas columnas (only()) y traer las
+# relaciones necesarias con JOIN (select_related()).
+
+class CamposDinamicosMixin:
+    """
+    Mixin para ModelSerializer. Solo actúa en requests GET; en escrituras el
+    serializador queda completo.
+    - campos_expandibles: {campo FK: serializador del objeto relacionado}
+    - dependencias_campos: {campo calculado: rutas del ORM que lee}
+    """
+    campos_expandibles = {}
+    dependencias_campos = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        expandir = self._lista_parametro(request, 'expand')
+        pedidos = self._lista_parametro(request, 'fields')
+
+        desconocidos = [campo for campo in expandir if campo not in self.campos_expandibles]
+        if desconocidos:
+            raise serializers.ValidationError(
+                {'expand': [f"No se pueden expandir: {', '.join(desconocidos)}. Opciones: {', '.join(self.campos_expandibles)}."]}
+            )
+        for campo in expandir:
+            self.fields[campo] = self.campos_expandibles[campo](read_only=True)
+
+        if pedidos:
+            desconocidos = [campo for campo in pedidos if campo not in self.fields]
+            if desconocidos:
+                raise serializers.ValidationError({'fields': [f"Campos desconocidos: {', '.join(desconocidos)}."]})
+            for campo in set(self.fields) - set(pedidos) - set(expandir):
+                self.fields.pop(campo)
+
+    def to_representation(self, instance):
+        registro = registro_actual()
+        if registro is None: # Métricas desactivadas: una fila es una llamada, sin costo extra
+            return super().to_representation(instance)
+        with registro.fase('serializacion'):
+            return super().to_representation(instance)
+
+    @staticmethod
+    def _lista_parametro(request, nombre):
+        return [valor.strip() for valor in request.query_params.get(nombre, '').split(',') if valor.strip()]
+
+    def rutas_modelo(self, prefijo=''):
+        """Rutas del ORM ('estado', 'paciente__nombre', ...) que leen los campos que se van a serializar."""
+        rutas = []
+        for nombre, campo in self.fields.items():
+            if campo.write_only: # No se lee de la base de datos (ej: 'ajuste_stock')
+                continue
+            if nombre in self.dependencias_campos:
+                rutas += [prefijo + ruta for ruta in self.dependencias_campos[nombre]]
+            elif campo.source == '*':
+                continue
+            elif isinstance(campo, CamposDinamicosMixin): # Relación expandida
+                rutas += campo.rutas_modelo(prefijo + '__'.join(campo.source_attrs) + '__')
+            else:
+                rutas.append(prefijo + '__'.join(campo.source_attrs))
+        return rutas
+
+    def modelos_leidos(self):
+        """
+        Modelos cuyas filas entran en la representación: el del serializador y
+        los que recorren las rutas de rutas_modelo() (relaciones expandidas y
+        campos como 'especialidad_nombre'). Sus versiones forman el ETag y la
+        clave de caché de la respuesta (ver clinica/cache.py).
+        """
+        modelos = [self.Meta.model]
+        for ruta in self.rutas_modelo():
+            modelo = self.Meta.model
+            for parte in ruta.split('__')[:-1]: # La última parte es la columna leída
+                try:
+                    campo = modelo._meta.get_field(parte)
+                except FieldDoesNotExist: # Propiedad o método del modelo
+                    break
+                if not campo.is_relation:
+                    break
+                modelo = campo.related_model
+                if modelo not in modelos:
+                    modelos.append(modelo)
+        return modelos
+
+# ----------------------------------------------------------------------
+# LECTURA RÁPIDA: representación de filas de values() sin instancias
+# ----------------------------------------------------------------------
+# Para los listados grandes, crear una instancia de modelo por fila y
+# recorrer campo por campo to_representation() domina el tiempo de CPU.
+# PlanLectura se compila una vez por serializador y conjunto de campos:
+# indica qué columnas pedir a values() y cómo convertir cada una, y produce
+# el mismo JSON que el serializador.
+
+# Campos cuyo valor de la base de datos ya es su representación JSON
+_CAMPOS_DIRECTOS = (
+    serializers.CharField, serializers.ChoiceField, serializers.IntegerField,
+    serializers.BooleanField, serializers.PrimaryKeyRelatedField, # values() entrega el ID de la FK
+)
+# Campos que se convierten con su propio to_representation() (fechas con zona horaria, decimales)
+_CAMPOS_CONVERTIDOS = (
+    serializers.DateTimeField, serializers.DateField, serializers.TimeField,
+    serializers.DecimalField, serializers.FloatField,
+)
+
+def _con_conversion(clave, conversion):
+    def obtener(fila):
+        valor = fila[clave]
+        return None if valor is None else conversion(valor)
+    return obtener
+
+class PlanLectura:
+    """
+    Plan de lectura de un serializador con CamposDinamicosMixin.
+    - rutas: columnas para QuerySet.values()
+    - representar(filas): lista de diccionarios con las claves y el orden del serializador
+    Los campos calculados se declaran en 'representaciones_rapidas' del
+    serializador ({campo: función(fila)}) y leen las rutas de 'dependencias_campos'.
+    """
+    _planes = {} # (clase del serializador, campos) -> PlanLectura
+
+    def __init__(self, columnas, rutas):
+        self.columnas = columnas # [(nombre, función(fila))]
+        self.rutas = rutas
+
+    @classmethod
+    def para(cls, serializer):
+        """Plan del serializador, o None si algún campo no se puede leer desde values() (ej: ?expand=)."""
+        clave = (type(serializer), tuple(serializer.fields))
+        if clave not in cls._planes:
+            cls._planes[clave] = cls._compilar(serializer)
+        return cls._planes[clave]
+
+    @classmethod
+    def _compilar(cls, serializer):
+        columnas, rutas = [], []
+        rapidas = getattr(serializer, 'representaciones_rapidas', {})
+        for nombre, campo in serializer.fields.items():
+            if campo.write_only:
+                continue
+            if nombre in rapidas:
+                columnas.append((nombre, rapidas[nombre]))
+                rutas += serializer.dependencias_campos[nombre]
+                continue
+            if campo.source == '*' or isinstance(campo, serializers.BaseSerializer):
+                return None
+            ruta = '__'.join(campo.source_attrs)
+            if isinstance(campo, _CAMPOS_DIRECTOS):
+                columnas.append((nombre, itemgetter(ruta)))
+            elif isinstance(campo, _CAMPOS_CONVERTIDOS):
+                columnas.append((nombre, _con_conversion(ruta, campo.to_representation)))
+            else:
+                return None
+            rutas.append(ruta)
+        return cls(columnas, list(dict.fromkeys(rutas)))
+
+    def representar(self, filas):
+        columnas = self.columnas
+        with medir_fase('serializacion'):
+            return [{nombre: obtener(fila) for nombre, obtener in columnas} for fila in filas]
+
 # ----------------------------------------------------------------------
 # SERIALIZADORES BÁSICOS: Uso de ModelSerializer para exponer modelos
 # ----------------------------------------------------------------------
 # ModelSerializer automatiza la creación de campos basada en los modelos
 # de Django, facilitando la conversión de datos de Python a JSON y viceversa.
 
-class DepartamentoSerializer(serializers.ModelSerializer):
+class DepartamentoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializador para el modelo Departamento."""
     class Meta:
         model = Departamento
         fields = '__all__' # Incluye todos los campos del modelo en la API
 
-class EspecialidadSerializer(serializers.ModelSerializer):
+class EspecialidadSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializador para Especialidad.
     Incluye un campo de solo lectura para mostrar el nombre del Departamento asociado.
@@ -28,23 +431,26 @@ class EspecialidadSerializer(serializers.ModelSerializer):
     # Campo personalizado: Muestra el campo 'nombre' del modelo 'departamento' relacionado
     # en lugar del ID (Foreign Key). Es 'read_only' para evitar que se envíe en la creación/actualización.
     departamento_nombre = serializers.CharField(source='departamento.nombre', read_only=True)
+    campos_expandibles = {'departamento': DepartamentoSerializer}
     class Meta:
         model = Especialidad
         fields = '__all__'
 
-class PacienteSerializer(serializers.ModelSerializer):
+class PacienteSerializer(CamposDinamicosMixin, RutUnicoMixin, serializers.ModelSerializer):
     """Serializador para el modelo Paciente."""
     class Meta:
         model = Paciente
         fields = '__all__'
+        list_serializer_class = CargaMasivaListSerializer # Usado por PacienteViewSet.bulk
 
-class MedicoSerializer(serializers.ModelSerializer):
+class MedicoSerializer(CamposDinamicosMixin, RutUnicoMixin, serializers.ModelSerializer):
     """
     Serializador para Médico.
     Incluye un campo de solo lectura para mostrar el nombre de la Especialidad.
     """
     # Campo personalizado: Muestra el campo 'nombre' del modelo 'especialidad' relacionado.
     especialidad_nombre = serializers.CharField(source='especialidad.nombre', read_only=True)
+    campos_expandibles = {'especialidad': EspecialidadSerializer}
     class Meta:
         model = Medico
         fields = '__all__'
@@ -52,20 +458,33 @@ class MedicoSerializer(serializers.ModelSerializer):
 # Bloque de Serializadores con Campos Calculados (SerializerMethodField)
 # ----------------------------------------------------------------------
 
-class ConsultaMedicaSerializer(serializers.ModelSerializer):
+class ConsultaMedicaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializador para Consulta Médica.
     Utiliza SerializerMethodField para crear campos que combinan datos,
     como el nombre completo del paciente y del médico.
+    El queryset debe traer 'paciente' y 'medico' con select_related (ver ConsultaMedicaViewSet).
     """
     # Campo calculado: El valor se obtiene llamando al método 'get_paciente_nombre_completo'.
     paciente_nombre_completo = serializers.SerializerMethodField()
     # Campo calculado: El valor se obtiene llamando al método 'get_medico_nombre_completo'.
     medico_nombre_completo = serializers.SerializerMethodField()
+
+    campos_expandibles = {'paciente': PacienteSerializer, 'medico': MedicoSerializer}
+    # Columnas que leen los campos calculados (para ?fields=)
+    dependencias_campos = {
+        'paciente_nombre_completo': ['paciente__nombre', 'paciente__apellido'],
+        'medico_nombre_completo': ['medico__nombre', 'medico__apellido'],
+    }
+    # Los mismos campos calculados sobre una fila de values() (ver PlanLectura)
+    representaciones_rapidas = {
+        'paciente_nombre_completo': lambda fila: f"{fila['paciente__nombre']} {fila['paciente__apellido']}",
+        'medico_nombre_completo': lambda fila: f"{fila['medico__nombre']} {fila['medico__apellido']}",
+    }
     
     class Meta:
         model = Consulta_Medica
-        fields = '__all__'
+        exclude = ['busqueda'] # tsvector interno del filtro 'buscar' (no es parte de la representación)
 
     # Implementación del método para obtener el nombre completo del paciente.
     def get_paciente_nombre_completo(self, obj):
@@ -80,25 +499,142 @@ class ConsultaMedicaSerializer(serializers.ModelSerializer):
 # Bloque de Serializadores Adicionales
 # ----------------------------------------------------------------------
 
-class TratamientoSerializer(serializers.ModelSerializer):
+class TratamientoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializador para el modelo Tratamiento."""
+    campos_expandibles = {'consulta': ConsultaMedicaSerializer}
     class Meta:
         model = Tratamiento
         fields = '__all__'
 
-class MedicamentoSerializer(serializers.ModelSerializer):
-    """Serializador para el modelo Medicamento."""
+class MedicamentoSerializer(CamposDinamicosMixin, ValidacionAlGuardarMixin, serializers.ModelSerializer):
+    """
+    Serializador para el modelo Medicamento.
+    'stock' solo se escribe al crear: al editar es de solo lectura (un PUT con
+    el valor leído antes pisaría las reservas hechas desde entonces) y se
+    cambia con 'ajuste_stock', una diferencia que se suma en la base de datos.
+    """
+    ajuste_stock = serializers.IntegerField(
+        write_only=True, required=False, help_text='Unidades que ingresan (positivo) o salen (negativo) del stock.'
+    )
     class Meta:
         model = Medicamento
         fields = '__all__'
+        list_serializer_class = CargaMasivaListSerializer # Usado por MedicamentoViewSet.bulk
+
+    def get_fields(self):
+        campos = super().get_fields()
+        if self.instance is not None: # Edición (en la carga masiva, {pk: medicamento})
+            campos['stock'].read_only = True
+        return campos
+
+    def create(self, validated_data):
+        ajuste = validated_data.pop('ajuste_stock', 0)
+        with transaction.atomic():
+            return self._ajustar(super().create(validated_data), ajuste)
+
+    def update(self, instance, validated_data):
+        ajuste = validated_data.pop('ajuste_stock', 0)
+        with transaction.atomic():
+            return self._ajustar(super().update(instance, validated_data), ajuste)
 
-class RecetaMedicaSerializer(serializers.ModelSerializer):
+    @staticmethod
+    def _ajustar(medicamento, ajuste):
+        if ajuste:
+            Medicamento.ajustar_stock({medicamento.pk: ajuste})
+            medicamento.refresh_from_db(fields=['stock'])
+        return medicamento
+
+class RecetaMedicaSerializer(CamposDinamicosMixin, ValidacionAlGuardarMixin, serializers.ModelSerializer):
     """
     Serializador para Receta Médica.
     Incluye el nombre del Medicamento asociado en lugar de solo su ID.
+    Al crearla o editarla se reserva 'cantidad' unidades del stock (ver Receta_Medica.reservar_stock).
     """
+    # Las FKs (consulta, medicamento) se precargan por lote en las cargas masivas
+    serializer_related_field = PrimaryKeyPrecargadoField
     # Campo personalizado: Muestra el campo 'nombre' del modelo 'medicamento' relacionado.
+    medicamento_nombre = serializers.CharField(source='medicamento.nombre', read_only=True)
+    campos_expandibles = {'consulta': ConsultaMedicaSerializer, 'medicamento': MedicamentoSerializer}
+    class Meta:
+        model = Receta_Medica
+        fields = '__all__'
+        list_serializer_class = CargaMasivaListSerializer # Usado por RecetaMedicaViewSet.bulk
+
+# Bloque de Serializadores de la Línea de Tiempo del Paciente
+# ----------------------------------------------------------------------
+# Usados por PacienteViewSet.timeline: las relaciones anidadas se leen de
+# los prefetch_related() de la vista, sin consultas por consulta médica.
+
+class TimelinePacienteSerializer(serializers.ModelSerializer):
+    """Encabezado de la línea de tiempo: datos de identificación del paciente."""
+    class Meta:
+        model = Paciente
+        fields = ['id', 'rut', 'nombre', 'apellido', 'fecha_nacimiento', 'tipo_sangre']
+
+class TimelineTratamientoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Tratamiento
+        fields = ['id', 'descripcion', 'duracion_dias', 'observaciones']
+
+class TimelineRecetaSerializer(serializers.ModelSerializer):
     medicamento_nombre = serializers.CharField(source='medicamento.nombre', read_only=True)
     class Meta:
         model = Receta_Medica
-        fields = '__all__'
\ No newline at end of file
+        fields = ['id', 'medicamento', 'medicamento_nombre', 'dosis', 'frecuencia', 'duracion', 'cantidad']
+
+class TimelineConsultaSerializer(serializers.ModelSerializer):
+    """
+    Consulta con su médico, tratamientos y recetas. El queryset debe traer
+    'medico__especialidad' con select_related y 'tratamiento_set' y
+    'receta_medica_set__medicamento' con prefetch_related.
+    """
+    medico_nombre_completo = serializers.SerializerMethodField()
+    especialidad_nombre = serializers.CharField(source='medico.especialidad.nombre', read_only=True)
+    tratamientos = TimelineTratamientoSerializer(source='tratamiento_set', many=True, read_only=True)
+    recetas = TimelineRecetaSerializer(source='receta_medica_set', many=True, read_only=True)
+
+    class Meta:
+        model = Consulta_Medica
+        fields = [
+            'id', 'fecha_consulta', 'estado', 'motivo', 'diagnostico', 'medico', 'medico_nombre_completo',
+            'especialidad_nombre', 'tratamientos', 'recetas',
+        ]
+
+    def get_medico_nombre_completo(self, obj):
+        return f"{obj.medico.nombre} {obj.medico.apellido}"
+
+# Bloque de Serializadores de Autocompletado
+# ----------------------------------------------------------------------
+
+class AutocompletarSerializer(serializers.Serializer):
+    """
+    Serializador mínimo para los endpoints de autocompletado: solo el ID
+    y el texto que se muestra en el selector (str() del objeto).
+    """
+    id = serializers.IntegerField(read_only=True)
+    texto = serializers.CharField(source='__str__', read_only=True)
+
+# Bloque de Serializadores de Estadísticas
+# ----------------------------------------------------------------------
+
+class EstadisticasConsultasParametrosSerializer(serializers.Serializer):
+    """Valida los parámetros GET del resumen de consultas (?desde=&hasta=&agrupar=)."""
+    desde = serializers.DateField(required=False)
+    hasta = serializers.DateField(required=False)
+    agrupar = serializers.ChoiceField(choices=['medico', 'especialidad', 'departamento'], default='especialidad')
+
+    def validate(self, attrs):
+        if attrs.get('desde') and attrs.get('hasta') and attrs['desde'] > attrs['hasta']:
+            raise serializers.ValidationError({'hasta': ['Debe ser posterior o igual a "desde".']})
+        return attrs
+
+# Bloque de Serializadores de la Búsqueda Unificada
+# ----------------------------------------------------------------------
+
+class BusquedaParametrosSerializer(serializers.Serializer):
+    """Valida los parámetros GET de la búsqueda unificada (?q=&tipo=&paciente=&limite=)."""
+    q = serializers.CharField(min_length=2, max_length=200) # Sintaxis de buscador: "frase exacta", -excluir, or
+    tipo = serializers.ChoiceField(choices=['paciente', 'consulta'], required=False)
+    paciente = serializers.IntegerField(min_value=1, required=False) # Busca solo en el historial de un paciente
+    limite = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
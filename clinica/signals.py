@@ -0,0 +1,146 @@
+# clinica/signals.py
+
+# Bloque de Importaciones
+# ======================================================================
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save # Mantienen el resumen en la misma transacción que la consulta
+from django.dispatch import receiver
+from django.utils import timezone
+from .cache import invalidar_modelo
+from .models import (
+    Departamento, Especialidad, Paciente, Medico, Consulta_Medica,
+    Tratamiento, Medicamento, Receta_Medica, Estadistica_Diaria_Consulta, Documento_Busqueda,
+    descontar_stock
+)
+
+# ======================================================================
+# RESUMEN DIARIO DE CONSULTAS (Estadistica_Diaria_Consulta)
+# Cada alta, cambio de estado/médico/fecha o baja de una consulta mueve
+# una unidad entre las filas del resumen. Los cambios masivos que no pasan
+# por save()/delete() (QuerySet.update(), SQL directo) se corrigen con
+# 'manage.py recalcular_estadisticas'.
+# ======================================================================
+
+@receiver(pre_save, sender=Consulta_Medica)
+def recordar_clave_anterior(sender, instance, using, raw=False, **kwargs):
+    """
+    Al editar, lee la clave con que la consulta está contada (una fila por
+    PK, con FOR UPDATE: dos ediciones simultáneas no restan la misma clave).
+    Las consultas leídas para listar o mostrar no calculan nada.
+    """
+    instance.__dict__.pop('_clave_estadistica', None)
+    if raw or instance.pk is None:
+        return
+    fila = (
+        sender.objects.using(using).select_for_update().filter(pk=instance.pk)
+        .values_list('fecha_consulta', 'medico_id', 'estado').first()
+    )
+    if fila is not None:
+        instance._clave_estadistica = (timezone.localdate(fila[0]), fila[1], fila[2])
+
+@receiver(post_save, sender=Consulta_Medica)
+def contar_consulta_guardada(sender, instance, created, using, raw=False, **kwargs):
+    """Suma la consulta a su fila del resumen y, si cambió de clave, la resta de la anterior."""
+    if raw: # loaddata: el resumen se recalcula aparte
+        return
+    anterior = None if created else getattr(instance, '_clave_estadistica', None)
+    nueva = instance.clave_estadistica()
+    if anterior == nueva:
+        return
+    cambios = {nueva: 1}
+    if anterior is not None:
+        cambios[anterior] = -1
+    Estadistica_Diaria_Consulta.sumar(cambios, using=using)
+
+@receiver(post_delete, sender=Consulta_Medica)
+def descontar_consulta_eliminada(sender, instance, using, **kwargs):
+    """Resta la consulta eliminada (incluye los borrados en cascada y QuerySet.delete())."""
+    Estadistica_Diaria_Consulta.sumar({instance.clave_estadistica(): -1}, using=using)
+
+# ======================================================================
+# RESERVA DE STOCK (Receta_Medica; ver descontar_stock() en models.py)
+# La baja de una receta devuelve su reserva. Con una señal (y no con
+# delete()) también la devuelven los borrados en cascada de la consulta y
+# QuerySet.delete(), que no llaman al delete() de cada instancia.
+# ======================================================================
+
+@receiver(pre_delete, sender=Receta_Medica)
+def devolver_stock_reservado(sender, instance, **kwargs):
+    """Devuelve la cantidad guardada (bloqueada con FOR UPDATE), no la que tenga la instancia en memoria."""
+    guardada = Receta_Medica.reservas_guardadas([instance.pk]).get(instance.pk)
+    if guardada is not None:
+        medicamento_id, cantidad = guardada
+        descontar_stock({medicamento_id: -cantidad})
+
+# ======================================================================
+# VERSIONES POR MODELO (caché de datos de referencia y ETag de la API; ver cache.py)
+# ======================================================================
+
+def invalidar_version(sender, **kwargs):
+    """Cualquier alta, cambio o baja renueva la versión del modelo."""
+    invalidar_modelo(sender)
+
+for modelo in (Departamento, Especialidad, Paciente, Medico, Consulta_Medica, Tratamiento, Medicamento, Receta_Medica):
+    post_save.connect(invalidar_version, sender=modelo, dispatch_uid=f'version_{modelo._meta.label_lower}_save')
+    post_delete.connect(invalidar_version, sender=modelo, dispatch_uid=f'version_{modelo._meta.label_lower}_delete')
+
+# ======================================================================
+# DOCUMENTOS DE BÚSQUEDA (Documento_Busqueda; ver models.py)
+# Cada escritura recalcula solo los documentos afectados, en la misma
+# transacción. Las bajas de pacientes y consultas borran sus documentos en
+# cascada. Las cargas masivas lo hacen desde despues_de_guardar_lote() y
+# los cambios por SQL directo se corrigen con 'manage.py reindexar_busqueda'.
+# ======================================================================
+
+@receiver(pre_save, sender=Tratamiento)
+@receiver(pre_save, sender=Receta_Medica)
+def recordar_consulta_anterior(sender, instance, using, raw=False, **kwargs):
+    """Consulta con que está indexado, si no se leyó de la base de datos (al moverlo, la anterior también se reindexa)."""
+    if raw or instance.pk is None or hasattr(instance, '_consulta_indexada'):
+        return
+    instance._consulta_indexada = sender.objects.using(using).filter(pk=instance.pk).values_list('consulta_id', flat=True).first()
+
+@receiver(pre_save, sender=Medicamento)
+def recordar_nombre_medicamento(sender, instance, using, raw=False, **kwargs):
+    """Nombre con que el medicamento está en los documentos, si no se leyó de la base de datos."""
+    if raw or instance.pk is None or hasattr(instance, '_nombre_indexado'):
+        return
+    instance._nombre_indexado = sender.objects.using(using).filter(pk=instance.pk).values_list('nombre', flat=True).first()
+
+@receiver(post_save, sender=Paciente)
+def indexar_paciente(sender, instance, created, using, raw=False, **kwargs):
+    if raw:
+        return
+    # Nombre y RUT también están en los documentos de sus consultas (un paciente nuevo no tiene)
+    Documento_Busqueda.indexar(
+        pacientes=[instance.pk], consultas_de_pacientes=[] if created else [instance.pk], using=using,
+    )
+
+@receiver(post_save, sender=Consulta_Medica)
+def indexar_consulta(sender, instance, raw=False, using=None, **kwargs):
+    if not raw:
+        Documento_Busqueda.indexar(consultas=[instance.pk], using=using)
+
+@receiver(post_save, sender=Tratamiento)
+@receiver(post_save, sender=Receta_Medica)
+def indexar_consulta_de_detalle(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    consultas = {instance.consulta_id, getattr(instance, '_consulta_indexada', None)} - {None}
+    Documento_Busqueda.indexar(consultas=consultas, using=using)
+    instance._consulta_indexada = instance.consulta_id
+
+@receiver(post_delete, sender=Tratamiento)
+@receiver(post_delete, sender=Receta_Medica)
+def desindexar_detalle(sender, instance, using, origin=None, **kwargs):
+    # En la baja en cascada de la consulta, su documento ya se borró: no se vuelve a crear
+    if isinstance(origin, Consulta_Medica) or getattr(origin, 'model', None) is Consulta_Medica:
+        return
+    Documento_Busqueda.indexar(consultas=[instance.consulta_id], using=using)
+
+@receiver(post_save, sender=Medicamento)
+def indexar_medicamento(sender, instance, created, using, raw=False, **kwargs):
+    nombre_anterior = getattr(instance, '_nombre_indexado', None)
+    if raw or created or nombre_anterior is None or nombre_anterior == instance.nombre:
+        return # Los cambios de stock o precio no tocan los documentos
+    Documento_Busqueda.indexar(consultas_de_medicamentos=[instance.pk], using=using)
+    instance._nombre_indexado = instance.nombre
@@ -0,0 +1,63 @@
+// clinica/static/clinica/autocompletar.js
+// Carga bajo demanda las opciones de los <select data-autocompletar-url>
+// (widget AutocompletarSelect) desde los endpoints /api/autocompletar/...
+(function () {
+    'use strict';
+
+    function agregarOpciones(select, resultados) {
+        // Se comparan los valores (no un selector CSS armado con el ID)
+        var existentes = new Set(Array.from(select.options, function (opcion) { return opcion.value; }));
+        resultados.forEach(function (item) {
+            var valor = String(item.id);
+            if (!existentes.has(valor)) {
+                select.add(new Option(item.texto, valor));
+                existentes.add(valor);
+            }
+        });
+    }
+
+    function iniciar(select) {
+        var buscador = document.querySelector('[data-autocompletar-para="' + select.id + '"]');
+        var siguiente = null;
+        var espera = null;
+
+        var botonMas = document.createElement('button');
+        botonMas.type = 'button';
+        botonMas.className = 'btn btn-link btn-sm p-0';
+        botonMas.textContent = 'Cargar más resultados';
+        botonMas.hidden = true;
+        select.insertAdjacentElement('afterend', botonMas);
+
+        function cargar(url, reemplazar) {
+            fetch(url, {headers: {'Accept': 'application/json'}})
+                .then(function (respuesta) { return respuesta.json(); })
+                .then(function (datos) {
+                    if (reemplazar) {
+                        // Se conservan la opción vacía y la seleccionada
+                        Array.from(select.options).forEach(function (opcion) {
+                            if (opcion.value && !opcion.selected) { opcion.remove(); }
+                        });
+                    }
+                    agregarOpciones(select, datos.results);
+                    siguiente = datos.next;
+                    botonMas.hidden = !siguiente;
+                });
+        }
+
+        buscador.addEventListener('input', function () {
+            clearTimeout(espera);
+            espera = setTimeout(function () {
+                var url = new URL(select.dataset.autocompletarUrl, window.location.origin);
+                url.searchParams.set('q', buscador.value.trim());
+                cargar(url, true);
+            }, 250);
+        });
+        botonMas.addEventListener('click', function () {
+            if (siguiente) { cargar(siguiente, false); }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocompletar-url]').forEach(iniciar);
+    });
+})();
@@ -1,3 +1,1157 @@
-from django.test import TestCase
+# clinica/tests.py
 
-# Create your tests here.
+# Bloque de Importaciones
+# ======================================================================
+import base64
+import csv
+import json
+import tempfile
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+from urllib.parse import urlencode
+from django.core.management import call_command
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from .models import (
+    Departamento, Especialidad, Paciente, Medico, Consulta_Medica, Tratamiento, Medicamento,
+    Receta_Medica, Estadistica_Diaria_Consulta, Documento_Busqueda, StockInsuficiente, descontar_stock,
+)
+from .cache import verificar_cache_compartida
+from .middleware import LecturaEnReplicaMiddleware, PresupuestoConsultasExcedido
+from .routers import ReplicaRouter, leer_del_primario
+from .filters import OrdenamientoInvalido, busqueda_trigramas, resolver_ordenamiento, ORDENAMIENTO_CONSULTA
+from .serializers import PacienteSerializer, MedicoSerializer, ConsultaMedicaSerializer, RecetaMedicaSerializer
+from .pagination import ConteoEstimadoPaginator, KeysetCursorPagination, codificar_posicion, decodificar_posicion
+from .views import ConsultaMedicaViewSet, PacienteListView, RecetaMedicaViewSet
+
+# ======================================================================
+# PRUEBAS DE RENDIMIENTO DE LA API: CONSULTAS SQL POR REQUEST
+# La cantidad de consultas de un listado no debe crecer con el tamaño de la
+# página: si un serializador lee una relación sin select_related (N+1),
+# una página más grande dispara más consultas y la prueba falla.
+# ======================================================================
+
+class DatosClinicaMixin:
+    """Crea 10 filas relacionadas de cada entidad para las pruebas de rendimiento."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(10):
+            departamento = Departamento.objects.create(nombre=f'Departamento {i}')
+            especialidad = Especialidad.objects.create(nombre=f'Especialidad {i}', departamento=departamento)
+            paciente = Paciente.objects.create(
+                rut=f'1000000{i}-K', nombre=f'Paciente{i}', apellido='Prueba',
+                fecha_nacimiento=date(1990, 1, 1), tipo_sangre='O+', correo=f'paciente{i}@test.cl',
+            )
+            medico = Medico.objects.create(
+                rut=f'2000000{i}-K', nombre=f'Medico{i}', apellido='Prueba',
+                correo=f'medico{i}@test.cl', especialidad=especialidad,
+            )
+            medicamento = Medicamento.objects.create(
+                nombre=f'Medicamento {i}', laboratorio='Lab', stock=100, precio_unitario=Decimal('1.00'),
+            )
+            consulta = Consulta_Medica.objects.create(paciente=paciente, medico=medico, motivo='Control')
+            Receta_Medica.objects.create(
+                consulta=consulta, medicamento=medicamento, dosis='1', frecuencia='8h', duracion='7 días',
+            )
+
+class ConsultasPorPaginaTests(DatosClinicaMixin, TestCase):
+    """Verifica que los listados de la API ejecuten un número fijo de consultas SQL."""
+
+    def contar_consultas(self, url):
+        """Ejecuta un GET y retorna la cantidad de consultas SQL que realizó."""
+        client = APIClient()
+        with CaptureQueriesContext(connection) as contexto:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['results'], f'{url}: respuesta sin filas')
+        return len(contexto.captured_queries)
+
+    def assertConsultasConstantes(self, url):
+        """Falla si el número de consultas crece al aumentar el tamaño de la página."""
+        separador = '&' if '?' in url else '?'
+        pocas = self.contar_consultas(f'{url}{separador}page_size=2')
+        muchas = self.contar_consultas(f'{url}{separador}page_size=10')
+        self.assertEqual(pocas, muchas, f'{url}: {pocas} consultas con 2 filas y {muchas} con 10 (N+1)')
+
+    def test_consultas_sin_n_mas_1(self):
+        self.assertConsultasConstantes('/api/consultas/')
+
+    def test_recetas_sin_n_mas_1(self):
+        self.assertConsultasConstantes('/api/recetas/')
+
+    def test_especialidades_sin_n_mas_1(self):
+        self.assertConsultasConstantes('/api/especialidades/')
+
+    def test_medicos_sin_n_mas_1(self):
+        self.assertConsultasConstantes('/api/medicos/')
+
+    def test_consultas_expandidas_sin_n_mas_1(self):
+        # ?expand= reemplaza las FK por objetos completos: deben venir en el mismo JOIN
+        self.assertConsultasConstantes('/api/consultas/?expand=paciente,medico&fields=id')
+
+    def test_recetas_expandidas_sin_n_mas_1(self):
+        self.assertConsultasConstantes('/api/recetas/?expand=consulta,medicamento')
+
+# ======================================================================
+# LECTURA RÁPIDA DE LOS LISTADOS (ListadoRapidoMixin)
+# Los listados que se arman desde values() deben producir exactamente el
+# mismo JSON que el serializador sobre instancias del modelo.
+# ======================================================================
+
+class LecturaRapidaTests(DatosClinicaMixin, TestCase):
+    """Compara cada listado rápido con la salida del serializador."""
+
+    def assertIgualAlSerializador(self, url, queryset, serializador):
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        ids = [fila['id'] for fila in response.json()['results']]
+        esperado = serializador(queryset.filter(pk__in=ids), many=True).data
+        esperado = sorted(esperado, key=lambda fila: ids.index(fila['id']))
+        self.assertEqual(response.json()['results'], json.loads(JSONRenderer().render(esperado)))
+
+    def test_listados_iguales_al_serializador(self):
+        casos = [
+            ('/api/pacientes/', Paciente.objects.all(), PacienteSerializer),
+            ('/api/medicos/', Medico.objects.all(), MedicoSerializer),
+            ('/api/consultas/', Consulta_Medica.objects.all(), ConsultaMedicaSerializer),
+            ('/api/recetas/', Receta_Medica.objects.all(), RecetaMedicaSerializer),
+        ]
+        for url, queryset, serializador in casos:
+            with self.subTest(url=url):
+                self.assertIgualAlSerializador(f'{url}?page_size=5', queryset, serializador)
+
+    def test_paginas_siguientes_por_cursor(self):
+        siguiente = '/api/consultas/?page_size=4'
+        vistas = []
+        while siguiente:
+            datos = APIClient().get(siguiente).json()
+            vistas += [fila['id'] for fila in datos['results']]
+            siguiente = datos['next']
+        self.assertEqual(vistas, list(Consulta_Medica.objects.order_by('-fecha_consulta', '-id').values_list('id', flat=True)))
+
+class LecturaAsincronaTests(DatosClinicaMixin, TestCase):
+    """Las vistas asíncronas (/api/async/) responden lo mismo que los ViewSets."""
+
+    def test_igual_a_la_api_sincrona(self):
+        consulta = Consulta_Medica.objects.first()
+        for ruta in [
+            'pacientes/?page_size=4', 'medicos/?fields=id,nombre&buscar=Medico', 'consultas/?page_size=3',
+            f'consultas/?paciente={consulta.paciente_id}', f'consultas/{consulta.pk}/',
+        ]:
+            with self.subTest(ruta=ruta):
+                sincrona = self.client.get(f'/api/{ruta}', headers={'accept': 'application/json'})
+                asincrona = self.client.get(f'/api/async/{ruta}')
+                self.assertEqual(asincrona.status_code, 200)
+                datos = asincrona.json()
+                if 'next' in datos: # Los enlaces apuntan a su propia ruta
+                    for enlace in ('next', 'previous'):
+                        datos[enlace] = datos[enlace] and datos[enlace].replace('/api/async/', '/api/')
+                self.assertEqual(datos, sincrona.json())
+
+    async def test_exportacion_en_streaming(self):
+        response = await self.async_client.get('/api/async/consultas/export/?formato=ndjson')
+        self.assertTrue(response.is_async)
+        contenido = b''.join([parte async for parte in response.streaming_content])
+        filas = [json.loads(linea) for linea in contenido.splitlines()]
+        self.assertEqual(len(filas), await Consulta_Medica.objects.acount())
+
+# ======================================================================
+# ORDENAMIENTO VALIDADO (?ordering=)
+# Solo se aceptan los valores de 'campos_ordenamiento' y todo orden termina
+# en el ID: las páginas por cursor recorren cada fila exactamente una vez.
+# ======================================================================
+
+class OrdenamientoTests(DatosClinicaMixin, TestCase):
+    """Lista de campos permitidos, desempate por ID y respuesta ante valores inválidos."""
+
+    def recorrer(self, url):
+        """IDs de todas las páginas de un listado de la API, siguiendo los cursores."""
+        ids = []
+        while url:
+            response = APIClient().get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [fila['id'] for fila in response.json()['results']]
+            url = response.json()['next']
+        return ids
+
+    def test_resolver_ordenamiento(self):
+        self.assertEqual(resolver_ordenamiento('id', ORDENAMIENTO_CONSULTA), ('id',))
+        self.assertEqual(resolver_ordenamiento('estado', ORDENAMIENTO_CONSULTA), ('estado', '-fecha_consulta', '-id'))
+        self.assertEqual(resolver_ordenamiento('-paciente', ORDENAMIENTO_CONSULTA), ('-paciente_id', 'fecha_consulta', 'id'))
+        with self.assertRaises(OrdenamientoInvalido):
+            resolver_ordenamiento('motivo', ORDENAMIENTO_CONSULTA)
+
+    def test_paginas_por_cursor_con_ordenamiento(self):
+        Paciente.objects.update(nombre='Repetido') # Todo se resuelve con el desempate
+        casos = [
+            ('/api/pacientes/?ordering=-nombre', Paciente.objects.order_by('-nombre', '-id')),
+            ('/api/consultas/?ordering=medico', Consulta_Medica.objects.order_by('medico_id', '-fecha_consulta', '-id')),
+            ('/api/recetas/?ordering=-medicamento&expand=medicamento', Receta_Medica.objects.order_by('-medicamento_id', '-id')),
+            ('/api/async/pacientes/?ordering=nombre&fields=id', Paciente.objects.order_by('nombre', 'id')),
+        ]
+        for url, queryset in casos:
+            with self.subTest(url=url):
+                self.assertEqual(self.recorrer(f'{url}&page_size=3'), list(queryset.values_list('id', flat=True)))
+
+    def test_paginas_con_separadores_en_el_texto(self):
+        # Los textos libres pueden traer '|', comillas o corchetes; el cursor no debe partirlos
+        textos = ['A|x', 'A|x|', '|', 'B "c", [d]', 'A\\|y', 'A']
+        for modelo, campos in [(Departamento, ['nombre']), (Paciente, ['nombre', 'rut']), (Medico, ['rut']), (Medicamento, ['nombre', 'laboratorio'])]:
+            for i, pk in enumerate(modelo.objects.order_by('id').values_list('id', flat=True)):
+                modelo.objects.filter(pk=pk).update(**{campo: f'{textos[i % len(textos)]}{i // len(textos) or ""}' for campo in campos})
+        casos = [
+            ('/api/departamentos/?ordering=nombre', Departamento.objects.order_by('nombre', 'id')),
+            ('/api/pacientes/?ordering=nombre', Paciente.objects.order_by('nombre', 'id')),
+            ('/api/pacientes/?ordering=-rut', Paciente.objects.order_by('-rut', '-id')),
+            ('/api/medicos/?ordering=rut', Medico.objects.order_by('rut', 'id')),
+            ('/api/medicamentos/?ordering=-laboratorio', Medicamento.objects.order_by('-laboratorio', '-id')),
+            ('/api/async/pacientes/?ordering=nombre&fields=id', Paciente.objects.order_by('nombre', 'id')),
+        ]
+        for url, queryset in casos:
+            with self.subTest(url=url):
+                self.assertEqual(self.recorrer(f'{url}&page_size=1'), list(queryset.values_list('id', flat=True)))
+
+    def test_ordenamiento_no_permitido(self):
+        for url in ['/api/pacientes/?ordering=correo', '/api/async/pacientes/?ordering=-correo']:
+            with self.subTest(url=url):
+                response = self.client.get(url, headers={'accept': 'application/json'})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('ordering', response.json())
+        # Las vistas HTML ignoran el valor y usan el orden por defecto
+        response = self.client.get('/consultas/?ordering=diagnostico')
+        self.assertEqual(response.status_code, 200)
+        esperado = list(Consulta_Medica.objects.order_by('-fecha_consulta', '-id')[:25])
+        self.assertEqual(list(response.context['object_list']), esperado)
+
+# ======================================================================
+# DATOS SINTÉTICOS Y BENCHMARK DE CARGA (comandos sembrar_datos y benchmark_carga)
+# ======================================================================
+
+class SembrarDatosTests(TestCase):
+    """La carga con COPY respeta las FK y deja los datos listos para medir."""
+
+    def test_sembrar_y_medir(self):
+        call_command(
+            'sembrar_datos', consultas=300, pacientes=30, medicos=5, medicamentos=10, stdout=StringIO(),
+        )
+        self.assertEqual(Consulta_Medica.objects.count(), 300)
+        self.assertEqual(Paciente.objects.count(), 30)
+        # Solo las consultas realizadas tienen recetas, y las secuencias siguen después de los IDs cargados
+        self.assertFalse(Receta_Medica.objects.exclude(consulta__estado='REALIZADA').exists())
+        self.assertTrue(Receta_Medica.objects.exists())
+        Paciente.objects.create(
+            rut='1-9', nombre='Nuevo', apellido='Paciente', fecha_nacimiento=date(2000, 1, 1),
+            tipo_sangre='O+', correo='nuevo@test.cl',
+        )
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as salida:
+            call_command('benchmark_carga', repeticiones=1, solo='consulta', salida=salida.name, stdout=StringIO())
+            casos = json.load(open(salida.name))['casos']
+        self.assertIn('api:consulta_medica-list?ordering=medico', casos)
+        self.assertFalse([nombre for nombre, caso in casos.items() if 'error' in caso])
+
+# ======================================================================
+# LECTURAS EN RÉPLICAS (ReplicaRouter + LecturaEnReplicaMiddleware)
+# Se verifican las decisiones del router; en las pruebas las réplicas son
+# espejos del primario (TEST['MIRROR']), así que no se consulta otra base.
+# ======================================================================
+
+@override_settings(CLINICA_DB_REPLICAS=['replica_1'], CLINICA_REPLICA_FIJACION_SEGUNDOS=5)
+class ReplicaRouterTests(SimpleTestCase):
+    """Las lecturas seguras van a la réplica; las escrituras y lo que sigue a ellas, al primario."""
+
+    def atender(self, request, escribir=False):
+        """Pasa el request por el middleware y retorna (base usada para leer, response)."""
+        usadas = {}
+        def vista(request):
+            if escribir:
+                ReplicaRouter().db_for_write(Paciente)
+            usadas['lectura'] = ReplicaRouter().db_for_read(Paciente)
+            return HttpResponse()
+        response = LecturaEnReplicaMiddleware(vista)(request)
+        return usadas['lectura'], response
+
+    def test_fuera_de_un_request_lee_del_primario(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Paciente), 'default')
+
+    def test_get_lee_de_la_replica(self):
+        lectura, response = self.atender(RequestFactory().get('/api/pacientes/'))
+        self.assertEqual(lectura, 'replica_1')
+        self.assertNotIn(LecturaEnReplicaMiddleware.COOKIE_FIJACION, response.cookies)
+
+    def test_escritura_fija_al_primario_durante_la_ventana(self):
+        lectura, response = self.atender(RequestFactory().post('/api/pacientes/'))
+        self.assertEqual(lectura, 'default')
+        cookie = response.cookies[LecturaEnReplicaMiddleware.COOKIE_FIJACION]
+        self.assertEqual(cookie['max-age'], 5)
+
+        fijado = RequestFactory().get('/api/pacientes/')
+        fijado.COOKIES[cookie.key] = cookie.value
+        self.assertEqual(self.atender(fijado)[0], 'default')
+
+        vencido = RequestFactory().get('/api/pacientes/')
+        vencido.COOKIES[cookie.key] = str(time.time() - 1)
+        self.assertEqual(self.atender(vencido)[0], 'replica_1')
+
+    def test_escritura_en_un_get_lee_del_primario_y_fija(self):
+        lectura, response = self.atender(RequestFactory().get('/api/pacientes/'), escribir=True)
+        self.assertEqual(lectura, 'default')
+        self.assertIn(LecturaEnReplicaMiddleware.COOKIE_FIJACION, response.cookies)
+
+    def test_cache_se_llena_desde_el_primario(self):
+        def vista(request):
+            with leer_del_primario():
+                dentro = ReplicaRouter().db_for_read(Paciente)
+            return HttpResponse(f'{dentro}|{ReplicaRouter().db_for_read(Paciente)}')
+        response = LecturaEnReplicaMiddleware(vista)(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'default|replica_1')
+
+    @override_settings(CLINICA_DB_REPLICAS=['replica_1', 'replica_2'])
+    def test_una_replica_por_request(self):
+        def vista(request):
+            return HttpResponse(','.join(sorted({ReplicaRouter().db_for_read(Paciente) for _ in range(20)})))
+        with patch('clinica.routers.random.choice', side_effect=['replica_2', 'replica_1']) as elegir:
+            primera = LecturaEnReplicaMiddleware(vista)(RequestFactory().get('/'))
+            segunda = LecturaEnReplicaMiddleware(vista)(RequestFactory().get('/'))
+        self.assertEqual((primera.content, segunda.content), (b'replica_2', b'replica_1'))
+        self.assertEqual(elegir.call_count, 2)
+
+# ======================================================================
+# PRESUPUESTO DE CONSULTAS DE LAS VISTAS HTML (ConsultasSQLMiddleware)
+# Con el monitor en modo estricto, una vista que supera su atributo
+# 'presupuesto_consultas' lanza PresupuestoConsultasExcedido y la prueba falla.
+# ======================================================================
+
+@override_settings(CLINICA_MONITOR_SQL=True, CLINICA_PRESUPUESTO_ESTRICTO=True)
+class PresupuestoListasHTMLTests(DatosClinicaMixin, TestCase):
+    """Recorre los listados HTML con datos y verifica sus presupuestos de consultas."""
+
+    def test_listados_dentro_del_presupuesto(self):
+        for url in [
+            '/departamentos/', '/especialidades/', '/pacientes/', '/medicos/',
+            '/consultas/', '/tratamientos/', '/medicamentos/', '/recetas/',
+        ]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['X-SQL-N-Mas-1'], '0')
+
+    def test_exceso_de_presupuesto_falla(self):
+        with patch.object(PacienteListView, 'presupuesto_consultas', 0):
+            with self.assertRaises(PresupuestoConsultasExcedido):
+                self.client.get('/pacientes/')
+
+# ======================================================================
+# TIEMPOS POR FASE (Server-Timing) Y MÉTRICAS DE PROMETHEUS (/metrics/)
+# ======================================================================
+
+@override_settings(CLINICA_METRICAS=True)
+class MetricasTests(DatosClinicaMixin, TestCase):
+    """Cabecera Server-Timing por request e histograma por ruta en /metrics/."""
+
+    def fases(self, response):
+        return {metrica.split(';')[0].strip(): metrica for metrica in response['Server-Timing'].split(',')}
+
+    def test_server_timing(self):
+        paciente = Consulta_Medica.objects.first().paciente_id
+        fases = self.fases(self.client.get(f'/api/consultas/?paciente={paciente}', headers={'accept': 'application/json'}))
+        self.assertTrue({'db', 'filtros', 'serializacion', 'render', 'total'} <= set(fases))
+        self.assertRegex(fases['db'], r'SQL \([1-9]\d* consultas\)')
+
+        html = self.fases(self.client.get('/consultas/'))
+        self.assertTrue({'db', 'filtros', 'render', 'total'} <= set(html))
+        self.assertIn('serializacion', self.fases(self.client.get('/api/async/consultas/')))
+
+    def test_endpoint_metricas(self):
+        self.client.get('/api/pacientes/', headers={'accept': 'application/json'})
+        response = self.client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        texto = response.content.decode()
+        self.assertIn('# TYPE clinica_request_duracion_segundos histogram', texto)
+        self.assertRegex(
+            texto, r'clinica_request_duracion_segundos_count\{ruta="paciente-list",metodo="GET",codigo="200"\} [1-9]'
+        )
+        self.assertIn('clinica_fase_segundos_total{ruta="paciente-list",fase="serializacion"}', texto)
+
+        self.assertEqual(self.client.get('/metrics/', REMOTE_ADDR='10.0.0.1').status_code, 404)
+        with self.settings(CLINICA_METRICAS=False):
+            response = Client().get('/metrics/') # El cliente carga los middleware en su primer request
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn('Server-Timing', response)
+
+# ======================================================================
+# BÚSQUEDA UNIFICADA (Documento_Busqueda, mantenido por señales)
+# ======================================================================
+
+class BusquedaClinicaTests(DatosClinicaMixin, TestCase):
+    """Los documentos siguen a cada escritura y la búsqueda usa una sola consulta SQL."""
+
+    def buscar(self, **parametros):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/busqueda/', parametros, headers={'accept': 'application/json'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['resultados']
+
+    def test_documentos_se_actualizan(self):
+        consulta = Consulta_Medica.objects.select_related('paciente').first()
+        paciente = consulta.paciente
+        resultados = self.buscar(q=paciente.nombre)
+        self.assertEqual(resultados[0]['tipo'], 'paciente')
+        self.assertEqual({r['paciente']['id'] for r in resultados}, {paciente.pk})
+
+        tratamiento = Tratamiento.objects.create(consulta=consulta, descripcion='Kinesioterapia respiratoria', duracion_dias=10)
+        self.assertEqual([r['consulta']['id'] for r in self.buscar(q='kinesioterapia')], [consulta.pk])
+        medicamento = consulta.receta_medica_set.get().medicamento
+        medicamento.nombre = 'Salbutamol'
+        medicamento.save()
+        self.assertEqual([r['consulta']['id'] for r in self.buscar(q='salbutamol')], [consulta.pk])
+        paciente.apellido = 'Valdivia'
+        paciente.save()
+        self.assertEqual(len(self.buscar(q='valdivia -salbutamol')), 1) # Solo el documento del paciente
+
+        tratamiento.delete()
+        self.assertEqual(self.buscar(q='kinesioterapia'), [])
+        Consulta_Medica.objects.filter(pk=consulta.pk).delete() # Cascada: tratamientos, recetas y documento
+        self.assertEqual(self.buscar(q='salbutamol'), [])
+        self.assertEqual(self.client.get('/api/busqueda/?q=a').status_code, 400)
+
+    def test_reindexar(self):
+        esperados = sorted(Documento_Busqueda.objects.values_list('paciente_id', 'consulta_id', 'documento'), key=str)
+        Documento_Busqueda.objects.all().delete()
+        call_command('reindexar_busqueda', stdout=StringIO())
+        self.assertEqual(sorted(Documento_Busqueda.objects.values_list('paciente_id', 'consulta_id', 'documento'), key=str), esperados)
+
+# ======================================================================
+# LÍNEA DE TIEMPO DEL PACIENTE (/api/pacientes/<id>/timeline/)
+# ======================================================================
+
+class TimelinePacienteTests(DatosClinicaMixin, TestCase):
+    """Consultas con tratamientos y recetas anidados en un número fijo de consultas SQL por página."""
+
+    def test_recorrido_hacia_atras(self):
+        paciente = Paciente.objects.first()
+        medicamento = Medicamento.objects.first()
+        for medico in Medico.objects.all()[:5]: # Seis consultas en total, de distintos médicos
+            consulta = Consulta_Medica.objects.create(paciente=paciente, medico=medico, motivo='Control')
+            Tratamiento.objects.create(consulta=consulta, descripcion='Reposo', duracion_dias=3)
+            Receta_Medica.objects.create(consulta=consulta, medicamento=medicamento, dosis='1', frecuencia='8h', duracion='5 días')
+        esperadas = list(
+            Consulta_Medica.objects.filter(paciente=paciente).order_by('-fecha_consulta', '-id').values_list('id', flat=True)
+        )
+
+        vistas, url = [], f'/api/pacientes/{paciente.pk}/timeline/?page_size=4'
+        while url:
+            with self.assertNumQueries(4): # Paciente, consultas, tratamientos y recetas
+                datos = self.client.get(url, headers={'accept': 'application/json'}).json()
+            self.assertEqual(datos['paciente']['rut'], paciente.rut)
+            vistas += [consulta['id'] for consulta in datos['results']]
+            url = datos['next']
+        self.assertEqual(vistas, esperadas)
+
+        primera = self.client.get(f'/api/pacientes/{paciente.pk}/timeline/', headers={'accept': 'application/json'}).json()['results'][0]
+        self.assertEqual(primera['recetas'][0]['medicamento_nombre'], medicamento.nombre)
+        self.assertEqual(primera['tratamientos'][0]['descripcion'], 'Reposo')
+        self.assertEqual(primera['especialidad_nombre'], Medico.objects.get(pk=primera['medico']).especialidad.nombre)
+        self.assertEqual(self.client.get('/api/pacientes/0/timeline/').status_code, 404)
+
+# ======================================================================
+# BÚSQUEDA DE TEXTO COMPLETO EN CONSULTAS (?buscar=, columna generada 'busqueda')
+# ======================================================================
+
+class BusquedaTextoConsultaTests(DatosClinicaMixin, TestCase):
+    """Coincidencia por raíz, orden por relevancia y combinación con los demás filtros."""
+
+    def test_buscar_por_relevancia(self):
+        paciente, medico = Paciente.objects.first(), Medico.objects.first()
+        en_diagnostico = Consulta_Medica.objects.create(
+            paciente=paciente, medico=medico, motivo='Control', diagnostico='Dolores lumbares cronicos',
+        )
+        en_motivo = Consulta_Medica.objects.create(paciente=paciente, medico=medico, motivo='Dolor lumbar, dolor lumbar al agacharse')
+        antigua = Consulta_Medica.objects.create(paciente=paciente, medico=medico, motivo='Dolor lumbar')
+        Consulta_Medica.objects.filter(pk=antigua.pk).update(fecha_consulta=datetime(2020, 1, 1, tzinfo=dt_timezone.utc))
+
+        ids = lambda url: [fila['id'] for fila in self.client.get(url, headers={'accept': 'application/json'}).json()['results']]
+        # 'dolores' y 'dolor' comparten raíz; el motivo (peso A) pesa más que el diagnóstico (peso B)
+        self.assertEqual(ids('/api/consultas/?buscar=dolores'), [en_motivo.pk, antigua.pk, en_diagnostico.pk])
+        self.assertCountEqual(ids('/api/consultas/?buscar=dolor -cronico'), [en_motivo.pk, antigua.pk])
+        self.assertCountEqual(ids('/api/consultas/?buscar=dolor&fecha_consulta_min=2024-01-01T00:00:00'), [en_motivo.pk, en_diagnostico.pk])
+
+        # El cursor avanza sobre (relevancia, id) y las vistas HTML y asíncrona filtran igual
+        vistas, url = [], '/api/consultas/?buscar=dolor&page_size=1'
+        while url:
+            datos = self.client.get(url, headers={'accept': 'application/json'}).json()
+            vistas += [fila['id'] for fila in datos['results']]
+            url = datos['next']
+        self.assertEqual(vistas, [en_motivo.pk, antigua.pk, en_diagnostico.pk])
+        self.assertEqual(ids('/api/async/consultas/?buscar=dolor'), vistas)
+        self.assertEqual([c.pk for c in self.client.get('/consultas/?buscar=dolor').context['object_list']], vistas)
+
+# ======================================================================
+# RESERVA DE STOCK (Receta_Medica.reservar_stock, Medicamento.ajustar_stock)
+# El stock solo cambia con UPDATE relativos: una edición del medicamento
+# con el valor leído antes no pisa las reservas hechas desde entonces.
+# ======================================================================
+
+class ReservaStockTests(TestCase):
+    """Reservas de las recetas, stock insuficiente y ediciones desactualizadas del medicamento."""
+
+    @classmethod
+    def setUpTestData(cls):
+        especialidad = Especialidad.objects.create(nombre='Medicina General')
+        medico = Medico.objects.create(rut='3-5', nombre='Ana', apellido='Rojas', correo='ana@test.cl', especialidad=especialidad)
+        paciente = Paciente.objects.create(
+            rut='4-3', nombre='Luis', apellido='Soto', fecha_nacimiento=date(1980, 5, 5), tipo_sangre='A+', correo='luis@test.cl',
+        )
+        cls.consulta = Consulta_Medica.objects.create(paciente=paciente, medico=medico, motivo='Control')
+        cls.medicamento = Medicamento.objects.create(
+            nombre='Paracetamol', laboratorio='Lab', stock=10, precio_unitario=Decimal('2.50'),
+        )
+
+    def stock(self):
+        return Medicamento.objects.values_list('stock', flat=True).get(pk=self.medicamento.pk)
+
+    def recetar(self, cantidad):
+        return Receta_Medica.objects.create(
+            consulta=self.consulta, medicamento=self.medicamento, dosis='1', frecuencia='8h', duracion='5 días', cantidad=cantidad,
+        )
+
+    def test_reserva_edicion_y_baja(self):
+        receta = self.recetar(3)
+        self.assertEqual(self.stock(), 7)
+        # Dos ediciones con la misma lectura: la segunda devuelve lo que dejó la primera, no lo que leyó
+        primera, segunda = Receta_Medica.objects.get(pk=receta.pk), Receta_Medica.objects.get(pk=receta.pk)
+        primera.cantidad = 5
+        primera.save()
+        self.assertEqual(self.stock(), 5)
+        segunda.cantidad = 2
+        segunda.save()
+        self.assertEqual(self.stock(), 8)
+        segunda.delete()
+        self.assertEqual(self.stock(), 10)
+
+    def test_stock_insuficiente(self):
+        with self.assertRaises(StockInsuficiente):
+            self.recetar(11)
+        response = APIClient().post('/api/recetas/', {
+            'consulta': self.consulta.pk, 'medicamento': self.medicamento.pk,
+            'dosis': '1', 'frecuencia': '8h', 'duracion': '5 días', 'cantidad': 11,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cantidad', response.json())
+        self.assertEqual(self.stock(), 10)
+        self.assertFalse(Receta_Medica.objects.exists())
+
+    def test_edicion_desactualizada_no_pisa_el_stock(self):
+        self.recetar(3)
+        # Formulario HTML y PUT enviados con el stock leído antes de la reserva (10)
+        formulario = {'nombre': 'Paracetamol', 'laboratorio': 'Lab', 'stock': 10, 'precio_unitario': '3.00'}
+        response = self.client.post(f'/medicamentos/{self.medicamento.pk}/editar/', formulario)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stock(), 7)
+        self.assertEqual(Medicamento.objects.get(pk=self.medicamento.pk).precio_unitario, Decimal('3.00'))
+
+        api = APIClient()
+        response = api.put(f'/api/medicamentos/{self.medicamento.pk}/', {**formulario, 'stock': 10}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['stock'], self.stock()), (7, 7))
+
+        # Los cambios de stock son diferencias explícitas
+        response = api.patch(f'/api/medicamentos/{self.medicamento.pk}/', {'ajuste_stock': -2}, format='json')
+        self.assertEqual((response.json()['stock'], self.stock()), (5, 5))
+        response = api.patch(f'/api/medicamentos/{self.medicamento.pk}/', {'ajuste_stock': -6, 'nombre': 'Otro'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ajuste_stock', response.json())
+        self.assertEqual(Medicamento.objects.values_list('nombre', 'stock').get(pk=self.medicamento.pk), ('Paracetamol', 5))
+
+        response = self.client.post(f'/medicamentos/{self.medicamento.pk}/editar/', {**formulario, 'ajuste_stock': 5})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.stock(), 10)
+        response = api.patch('/api/medicamentos/bulk/', [{'id': self.medicamento.pk, 'stock': 99, 'ajuste_stock': -1}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(), 9)
+        response = self.client.post(f'/medicamentos/{self.medicamento.pk}/editar/', {**formulario, 'ajuste_stock': -11})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ajuste_stock', response.context['form'].errors)
+        self.assertEqual(self.stock(),9)
+
+    def test_bajas_en_cascada_y_por_queryset_devuelven_stock(self):
+        self.recetar(3)
+        self.recetar(2)
+        self.assertEqual(self.stock(), 5)
+        Receta_Medica.objects.filter(cantidad=3).delete()
+        self.assertEqual(self.stock(), 8)
+        self.consulta.delete() # Cascada: no llama a Receta_Medica.delete()
+        self.assertEqual(self.stock(), 10)
+
+    def test_cambio_directo_de_stock(self):
+        medicamento = Medicamento.objects.get(pk=self.medicamento.pk)
+        self.recetar(3) # Reserva hecha después de leer el medicamento
+        medicamento.stock += 5
+        medicamento.save()
+        self.assertEqual((medicamento.stock, self.stock()), (12, 12))
+        medicamento.stock = 0
+        medicamento.save()
+        self.assertEqual(self.stock(), 0)
+        medicamento.stock = -1
+        with self.assertRaises(StockInsuficiente):
+            medicamento.save()
+        self.assertEqual(self.stock(), 0)
+
+    def test_guardar_medicamento_eliminado_lo_inserta(self):
+        medicamento = Medicamento.objects.create(nombre='Ibuprofeno', laboratorio='Lab', stock=4, precio_unitario=Decimal('1.00'))
+        Medicamento.objects.filter(pk=medicamento.pk).delete()
+        medicamento.save()
+        self.assertEqual(Medicamento.objects.values_list('stock', flat=True).get(pk=medicamento.pk), 4)
+
+# ======================================================================
+# RUT NORMALIZADO (búsqueda by-rut y unicidad entre formatos)
+# ======================================================================
+
+class RutNormalizadoTests(TestCase):
+    """El mismo RUT en cualquier formato encuentra al registro y no puede repetirse."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.especialidad = Especialidad.objects.create(nombre='Cardiología')
+        cls.paciente = Paciente.objects.create(
+            rut='12.345.678-k', nombre='Rosa', apellido='Pérez', fecha_nacimiento=date(1975, 3, 3),
+            tipo_sangre='B+', correo='rosa@test.cl',
+        )
+        cls.medico = Medico.objects.create(
+            rut='9.876.543-2', nombre='Juan', apellido='Díaz', correo='juan@test.cl', especialidad=cls.especialidad,
+        )
+
+    def test_by_rut_en_cualquier_formato(self):
+        for recurso, objeto, formatos in [
+            ('pacientes', self.paciente, ['12.345.678-K', '12345678-k', '12345678K']),
+            ('medicos', self.medico, ['9.876.543-2', '9876543-2', '98765432']),
+        ]:
+            for rut in formatos:
+                with self.subTest(recurso=recurso, rut=rut):
+                    response = APIClient().get(f'/api/{recurso}/by-rut/{rut}/')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.json()['id'], objeto.pk)
+        self.assertEqual(APIClient().get('/api/pacientes/by-rut/11111111-1/').status_code, 404)
+
+    def test_rut_repetido_en_otro_formato(self):
+        paciente = {
+            'rut': '12345678-K', 'nombre': 'Otra', 'apellido': 'Persona', 'fecha_nacimiento': '1990-01-01',
+            'tipo_sangre': 'O+', 'correo': 'otra@test.cl',
+        }
+        medico = {'rut': '98765432', 'nombre': 'Otro', 'apellido': 'Médico', 'correo': 'otro@test.cl', 'especialidad': self.especialidad.pk}
+        api = APIClient()
+        for url, datos in [('/api/pacientes/', paciente), ('/api/medicos/', medico)]:
+            with self.subTest(url=url):
+                response = api.post(url, datos, format='json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('rut', response.json())
+        response = api.post('/api/pacientes/bulk/', [paciente], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('rut', response.json()[0])
+        for url, datos in [('/pacientes/crear/', paciente), ('/medicos/crear/', medico)]:
+            with self.subTest(url=url):
+                response = self.client.post(url, datos)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('rut', response.context['form'].errors)
+        self.assertEqual((Paciente.objects.count(), Medico.objects.count()), (1, 1))
+
+        # El propio registro puede reescribir su RUT en otro formato
+        response = api.patch(f'/api/pacientes/{self.paciente.pk}/', {'rut': '12345678-K'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(f'/medicos/{self.medico.pk}/editar/', {**medico, 'rut': '9876543-2', 'correo': 'juan@test.cl'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Medico.objects.get(pk=self.medico.pk).rut, '9876543-2')
+
+# ======================================================================
+# POSICIONES DEL CURSOR (KeysetCursorPagination)
+# La posición es una lista JSON: los textos con separadores, las comillas
+# y los NULL vuelven intactos y las páginas no saltan ni repiten filas.
+# ======================================================================
+
+class PosicionCursorTests(TestCase):
+    """Codificación de la posición y recorrido por una clave que acepta NULL, hacia adelante y hacia atrás."""
+
+    def test_codificar_y_decodificar(self):
+        fecha = datetime(2025, 6, 1, 10, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        valores = ['A|x', 'comillas " y , [corchetes]', 'ñandú', None, 3.25, 7, fecha, date(2000, 2, 29), Decimal('1.50')]
+        self.assertEqual(
+            decodificar_posicion(codificar_posicion(valores)),
+            [*valores[:6], '2025-06-01T10:30:15.123456+00:00', '2000-02-29', '1.50'],
+        )
+        self.assertIsNone(decodificar_posicion('A|x'))
+
+    def test_cursor_alterado(self):
+        # Posiciones armadas a mano: 404 'Invalid cursor', nunca un error 500
+        Paciente.objects.create(rut='1-9', nombre='Uno', apellido='Prueba', fecha_nacimiento=date(1990, 1, 1), correo='uno@test.cl')
+        casos = [
+            ('/api/consultas/', '["abc",1]'), # Fecha inválida
+            ('/api/pacientes/', '["x"]'), # ID no numérico
+            ('/api/pacientes/', '[{"a":1}]'), # Objeto en lugar de un valor
+            ('/api/pacientes/', '[[1]]'),
+            ('/api/pacientes/', '[1,2]'), # Largo distinto al ordenamiento
+            ('/api/pacientes/', 'A|x'), # No es JSON
+            ('/api/pacientes/?buscar=uno', '["mucho",1]'), # Anotación 'similitud'
+            ('/api/async/pacientes/', '["x"]'),
+        ]
+        for url, posicion in casos:
+            cursor = base64.b64encode(urlencode({'p': posicion}).encode()).decode()
+            with self.subTest(url=url, posicion=posicion):
+                response = APIClient().get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json()['detail'], KeysetCursorPagination.invalid_cursor_message)
+
+    def recorrer(self, paginacion, queryset, hacia_atras=False):
+        """IDs de todas las páginas siguiendo 'next' (o 'previous' desde la última página)."""
+        url, ids, paginas = '/api/especialidades/?page_size=2', [], []
+        while url:
+            paginador = paginacion()
+            pagina = paginador.paginate_queryset(queryset, Request(RequestFactory().get(url)))
+            paginas.append([objeto.pk for objeto in pagina])
+            url = paginador.get_next_link()
+        if not hacia_atras:
+            return [pk for pagina in paginas for pk in pagina]
+        while url := paginador.get_previous_link():
+            paginador = paginacion()
+            pagina = paginador.paginate_queryset(queryset, Request(RequestFactory().get(url)))
+            ids = [objeto.pk for objeto in pagina] + ids
+        return paginas[-1] if not ids else ids + paginas[-1]
+
+    def test_clave_con_null(self):
+        departamentos = [Departamento.objects.create(nombre=f'Departamento {i}') for i in range(2)]
+        for i in range(7): # Tres especialidades sin departamento
+            Especialidad.objects.create(nombre=f'Especialidad {i}', departamento=departamentos[i % 2] if i > 2 else None)
+        for orden in [('departamento_id', 'id'), ('-departamento_id', '-id')]:
+            paginacion = type('Paginacion', (KeysetCursorPagination,), {'ordering': orden})
+            esperado = list(Especialidad.objects.order_by(*orden).values_list('id', flat=True))
+            with self.subTest(orden=orden):
+                self.assertEqual(self.recorrer(paginacion, Especialidad.objects.all()), esperado)
+                self.assertEqual(self.recorrer(paginacion, Especialidad.objects.all(), hacia_atras=True), esperado)
+
+# ======================================================================
+# RESPUESTAS CONDICIONALES (ETag / If-None-Match)
+# ======================================================================
+
+@override_settings(CLINICA_CACHE_COMPARTIDA=True) # Las pruebas corren en un solo proceso
+class RespuestaCondicionalTests(DatosClinicaMixin, TestCase):
+    """304 sin cuerpo con el ETag vigente; 200 con datos cuando el ETag ya no corresponde."""
+
+    def test_sin_validadores_con_cache_por_proceso(self):
+        # LocMemCache: otro worker pudo escribir sin renovar las versiones de este proceso
+        paciente = Paciente.objects.first()
+        for compartida, backend in [(None, 'locmem.LocMemCache'), (None, 'dummy.DummyCache'), (False, 'locmem.LocMemCache')]:
+            caches = {'default': {'BACKEND': f'django.core.cache.backends.{backend}'}}
+            with self.subTest(backend=backend), self.settings(CACHES=caches, CLINICA_CACHE_COMPARTIDA=compartida):
+                response = APIClient().get(f'/api/pacientes/{paciente.pk}/', headers={'if-none-match': '*'})
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('ETag', response)
+                self.assertNotIn('Last-Modified', response)
+
+    def test_etag_vigente_y_obsoleto(self):
+        client = APIClient()
+        paciente = Paciente.objects.order_by('id').first()
+        for url in ['/api/pacientes/', f'/api/pacientes/{paciente.pk}/']:
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+
+                response = client.get(url, headers={'if-none-match': etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+
+                # Un validador desconocido recibe la respuesta completa, no una vacía
+                response = client.get(url, headers={'if-none-match': '"otro"'})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.content)
+
+                self.assertEqual(client.patch(f'/api/pacientes/{paciente.pk}/', {'direccion': f'Calle {url}'}, format='json').status_code, 200)
+                response = client.get(url, headers={'if-none-match': etag})
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+                self.assertTrue(response.content)
+
+    def test_expand_incluye_modelos_relacionados(self):
+        client = APIClient()
+        consulta = Consulta_Medica.objects.select_related('paciente').first()
+        tratamiento = Tratamiento.objects.create(consulta=consulta, descripcion='Reposo', duracion_dias=3)
+        medico = Medico.objects.select_related('especialidad__departamento').first()
+        casos = [
+            (f'/api/tratamientos/{tratamiento.pk}/?expand=consulta', consulta.paciente),
+            (f'/api/medicos/{medico.pk}/?expand=especialidad', medico.especialidad.departamento),
+            (f'/api/recetas/?expand=consulta&fields=id,consulta', consulta.paciente),
+        ]
+        for url, relacionado in casos:
+            with self.subTest(url=url):
+                etag = client.get(url)['ETag']
+                self.assertEqual(client.get(url, headers={'if-none-match': etag}).status_code, 304)
+                relacionado.nombre = f'{relacionado.nombre} Renombrado'
+                relacionado.save()
+                response = client.get(url, headers={'if-none-match': etag})
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(relacionado.nombre, response.content.decode())
+
+# ======================================================================
+# RESPUESTAS EN CACHÉ (RespuestaCacheadaMixin / invalidar_modelo)
+# ======================================================================
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pruebas-cache'}},
+    CLINICA_CACHE_COMPARTIDA=True, # Las pruebas corren en un solo proceso
+)
+class RespuestaCacheadaTests(DatosClinicaMixin, TestCase):
+    """La segunda lectura sale de la caché y cada forma de escribir la invalida."""
+
+    def leer(self, url):
+        """(X-Cache, datos, consultas SQL) de un GET."""
+        with CaptureQueriesContext(connection) as contexto:
+            response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['X-Cache'], response.json(), len(contexto.captured_queries)
+
+    def test_hit_e_invalidacion(self):
+        medicamento = Medicamento.objects.order_by('id').first()
+        url = f'/api/medicamentos/{medicamento.pk}/'
+        self.assertEqual(self.leer(url)[0], 'MISS')
+        self.assertEqual(self.leer(url)[::2], ('HIT', 0))
+        self.assertEqual(self.leer('/api/medicamentos/')[0], 'MISS')
+        self.assertEqual(self.leer('/api/medicamentos/')[0], 'HIT')
+
+        escrituras = [
+            ('save()', lambda: Medicamento.objects.filter(pk=medicamento.pk).first().save()),
+            ('carga masiva', lambda: APIClient().patch('/api/medicamentos/bulk/', [{'id': medicamento.pk, 'laboratorio': 'Otro'}], format='json')),
+            ('descontar_stock()', lambda: descontar_stock({medicamento.pk: 3})), # QuerySet.update(), sin señales
+        ]
+        for nombre, escribir in escrituras:
+            with self.subTest(escritura=nombre):
+                escribir()
+                actual = Medicamento.objects.values('laboratorio', 'stock').get(pk=medicamento.pk)
+                for ruta in [url, '/api/medicamentos/']:
+                    cache, datos, _ = self.leer(ruta)
+                    self.assertEqual(cache, 'MISS')
+                    fila = datos if ruta == url else next(fila for fila in datos['results'] if fila['id'] == medicamento.pk)
+                    self.assertEqual({campo: fila[campo] for campo in actual}, actual)
+                    self.assertEqual(self.leer(ruta)[0], 'HIT')
+
+    @override_settings(ALLOWED_HOSTS=['a.test', 'b.test'])
+    def test_enlaces_por_host(self):
+        # Los enlaces 'next' guardados son absolutos: cada host tiene su propia entrada
+        for host in ['a.test', 'b.test', 'a.test']:
+            with self.subTest(host=host):
+                response = APIClient().get('/api/medicamentos/?page_size=2', HTTP_HOST=host)
+                self.assertTrue(response.json()['next'].startswith(f'http://{host}/'))
+
+    @override_settings(CLINICA_CACHE_COMPARTIDA=None)
+    def test_sin_cache_por_proceso(self):
+        # LocMemCache: otro worker pudo escribir sin renovar las versiones de este proceso
+        url = f'/api/medicamentos/{Medicamento.objects.first().pk}/'
+        for _ in range(2):
+            response = APIClient().get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Cache', response)
+        self.assertEqual([error.id for error in verificar_cache_compartida(None)], ['clinica.W001'])
+        with self.settings(CLINICA_CACHE_COMPARTIDA=True):
+            self.assertEqual(verificar_cache_compartida(None), [])
+
+# ======================================================================
+# RESUMEN DIARIO DE CONSULTAS (Estadistica_Diaria_Consulta)
+# ======================================================================
+
+class EstadisticaDiariaTests(DatosClinicaMixin, TestCase):
+    """El resumen que mantienen las señales coincide con un recuento de las consultas tras cada cambio."""
+
+    def assertIgualAlRecuento(self):
+        recuento = Counter(consulta.clave_estadistica() for consulta in Consulta_Medica.objects.all())
+        resumen = {
+            (fila.fecha, fila.medico_id, fila.estado): fila.cantidad
+            for fila in Estadistica_Diaria_Consulta.objects.exclude(cantidad=0)
+        }
+        self.assertEqual(resumen, dict(recuento))
+
+    def test_resumen_igual_al_recuento(self):
+        self.assertIgualAlRecuento()
+        paciente, medico = Paciente.objects.first(), Medico.objects.order_by('id').last()
+        consulta = Consulta_Medica.objects.create(paciente=paciente, medico=medico, motivo='Alta')
+        self.assertIgualAlRecuento()
+
+        consulta.estado = 'REALIZADA'
+        consulta.save()
+        self.assertIgualAlRecuento()
+
+        consulta.fecha_consulta -= timedelta(days=3)
+        consulta.save(update_fields=['fecha_consulta'])
+        self.assertIgualAlRecuento()
+
+        # Instancia armada a mano: la clave anterior se lee de la base de datos
+        otra = Consulta_Medica.objects.exclude(pk=consulta.pk).first()
+        Consulta_Medica(pk=otra.pk, paciente_id=otra.paciente_id, medico=medico, fecha_consulta=otra.fecha_consulta,
+                        motivo=otra.motivo, estado='CANCELADA').save()
+        self.assertIgualAlRecuento()
+
+        consulta.delete()
+        self.assertIgualAlRecuento()
+        Consulta_Medica.objects.filter(medico=medico).delete()
+        self.assertIgualAlRecuento()
+
+    def test_ediciones_con_la_misma_lectura(self):
+        # La clave anterior se lee al guardar, no al cargar: la segunda edición resta la que dejó la primera
+        consulta = Consulta_Medica.objects.first()
+        primera, segunda = Consulta_Medica.objects.get(pk=consulta.pk), Consulta_Medica.objects.get(pk=consulta.pk)
+        primera.estado = 'REALIZADA'
+        primera.save()
+        segunda.estado = 'CANCELADA'
+        segunda.save()
+        self.assertIgualAlRecuento()
+
+# ======================================================================
+# CARGAS MASIVAS (CargaMasivaMixin.bulk / CargaMasivaListSerializer)
+# ======================================================================
+
+class CargaMasivaTests(DatosClinicaMixin, TestCase):
+    """Errores por elemento, consultas acotadas y hooks de lote en /bulk/."""
+
+    def pacientes(self, cantidad, desde=0):
+        return [
+            {'rut': f'3000{i:04d}-K', 'nombre': f'Masivo{i}', 'apellido': 'Lote', 'fecha_nacimiento': '1985-05-05',
+             'tipo_sangre': 'A+', 'correo': f'masivo{i}@test.cl'}
+            for i in range(desde, desde + cantidad)
+        ]
+
+    def test_errores_por_elemento(self):
+        pacientes = self.pacientes(5)
+        del pacientes[1]['nombre']
+        pacientes[2]['rut'] = '3.000.000-3' # Mismo RUT que el elemento 3 en otro formato
+        pacientes[3]['rut'] = '3000000-3'
+        pacientes[4]['rut'] = '10.000.000-k' # RUT de DatosClinicaMixin
+        response = APIClient().post('/api/pacientes/bulk/', pacientes, format='json')
+        self.assertEqual(response.status_code, 400)
+        errores = response.json()
+        self.assertEqual(errores[0], {})
+        self.assertEqual(list(errores[1]), ['nombre'])
+        self.assertIn('se repite en los elementos [2, 3]', errores[2]['rut'][0])
+        self.assertIn('se repite en los elementos [2, 3]', errores[3]['rut'][0])
+        self.assertIn('Ya existe', errores[4]['rut'][0])
+        self.assertFalse(Paciente.objects.filter(apellido='Lote').exists()) # Todo o nada
+
+    def test_consultas_acotadas(self):
+        consultas = []
+        for cantidad, desde in [(3, 0), (30, 100)]:
+            with CaptureQueriesContext(connection) as contexto:
+                response = APIClient().post('/api/pacientes/bulk/', self.pacientes(cantidad, desde), format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()['cantidad'], cantidad)
+            consultas.append(len(contexto.captured_queries))
+        self.assertEqual(consultas[0], consultas[1], 'La carga no debe hacer consultas por fila')
+
+    def test_hooks_de_lote(self):
+        api = APIClient()
+        ids = api.post('/api/pacientes/bulk/', self.pacientes(2), format='json').json()['ids']
+        self.assertEqual(
+            list(Paciente.objects.filter(pk__in=ids).order_by('id').values_list('rut_normalizado', flat=True)),
+            ['30000000K', '30000001K'],
+        )
+        self.assertEqual(self.client.get('/api/pacientes/by-rut/3.000.000-1/').status_code, 404)
+
+        # PATCH masivo: rut_normalizado recalculado y documentos de búsqueda al día
+        response = api.patch('/api/pacientes/bulk/', [{'id': ids[0], 'rut': '3.000.000-1', 'nombre': 'Anacleto'}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Paciente.objects.get(pk=ids[0]).rut_normalizado, '30000001')
+        buscar = lambda q: [r['paciente']['id'] for r in api.get('/api/busqueda/', {'q': q}).json()['resultados']]
+        self.assertEqual(buscar('anacleto'), [ids[0]])
+        self.assertEqual(buscar('masivo1'), [ids[1]])
+
+        # Medicamentos: ajuste_stock y reindexado de las consultas que lo recetan
+        receta = Receta_Medica.objects.select_related('medicamento').first()
+        stock = receta.medicamento.stock
+        response = api.patch('/api/medicamentos/bulk/', [{'id': receta.medicamento_id, 'nombre': 'Fenoterol', 'ajuste_stock': 5}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Medicamento.objects.get(pk=receta.medicamento_id).stock, stock + 5)
+        self.assertEqual([r['consulta']['id'] for r in api.get('/api/busqueda/', {'q': 'fenoterol'}).json()['resultados']], [receta.consulta_id])
+
+        # Recetas: la carga reserva stock de una vez
+        response = api.post('/api/recetas/bulk/', [
+            {'consulta': receta.consulta_id, 'medicamento': receta.medicamento_id, 'cantidad': 4, 'dosis': '1', 'frecuencia': '8h', 'duracion': '3 días'},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Medicamento.objects.get(pk=receta.medicamento_id).stock, stock + 1)
+
+# ======================================================================
+# CONTEO ESTIMADO DE LAS VISTAS HTML (ConteoEstimadoPaginator)
+# ======================================================================
+
+class ConteoEstimadoTests(DatosClinicaMixin, TestCase):
+    """Conteo exacto bajo el umbral, estimado sobre él y páginas que no dependen del total."""
+
+    def setUp(self):
+        with connection.cursor() as cursor: # reltuples de la tabla completa (ANALYZE se permite en la transacción)
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(Paciente._meta.db_table)}')
+
+    def test_conteo_exacto_bajo_el_umbral(self):
+        paginador = ConteoEstimadoPaginator(Paciente.objects.order_by('id'), 3)
+        with self.assertNumQueries(2): # Estimación + COUNT(*)
+            self.assertEqual(paginador.count, 10)
+        self.assertFalse(paginador.conteo_estimado)
+        self.assertEqual(paginador.num_pages, 4)
+        self.assertFalse(paginador.page(4).has_next())
+        with self.assertRaises(EmptyPage):
+            paginador.page(5)
+
+    @override_settings(CLINICA_CONTEO_ESTIMADO_UMBRAL=5)
+    def test_conteo_estimado_sobre_el_umbral(self):
+        ultimos = list(Paciente.objects.order_by('-id').values_list('id', flat=True)[:2])
+        Consulta_Medica.objects.filter(paciente__in=ultimos).delete()
+        Paciente.objects.filter(pk__in=ultimos).delete() # La estadística sigue contando 10
+        paginador = ConteoEstimadoPaginator(Paciente.objects.order_by('id'), 3)
+        with self.assertNumQueries(1): # Solo pg_class, sin COUNT(*)
+            self.assertEqual(paginador.count, 10)
+        self.assertTrue(paginador.conteo_estimado)
+
+        # has_next() sale de la fila extra, no del total aproximado
+        self.assertTrue(paginador.page(2).has_next())
+        self.assertEqual(len(paginador.page(3).object_list), 2)
+        self.assertFalse(paginador.page(3).has_next())
+        self.assertEqual(list(paginador.page(9).object_list), []) # Sin tope superior
+        with self.assertRaises(EmptyPage):
+            paginador.validate_number(0)
+        with self.assertRaises(PageNotAnInteger):
+            paginador.validate_number('x')
+
+    @override_settings(CLINICA_CONTEO_ESTIMADO_UMBRAL=1)
+    def test_conteo_estimado_con_filtros(self):
+        paginador = ConteoEstimadoPaginator(Paciente.objects.filter(nombre__startswith='Paciente').order_by('id'), 3)
+        with self.assertNumQueries(1): # EXPLAIN del queryset filtrado
+            self.assertGreaterEqual(paginador.count, 1)
+        self.assertTrue(paginador.conteo_estimado)
+
+# ======================================================================
+# AUTOCOMPLETADO (/api/autocompletar/...)
+# ======================================================================
+
+class AutocompletarTests(DatosClinicaMixin, TestCase):
+    """Filtro por prefijo de ?q=, tamaño de página y cursor 'next'."""
+
+    def leer(self, url):
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_filtro_por_prefijo(self):
+        paciente = Paciente.objects.get(nombre='Paciente3')
+        casos = [
+            ('/api/autocompletar/pacientes/?q=paciente3', [paciente.pk]), # Sin distinguir mayúsculas
+            ('/api/autocompletar/pacientes/?q=10000003', [paciente.pk]), # Por RUT
+            ('/api/autocompletar/pacientes/?q=aciente', []), # Solo prefijos
+            ('/api/autocompletar/medicamentos/?q=medicamento 7', list(Medicamento.objects.filter(nombre='Medicamento 7').values_list('id', flat=True))),
+            ('/api/autocompletar/consultas/?q=paciente3', list(paciente.consulta_medica_set.values_list('id', flat=True))),
+        ]
+        for url, esperados in casos:
+            with self.subTest(url=url):
+                self.assertEqual([fila['id'] for fila in self.leer(url)['results']], esperados)
+        fila = self.leer('/api/autocompletar/pacientes/?q=paciente3')['results'][0]
+        self.assertEqual(fila, {'id': paciente.pk, 'texto': str(paciente)})
+
+    def test_paginas_por_cursor(self):
+        datos = self.leer('/api/autocompletar/medicos/?q=medico&page_size=4')
+        self.assertEqual(len(datos['results']), 4)
+        self.assertIn('q=medico', datos['next']) # El cursor conserva el filtro
+        ids = [fila['id'] for fila in datos['results']]
+        while datos['next']:
+            datos = self.leer(datos['next'])
+            ids += [fila['id'] for fila in datos['results']]
+        self.assertEqual(sorted(ids), sorted(Medico.objects.values_list('id', flat=True)))
+        self.assertEqual(len(ids), len(set(ids)))
+
+# ======================================================================
+# BÚSQUEDA APROXIMADA POR TRIGRAMAS (?buscar= de Pacientes y Médicos)
+# ======================================================================
+
+class BusquedaTrigramasTests(DatosClinicaMixin, TestCase):
+    """Resultados tolerantes a errores de tipeo, ordenados por similitud y desempate por ID."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ids = {}
+        for i, (nombre, apellido) in enumerate([('Gonzalez', 'Rojas'), ('Ana', 'Gonzales'), ('Gonzalo', 'Rojas'), ('Gonzalez', 'Munoz'), ('Pedro', 'Perez')]):
+            cls.ids[f'{nombre} {apellido}'] = Paciente.objects.create(
+                rut=f'4000000{i}-K', nombre=nombre, apellido=apellido, fecha_nacimiento=date(1980, 1, 1),
+                tipo_sangre='B+', correo=f'trigramas{i}@test.cl',
+            ).pk
+
+    def test_orden_por_similitud(self):
+        resultados = list(busqueda_trigramas(Paciente.objects.all(), ' gonzalez ', ['nombre', 'apellido', 'rut']))
+        ids = [paciente.pk for paciente in resultados]
+        # Coincidencia exacta primero (empate resuelto por ID), luego el error de tipeo
+        self.assertEqual(ids[:3], [self.ids['Gonzalez Rojas'], self.ids['Gonzalez Munoz'], self.ids['Ana Gonzales']])
+        self.assertNotIn(self.ids['Pedro Perez'], ids)
+        similitudes = [paciente.similitud for paciente in resultados]
+        self.assertEqual(similitudes, sorted(similitudes, reverse=True))
+        self.assertEqual(similitudes[0], 1.0)
+        # Texto vacío: el queryset no cambia
+        self.assertEqual(busqueda_trigramas(Paciente.objects.order_by('id'), '  ', ['nombre']).count(), 15)
+
+    def test_paginas_de_la_api(self):
+        esperados = list(
+            busqueda_trigramas(Paciente.objects.all(), 'gonzales', ['nombre', 'apellido', 'rut']).values_list('id', flat=True)
+        )
+        self.assertEqual(esperados[:3], [self.ids['Ana Gonzales'], self.ids['Gonzalez Rojas'], self.ids['Gonzalez Munoz']])
+        # La similitud (float) es la posición del cursor: las páginas siguen el mismo orden
+        ids, url = [], '/api/pacientes/?buscar=gonzales&page_size=1'
+        while url:
+            datos = APIClient().get(url).json()
+            ids += [fila['id'] for fila in datos['results']]
+            url = datos['next']
+        self.assertEqual(ids, esperados)
+
+# ======================================================================
+# EXPORTACIÓN EN STREAMING (GET <recurso>/export/?formato=csv|ndjson)
+# ======================================================================
+
+class ExportacionTests(DatosClinicaMixin, TestCase):
+    """Contenido, cabeceras y filtros de la exportación síncrona."""
+
+    def exportar(self, url, tipo):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.is_async)
+        self.assertEqual(response['Content-Type'], tipo)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        consulta = Consulta_Medica.objects.order_by('id').first()
+        Consulta_Medica.objects.filter(pk=consulta.pk).update(motivo='Dolor, "agudo"\nen la noche')
+        response, contenido = self.exportar('/api/consultas/export/?formato=csv', 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="consultas.csv"')
+        filas = list(csv.reader(StringIO(contenido)))
+        self.assertEqual(filas[0], [encabezado for encabezado, _ in ConsultaMedicaViewSet.columnas_exportacion])
+        self.assertEqual([int(fila[0]) for fila in filas[1:]], sorted(Consulta_Medica.objects.values_list('id', flat=True)))
+        self.assertEqual(filas[1][3], 'Dolor, "agudo"\nen la noche') # Escapado estándar de CSV
+        self.assertEqual(filas[1][7], consulta.paciente.nombre)
+
+    def test_ndjson_con_filtros(self):
+        receta = Receta_Medica.objects.select_related('medicamento').order_by('id').last()
+        response, contenido = self.exportar(f'/api/recetas/export/?formato=ndjson&medicamento={receta.medicamento_id}', 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="recetas.ndjson"')
+        filas = [json.loads(linea) for linea in contenido.splitlines()]
+        self.assertEqual([fila['id'] for fila in filas], [receta.pk])
+        self.assertEqual(filas[0]['medicamento_nombre'], receta.medicamento.nombre)
+        self.assertEqual(list(filas[0]), [encabezado for encabezado, _ in RecetaMedicaViewSet.columnas_exportacion])
+
+        _, contenido = self.exportar('/api/consultas/export/?formato=ndjson', 'application/x-ndjson')
+        fila = json.loads(contenido.splitlines()[0])
+        consulta = Consulta_Medica.objects.order_by('id').first()
+        self.assertEqual(fila['fecha_consulta'], DjangoJSONEncoder().default(consulta.fecha_consulta))
+        self.assertEqual(self.client.get('/api/consultas/export/?formato=xml').status_code, 400)
@@ -15,7 +15,23 @@ from .views import (
     
     # Importación de los 8 ViewSets API
     DepartamentoViewSet, EspecialidadViewSet, PacienteViewSet, MedicoViewSet, ConsultaMedicaViewSet,
-    TratamientoViewSet, MedicamentoViewSet, RecetaMedicaViewSet
+    TratamientoViewSet, MedicamentoViewSet, RecetaMedicaViewSet,
+
+    # Endpoints de autocompletado para los selectores de llaves foráneas
+    PacienteAutocompletarView, MedicoAutocompletarView, MedicamentoAutocompletarView,
+    ConsultaMedicaAutocompletarView,
+
+    # Resumen precalculado de consultas por estado
+    EstadisticasConsultasView,
+
+    # Búsqueda unificada (pacientes, consultas, tratamientos y recetas)
+    BusquedaClinicaView,
+
+    # Lecturas asíncronas (ASGI)
+    PacienteAsincronoView, MedicoAsincronoView, ConsultaMedicaAsincronaView, ConsultaMedicaExportacionAsincronaView,
+
+    # Métricas del proceso (Prometheus)
+    MetricasView
 )
 
 # Router para las rutas API de Django REST Framework
@@ -36,7 +52,21 @@ urlpatterns = [
     # -----------------------------------------------------------
     # RUTAS DE LA API
     # -----------------------------------------------------------
+    path('api/autocompletar/pacientes/', PacienteAutocompletarView.as_view(), name='autocompletar-pacientes'),
+    path('api/autocompletar/medicos/', MedicoAutocompletarView.as_view(), name='autocompletar-medicos'),
+    path('api/autocompletar/medicamentos/', MedicamentoAutocompletarView.as_view(), name='autocompletar-medicamentos'),
+    path('api/autocompletar/consultas/', ConsultaMedicaAutocompletarView.as_view(), name='autocompletar-consultas'),
+    path('api/estadisticas/consultas/', EstadisticasConsultasView.as_view(), name='estadisticas-consultas'),
+    path('api/busqueda/', BusquedaClinicaView.as_view(), name='busqueda'),
+    path('api/async/pacientes/', PacienteAsincronoView.as_view(), name='async-paciente-list'),
+    path('api/async/pacientes/<int:pk>/', PacienteAsincronoView.as_view(), name='async-paciente-detail'),
+    path('api/async/medicos/', MedicoAsincronoView.as_view(), name='async-medico-list'),
+    path('api/async/medicos/<int:pk>/', MedicoAsincronoView.as_view(), name='async-medico-detail'),
+    path('api/async/consultas/', ConsultaMedicaAsincronaView.as_view(), name='async-consulta-list'),
+    path('api/async/consultas/export/', ConsultaMedicaExportacionAsincronaView.as_view(), name='async-consulta-export'),
+    path('api/async/consultas/<int:pk>/', ConsultaMedicaAsincronaView.as_view(), name='async-consulta-detail'),
     path('api/', include(router.urls)), 
+    path('metrics/', MetricasView.as_view(), name='metricas'),
 
     # -----------------------------------------------------------
     # RUTAS CRUD (TEMPLATES HTML) - 32 rutas definidas
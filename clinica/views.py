@@ -1,16 +1,36 @@
 # Bloque de Importaciones Estándar de Django y Librerías Externas
 # ======================================================================
+import hashlib # ETag a partir de las versiones de los modelos
+from asgiref.sync import sync_to_async # Validación de filtros que consultan la BD desde las vistas asíncronas
+from django.conf import settings # Tiempo de vida de la caché de respuestas
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response # Evalúa If-None-Match / If-Modified-Since
+from django.utils.http import http_date
 from django.shortcuts import render # Función básica no usada, pero estándar
+from django.views import View # Base de las vistas asíncronas de lectura
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView # Vistas basadas en clase para CRUD
+from django.shortcuts import get_object_or_404 # Retorna 404 si el objeto no existe
 from django.urls import reverse_lazy # Permite hacer redirecciones sin cargar la URL hasta que sea necesaria
-from rest_framework import viewsets # Provee las clases para crear endpoints de API REST
+from django.core.exceptions import ValidationError as DjangoValidationError # Errores que lanza el modelo al guardar
+from django.db import IntegrityError, router, transaction # Las cargas masivas se escriben en una sola transacción
+from django.db.models import F, Prefetch, Q, Sum, Value # Q: condiciones OR para la búsqueda por prefijo; Sum: totales del resumen
+from django.db.models.functions import Concat
+from django.contrib.postgres.search import SearchQuery, SearchRank # Búsqueda unificada sobre Documento_Busqueda
+from rest_framework import generics, status, viewsets # Provee las clases para crear endpoints de API REST
+from rest_framework.decorators import action # Rutas adicionales dentro de un ViewSet
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.request import Request # Las vistas asíncronas reutilizan el paginador y los serializadores de DRF
+from rest_framework.response import Response
+from rest_framework.serializers import as_serializer_error
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend # Backend para habilitar filtrado en las APIs
 
 # Bloque de Importaciones Locales de la Aplicación 'clinica'
 # ======================================================================
 from .models import (
     Departamento, Especialidad, Paciente, Medico, Consulta_Medica,
-    Tratamiento, Medicamento, Receta_Medica
+    Tratamiento, Medicamento, Receta_Medica, Estadistica_Diaria_Consulta, ESTADO_CONSULTA_CHOICES, normalizar_rut,
+    Documento_Busqueda, CONFIG_BUSQUEDA
 ) # Importación de todos los modelos de la base de datos
 from .forms import (
     DepartamentoForm, EspecialidadForm, PacienteForm, MedicoForm, ConsultaMedicaForm,
@@ -18,24 +38,60 @@ from .forms import (
 ) # Importación de los formularios para las vistas Create/Update
 from .serializers import (
     DepartamentoSerializer, EspecialidadSerializer, PacienteSerializer, MedicoSerializer, ConsultaMedicaSerializer,
-    TratamientoSerializer, MedicamentoSerializer, RecetaMedicaSerializer
+    TratamientoSerializer, MedicamentoSerializer, RecetaMedicaSerializer, AutocompletarSerializer,
+    EstadisticasConsultasParametrosSerializer, BusquedaParametrosSerializer, PlanLectura, pk_entero,
+    TimelinePacienteSerializer, TimelineConsultaSerializer, CamposDinamicosMixin
 ) # Importación de los serializadores para las vistas de la API (DRF)
 from .filters import (
     DepartamentoFilter, EspecialidadFilter, PacienteFilter, MedicoFilter, ConsultaMedicaFilter,
     TratamientoFilter, MedicamentoFilter, RecetaMedicaFilter
 ) # Importación de los filtros (django-filters) para búsquedas en vistas HTML y la API
+from .filters import (
+    ORDENAMIENTO_DEPARTAMENTO, ORDENAMIENTO_ESPECIALIDAD, ORDENAMIENTO_PACIENTE, ORDENAMIENTO_MEDICO,
+    ORDENAMIENTO_CONSULTA, ORDENAMIENTO_TRATAMIENTO, ORDENAMIENTO_MEDICAMENTO, ORDENAMIENTO_RECETA,
+    OrdenamientoIndexadoFilter, OrdenamientoInvalido, con_desempate, resolver_ordenamiento
+) # Ordenamiento validado (?ordering=) compartido por las vistas HTML y la API
+from .cache import cache_clinica, cache_compartida, clave_respuesta, versiones_modelos # Caché de respuestas y versiones por modelo
+from .metricas import medir_fase, metricas_proceso # Fases de Server-Timing y GET /metrics/
+from .routers import leer_del_primario # Las respuestas que se guardan en la caché se leen del primario
+from .exportacion import (
+    FORMATOS_EXPORTACION, respuesta_exportacion, respuesta_exportacion_asincrona
+) # Exportación CSV/NDJSON en streaming
+from .pagination import (
+    ConsultaMedicaCursorPagination, ConteoEstimadoPaginator, KeysetCursorPagination
+) # Paginación por cursor para la API y por número de página (con conteo estimado) para las vistas HTML
 
 # ======================================================================
 # VISTAS BASADAS EN TEMPLATES (CRUD HTML) - LÓGICA DE FILTRADO
 # ======================================================================
 
-# --- Mixin para Filtrado y Ordenamiento ---
+# --- Mixin para Errores de Validación al Guardar ---
+class ValidacionAlGuardarFormMixin:
+    """
+    Para CreateView/UpdateView: si el modelo lanza ValidationError al guardar
+    (ej: StockInsuficiente), el error se muestra en el formulario en lugar de
+    producir un error 500.
+    """
+    def form_valid(self, form):
+        try:
+            return super().form_valid(form)
+        except DjangoValidationError as error:
+            form.add_error(None, error)
+            return self.form_invalid(form)
+
+# --- Mixin para Filtrado, Ordenamiento y Paginación ---
 class FilteredListViewMixin:
     """
-    Mixin para aplicar filtros de django-filters y ordenamiento (sorting)
-    a cualquier vista ListView que herede de él.
+    Mixin para aplicar filtros de django-filters, ordenamiento (sorting) y
+    paginación a cualquier vista ListView que herede de él.
     """
     filterset_class = None # Se debe definir la clase FilterSet específica en la subclase
+    campos_ordenamiento = {} # Valores aceptados de ?ordering= (ver clinica/filters.py)
+    paginate_by = 25 # Filas por página: el template solo materializa la página actual
+    paginator_class = ConteoEstimadoPaginator # Usa el conteo estimado de PostgreSQL en tablas grandes
+    # Máximo de consultas SQL por request (lo controla ConsultasSQLMiddleware si está activo).
+    # Es constante: no debe depender de la cantidad de filas de la página.
+    presupuesto_consultas = 10
     
     def get_queryset(self):
         """
@@ -43,7 +99,10 @@ class FilteredListViewMixin:
         basado en los parámetros GET de la solicitud (URL).
         """
         queryset = super().get_queryset()
-        
+        with medir_fase('filtros'):
+            return self._filtrar_y_ordenar(queryset)
+
+    def _filtrar_y_ordenar(self, queryset):
         # 1. Aplicar Filtrado (Search)
         # Crea una instancia del filtro usando los parámetros de la URL (self.request.GET)
         self.filterset = self.filterset_class(self.request.GET, queryset=queryset)
@@ -51,10 +110,23 @@ class FilteredListViewMixin:
         
         # 2. Aplicar Ordenamiento (Sorting)
         ordering = self.request.GET.get('ordering', None)
+        orden = None
         if ordering:
-            queryset = queryset.order_by(ordering)
-            
-        return queryset
+            try:
+                orden = resolver_ordenamiento(ordering, self.campos_ordenamiento)
+            except OrdenamientoInvalido:
+                pass # Un valor fuera de la lista (ej: editado en la URL) usa el orden por defecto
+        if orden is None:
+            # Orden del filtro o del modelo, con el ID como desempate: sin un orden
+            # total las páginas no serían estables entre requests
+            orden = con_desempate(queryset.query.order_by or queryset.model._meta.ordering)
+        return queryset.order_by(*orden)
+
+    def get_context_data(self, **kwargs):
+        """Expone el FilterSet como 'filter' para que el template dibuje su formulario."""
+        context = super().get_context_data(**kwargs)
+        context['filter'] = self.filterset
+        return context
 
 # ======================================================================
 # VISTAS BASADAS EN TEMPLATES (CRUD HTML) - IMPLEMENTACIÓN POR ENTIDAD
@@ -67,6 +139,7 @@ class DepartamentoListView(FilteredListViewMixin, ListView):
     template_name = 'clinica/departamento_list.html'
     context_object_name = 'object_list' # Nombre de la variable que contendrá los datos en el template
     filterset_class = DepartamentoFilter # Clase de filtro específica para esta lista
+    campos_ordenamiento = ORDENAMIENTO_DEPARTAMENTO
 class DepartamentoCreateView(CreateView):
     """Permite crear un nuevo Departamento."""
     model = Departamento
@@ -107,9 +180,11 @@ class DepartamentoDeleteView(DeleteView):
 class EspecialidadListView(FilteredListViewMixin, ListView):
     """Muestra una lista de Especialidades con soporte para filtrado."""
     model = Especialidad
+    queryset = Especialidad.objects.select_related('departamento') # El template muestra el departamento
     template_name = 'clinica/especialidad_list.html'
     context_object_name = 'object_list'
     filterset_class = EspecialidadFilter
+    campos_ordenamiento = ORDENAMIENTO_ESPECIALIDAD
 class EspecialidadCreateView(CreateView):
     """Permite crear una nueva Especialidad."""
     model = Especialidad
@@ -153,6 +228,7 @@ class PacienteListView(FilteredListViewMixin, ListView):
     template_name = 'clinica/paciente_list.html'
     context_object_name = 'object_list'
     filterset_class = PacienteFilter
+    campos_ordenamiento = ORDENAMIENTO_PACIENTE
 class PacienteCreateView(CreateView):
     """Permite crear un nuevo Paciente."""
     model = Paciente
@@ -193,9 +269,11 @@ class PacienteDeleteView(DeleteView):
 class MedicoListView(FilteredListViewMixin, ListView):
     """Muestra una lista de Médicos con soporte para filtrado."""
     model = Medico
+    queryset = Medico.objects.select_related('especialidad') # El template muestra la especialidad
     template_name = 'clinica/medico_list.html'
     context_object_name = 'object_list'
     filterset_class = MedicoFilter
+    campos_ordenamiento = ORDENAMIENTO_MEDICO
 class MedicoCreateView(CreateView):
     """Permite crear un nuevo Médico."""
     model = Medico
@@ -236,9 +314,11 @@ class MedicoDeleteView(DeleteView):
 class ConsultaMedicaListView(FilteredListViewMixin, ListView):
     """Muestra una lista de Consultas Médicas con soporte para filtrado."""
     model = Consulta_Medica
+    queryset = Consulta_Medica.objects.select_related('paciente', 'medico') # El template muestra ambos
     template_name = 'clinica/consultamedica_list.html'
     context_object_name = 'object_list'
     filterset_class = ConsultaMedicaFilter
+    campos_ordenamiento = ORDENAMIENTO_CONSULTA
 class ConsultaMedicaCreateView(CreateView):
     """Permite crear una nueva Consulta Médica."""
     model = Consulta_Medica
@@ -282,6 +362,7 @@ class TratamientoListView(FilteredListViewMixin, ListView):
     template_name = 'clinica/tratamiento_list.html'
     context_object_name = 'object_list'
     filterset_class = TratamientoFilter
+    campos_ordenamiento = ORDENAMIENTO_TRATAMIENTO
 class TratamientoCreateView(CreateView):
     """Permite crear un nuevo Tratamiento."""
     model = Tratamiento
@@ -325,6 +406,7 @@ class MedicamentoListView(FilteredListViewMixin, ListView):
     template_name = 'clinica/medicamento_list.html'
     context_object_name = 'object_list'
     filterset_class = MedicamentoFilter
+    campos_ordenamiento = ORDENAMIENTO_MEDICAMENTO
 class MedicamentoCreateView(CreateView):
     """Permite crear un nuevo Medicamento."""
     model = Medicamento
@@ -337,7 +419,7 @@ class MedicamentoCreateView(CreateView):
         context['model_name'] = 'Medicamento'
         context['cancel_url'] = reverse_lazy('medicamento-list')
         return context
-class MedicamentoUpdateView(UpdateView):
+class MedicamentoUpdateView(ValidacionAlGuardarFormMixin, UpdateView):
     """Permite editar un Medicamento existente."""
     model = Medicamento
     form_class = MedicamentoForm
@@ -365,10 +447,12 @@ class MedicamentoDeleteView(DeleteView):
 class RecetaMedicaListView(FilteredListViewMixin, ListView):
     """Muestra una lista de Recetas Médicas con soporte para filtrado."""
     model = Receta_Medica
+    queryset = Receta_Medica.objects.select_related('medicamento') # El template muestra el medicamento
     template_name = 'clinica/recetamedica_list.html'
     context_object_name = 'object_list'
     filterset_class = RecetaMedicaFilter
-class RecetaMedicaCreateView(CreateView):
+    campos_ordenamiento = ORDENAMIENTO_RECETA
+class RecetaMedicaCreateView(ValidacionAlGuardarFormMixin, CreateView):
     """Permite crear una nueva Receta Médica."""
     model = Receta_Medica
     form_class = RecetaMedicaForm
@@ -380,7 +464,7 @@ class RecetaMedicaCreateView(CreateView):
         context['model_name'] = 'Receta Médica'
         context['cancel_url'] = reverse_lazy('recetamedica-list')
         return context
-class RecetaMedicaUpdateView(UpdateView):
+class RecetaMedicaUpdateView(ValidacionAlGuardarFormMixin, UpdateView):
     """Permite editar una Receta Médica existente."""
     model = Receta_Medica
     form_class = RecetaMedicaForm
@@ -410,50 +494,649 @@ class RecetaMedicaDeleteView(DeleteView):
 
 # Implementación de ViewSets (API REST) para cada modelo.
 # ModelViewSet provee automáticamente las operaciones CRUD (list, create, retrieve, update, destroy).
+# Todos paginan por cursor sobre 'id' (DEFAULT_PAGINATION_CLASS en settings.py),
+# salvo las Consultas Médicas, que paginan sobre (fecha_consulta, id).
+
+# --- Mixin para Búsqueda Exacta por RUT ---
+class BusquedaPorRutMixin:
+    """
+    Agrega la ruta GET <recurso>/by-rut/<rut>/ a un ViewSet cuyo modelo tenga
+    'rut_normalizado'. Acepta el RUT en cualquier formato ('12.345.678-9',
+    '12345678-9', '123456789') y lo resuelve con una sola búsqueda en el índice único.
+    """
+    @action(detail=False, methods=['get'], url_path=r'by-rut/(?P<rut>[0-9kK.\- ]+)')
+    def by_rut(self, request, rut=None):
+        instancia = get_object_or_404(self.get_queryset(), rut_normalizado=normalizar_rut(rut))
+        serializer = self.get_serializer(instancia)
+        return Response(serializer.data)
+
+# --- Mixin para Cargas Masivas ---
+class CargaMasivaMixin:
+    """
+    Agrega la ruta <recurso>/bulk/ a un ViewSet cuyo serializador use
+    CargaMasivaListSerializer:
+    - POST con una lista de objetos: los crea.
+    - PATCH con una lista de objetos con 'id': actualiza solo los campos enviados.
+    Todo se valida antes de escribir (errores por elemento, HTTP 400) y se
+    escribe con bulk_create/bulk_update por lotes dentro de una transacción:
+    la carga completa se aplica o no se aplica.
+    """
+    max_elementos_carga = 50000 # Tope de elementos por solicitud
+
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk')
+    def bulk(self, request):
+        datos = request.data
+        if request.method == 'PATCH':
+            # Las instancias a actualizar se leen con una sola consulta
+            ids = [pk_entero(elemento.get('id')) for elemento in datos if isinstance(elemento, dict)] \
+                if isinstance(datos, list) else []
+            instancias = self.get_queryset().in_bulk([pk for pk in ids if pk is not None])
+            serializer = self.get_serializer(
+                instancias, data=datos, many=True, partial=True, max_length=self.max_elementos_carga
+            )
+        else:
+            serializer = self.get_serializer(data=datos, many=True, max_length=self.max_elementos_carga)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            with transaction.atomic():
+                objetos = serializer.save()
+        except IntegrityError as error:
+            # Una fila que otro request escribió entre la validación y la escritura (ej: el mismo rut_normalizado)
+            raise ValidationError({'non_field_errors': [f'La carga viola una restricción de la base de datos: {error}']})
+        except DjangoValidationError as error:
+            # Validaciones del modelo sobre el lote completo (ej: StockInsuficiente)
+            raise ValidationError(as_serializer_error(error))
+
+        codigo = status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK
+        return Response({'cantidad': len(objetos), 'ids': [objeto.pk for objeto in objetos]}, status=codigo)
+
+def modelos_de_la_respuesta(vista):
+    """
+    'modelos_version' de la vista más los modelos que lee su serializador con
+    los ?fields= / ?expand= del request (ver CamposDinamicosMixin.modelos_leidos):
+    renombrar el departamento invalida /api/medicos/<id>/?expand=especialidad.
+    """
+    modelos = list(vista.modelos_version)
+    serializer = vista.get_serializer()
+    if isinstance(serializer, CamposDinamicosMixin):
+        modelos += [modelo for modelo in serializer.modelos_leidos() if modelo not in modelos]
+    return modelos
+
+# --- Mixin para GET Condicional (ETag / Last-Modified) ---
+class RespuestaCondicionalMixin:
+    """
+    Agrega ETag y Last-Modified a list() y retrieve(), y responde 304 Not
+    Modified si el cliente ya tiene la versión vigente (If-None-Match /
+    If-Modified-Since). Ambos se calculan con las versiones de los modelos
+    de la respuesta (ver modelos_de_la_respuesta y clinica/cache.py), sin
+    consultar la base de datos ni serializar el cuerpo. El ETag es fuerte: distingue la URL completa
+    (filtros, cursor) y el formato de la respuesta. Si las versiones no son
+    compartidas entre procesos (ver cache_compartida) no se agregan validadores.
+    """
+    modelos_version = [] # Modelos cuyos cambios modifican la respuesta
+
+    def _validadores(self, request, modelos):
+        """(ETag, Last-Modified como timestamp) de la representación pedida."""
+        versiones = versiones_modelos(modelos)
+        firma = f'{type(self).__name__}|{request.get_full_path()}|{request.accepted_media_type}|{versiones}'
+        etag = f'"{hashlib.md5(firma.encode()).hexdigest()}"'
+        return etag, max(versiones) // 1_000_000_000
+
+    def _respuesta_condicional(self, request, generar, modelos=None):
+        """'modelos' reemplaza a los de la vista en acciones que leen otras tablas (ej: timeline)."""
+        if not cache_compartida(): # Otro worker pudo escribir sin que este proceso lo sepa
+            return generar()
+        etag, ultima_modificacion = self._validadores(request, modelos or modelos_de_la_respuesta(self))
+        validadores = HttpResponse()
+        validadores['ETag'] = etag
+        validadores['Last-Modified'] = http_date(ultima_modificacion)
+        no_modificada = get_conditional_response(
+            request, etag=etag, last_modified=ultima_modificacion, response=validadores
+        )
+        if no_modificada is not validadores:
+            # Sin condiciones que apliquen, Django retorna la misma respuesta recibida
+            return no_modificada # 304 (o 412 si la precondición falla)
 
-class DepartamentoViewSet(viewsets.ModelViewSet):
+        response = generar()
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            response['Last-Modified'] = validadores['Last-Modified']
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_condicional(request, lambda: super(RespuestaCondicionalMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._respuesta_condicional(request, lambda: super(RespuestaCondicionalMixin, self).retrieve(request, *args, **kwargs))
+
+# --- Mixin para Respuestas en Caché (datos de referencia) ---
+class RespuestaCacheadaMixin:
+    """
+    Guarda en la caché los datos de las respuestas de list() y retrieve().
+    La clave incluye la URL completa y la versión de cada modelo de la
+    respuesta (ver modelos_de_la_respuesta), que las señales incrementan al
+    guardar o eliminar (ver clinica/cache.py): una lectura repetida no toca
+    la base de datos y nunca sirve datos anteriores a la última escritura.
+    Requiere una caché compartida entre procesos (ver cache_compartida); sin
+    ella las respuestas se generan siempre. La cabecera X-Cache indica HIT o MISS.
+    """
+    modelos_version = [] # Modelos cuyos cambios invalidan la respuesta
+
+    def _respuesta_cacheada(self, request, generar):
+        if not cache_compartida(): # Otro worker pudo escribir sin que este proceso lo sepa
+            return generar()
+        clave = clave_respuesta(type(self).__name__, modelos_de_la_respuesta(self), request.build_absolute_uri())
+        cache = cache_clinica()
+        datos = cache.get(clave)
+        if datos is not None:
+            response = Response(datos)
+            response['X-Cache'] = 'HIT'
+            return response
+        with leer_del_primario(): # Una réplica atrasada no debe quedar guardada con la versión nueva
+            response = generar()
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(clave, response.data, getattr(settings, 'CLINICA_CACHE_SEGUNDOS', 300))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(request, lambda: super(RespuestaCacheadaMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(request, lambda: super(RespuestaCacheadaMixin, self).retrieve(request, *args, **kwargs))
+
+# --- Mixin para Campos Dinámicos (?fields= / ?expand=) ---
+class CamposDinamicosViewSetMixin:
+    """
+    Acompaña a CamposDinamicosMixin (serializers.py): si list() o retrieve()
+    reciben ?fields= o ?expand=, el queryset lee solo las columnas de los
+    campos pedidos (only()) y hace JOIN únicamente con las relaciones que
+    esos campos usan (select_related()), incluidas las expandidas: nunca hay
+    una consulta por fila. Se aplica después de los filtros para conservar
+    las columnas por las que ordenan (el cursor las necesita).
+    """
+    def filter_queryset(self, queryset):
+        with medir_fase('filtros'):
+            queryset = super().filter_queryset(queryset)
+        parametros = self.request.query_params
+        if self.action not in ('list', 'retrieve') or not ('fields' in parametros or 'expand' in parametros):
+            return queryset
+
+        modelo = queryset.model
+        rutas = set(self.get_serializer().rutas_modelo())
+        rutas.add(modelo._meta.pk.name)
+        # Campos de ordenamiento del queryset y del cursor
+        concretos = {nombre for campo in modelo._meta.concrete_fields for nombre in (campo.name, campo.attname)}
+        orden = [*queryset.query.order_by, *(getattr(self.paginator, 'ordering', None) or ())]
+        rutas.update(
+            campo.lstrip('-') for campo in orden if isinstance(campo, str) and campo.lstrip('-') in concretos
+        )
+        relaciones = {ruta.rsplit('__', 1)[0] for ruta in rutas if '__' in ruta}
+        queryset = queryset.select_related(None)
+        if relaciones: # select_related() sin argumentos seguiría todas las FK
+            queryset = queryset.select_related(*relaciones)
+        return queryset.only(*rutas)
+
+# --- Mixin para Listados con Lectura Rápida ---
+class ListadoRapidoMixin:
+    """
+    list() construye la respuesta desde filas de values() con el PlanLectura
+    del serializador, sin instanciar modelos ni serializar campo por campo;
+    el JSON es el mismo. Respeta filtros, ?fields= y la paginación por cursor
+    (que lee la posición de los diccionarios). Si el serializador tiene
+    campos que values() no puede resolver (ej: ?expand=), usa el camino normal.
+    """
+    def list(self, request, *args, **kwargs):
+        plan = PlanLectura.para(self.get_serializer())
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # Las columnas de ordenamiento se incluyen para calcular el cursor
+        orden = [*queryset.query.order_by, *(getattr(self.paginator, 'ordering', None) or ())]
+        columnas = dict.fromkeys([*plan.rutas, *(campo.lstrip('-') for campo in orden if isinstance(campo, str))])
+        filas = queryset.values(*columnas)
+
+        pagina = self.paginate_queryset(filas)
+        if pagina is not None:
+            return self.get_paginated_response(plan.representar(pagina))
+        return Response(plan.representar(filas))
+
+class DepartamentoViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, RespuestaCacheadaMixin, viewsets.ModelViewSet):
     """Endpoint de la API para la gestión de Departamentos."""
     queryset = Departamento.objects.all()
     serializer_class = DepartamentoSerializer
+    campos_ordenamiento = ORDENAMIENTO_DEPARTAMENTO
+    modelos_version = [Departamento]
 
-class EspecialidadViewSet(viewsets.ModelViewSet):
+class EspecialidadViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, RespuestaCacheadaMixin, viewsets.ModelViewSet):
     """Endpoint de la API para la gestión de Especialidades."""
-    queryset = Especialidad.objects.all()
+    # select_related: 'departamento_nombre' se lee en el mismo JOIN (evita N+1)
+    queryset = Especialidad.objects.select_related('departamento')
     serializer_class = EspecialidadSerializer
+    campos_ordenamiento = ORDENAMIENTO_ESPECIALIDAD
+    modelos_version = [Especialidad, Departamento] # Incluye 'departamento_nombre'
 
-class PacienteViewSet(viewsets.ModelViewSet):
+# --- Mixin para Exportación en Streaming ---
+class ExportacionMixin:
+    """
+    Agrega la ruta GET <recurso>/export/?formato=csv|ndjson a un ViewSet.
+    Aplica el mismo FilterSet que el listado y exporta 'columnas_exportacion'
+    sin paginar, leyendo con un cursor del servidor (ver clinica/exportacion.py).
+    """
+    columnas_exportacion = [] # Pares (encabezado, lookup del ORM)
+    nombre_exportacion = 'exportacion' # Nombre del archivo descargado, sin extensión
+
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        # 'formato' y no 'format': DRF reserva 'format' para elegir el renderer
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in FORMATOS_EXPORTACION:
+            raise ValidationError({'formato': [f"Formato no soportado. Opciones: {', '.join(FORMATOS_EXPORTACION)}."]})
+        # Orden por llave primaria: el recorrido completo sigue el índice de la PK
+        queryset = self.filter_queryset(self.get_queryset()).order_by('pk')
+        # Las filas se leen después de que el request terminó: se fija ahora la base (réplica o primario)
+        queryset = queryset.using(router.db_for_read(queryset.model))
+        return respuesta_exportacion(queryset, self.columnas_exportacion, formato, self.nombre_exportacion)
+
+class PacienteViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, BusquedaPorRutMixin, CargaMasivaMixin, ListadoRapidoMixin, viewsets.ModelViewSet):
     """Endpoint de la API para la gestión de Pacientes, con soporte para filtrado."""
     queryset = Paciente.objects.all()
     serializer_class = PacienteSerializer
-    filter_backends = [DjangoFilterBackend] # Habilita el backend de filtrado
+    campos_ordenamiento = ORDENAMIENTO_PACIENTE
+    filter_backends = [DjangoFilterBackend, OrdenamientoIndexadoFilter] # Habilita el filtrado y el ordenamiento
     filterset_class = PacienteFilter # Clase de filtro para este ViewSet
+    modelos_version = [Paciente]
+    # Tablas que lee la línea de tiempo: cualquier cambio en ellas renueva su ETag
+    modelos_timeline = [Paciente, Consulta_Medica, Medico, Especialidad, Tratamiento, Receta_Medica, Medicamento]
+
+    @action(detail=True, methods=['get'], pagination_class=ConsultaMedicaCursorPagination, filter_backends=[])
+    def timeline(self, request, pk=None):
+        """
+        GET /api/pacientes/<id>/timeline/: consultas del paciente de la más
+        reciente a la más antigua, cada una con su médico, tratamientos y
+        recetas (con el nombre del medicamento). El enlace 'next' retrocede en
+        el tiempo por cursor (fecha_consulta, id), con el mismo costo en
+        cualquier punto del historial. Cuatro consultas SQL por página sin
+        importar su tamaño: paciente, consultas (JOIN médico y especialidad),
+        tratamientos y recetas (JOIN medicamento) de las consultas de la página.
+        """
+        return self._respuesta_condicional(request, lambda: self._timeline(request), self.modelos_timeline)
+
+    def _timeline(self, request):
+        paciente = self.get_object()
+        consultas = (
+            Consulta_Medica.objects.filter(paciente=paciente)
+            .select_related('medico__especialidad')
+            .prefetch_related(
+                Prefetch('tratamiento_set', queryset=Tratamiento.objects.order_by('id')),
+                Prefetch('receta_medica_set', queryset=Receta_Medica.objects.select_related('medicamento').order_by('id')),
+            )
+        )
+        pagina = self.paginate_queryset(consultas) # El prefetch se hace solo para las consultas de la página
+        return Response({
+            'paciente': TimelinePacienteSerializer(paciente).data,
+            **self.paginator.datos_paginados(TimelineConsultaSerializer(pagina, many=True).data),
+        })
 
-class MedicoViewSet(viewsets.ModelViewSet):
+class MedicoViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, BusquedaPorRutMixin, ListadoRapidoMixin, viewsets.ModelViewSet):
     """Endpoint de la API para la gestión de Médicos, con soporte para filtrado."""
-    queryset = Medico.objects.all()
+    queryset = Medico.objects.select_related('especialidad') # 'especialidad_nombre' sin consultas por fila
     serializer_class = MedicoSerializer
-    filter_backends = [DjangoFilterBackend]
+    campos_ordenamiento = ORDENAMIENTO_MEDICO
+    filter_backends = [DjangoFilterBackend, OrdenamientoIndexadoFilter]
     filterset_class = MedicoFilter
+    modelos_version = [Medico, Especialidad] # Incluye 'especialidad_nombre'
 
-class ConsultaMedicaViewSet(viewsets.ModelViewSet):
-    """Endpoint de la API para la gestión de Consultas Médicas, con soporte para filtrado."""
-    queryset = Consulta_Medica.objects.all()
+class ConsultaMedicaViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, ExportacionMixin, ListadoRapidoMixin, viewsets.ModelViewSet):
+    """Endpoint de la API para la gestión de Consultas Médicas, con soporte para filtrado y exportación."""
+    # Los nombres completos de paciente y médico se obtienen en el mismo JOIN
+    queryset = Consulta_Medica.objects.select_related('paciente', 'medico')
     serializer_class = ConsultaMedicaSerializer
-    filter_backends = [DjangoFilterBackend]
+    campos_ordenamiento = ORDENAMIENTO_CONSULTA
+    filter_backends = [DjangoFilterBackend, OrdenamientoIndexadoFilter]
     filterset_class = ConsultaMedicaFilter
+    pagination_class = ConsultaMedicaCursorPagination # Más recientes primero, igual que el ordering del modelo
+    modelos_version = [Consulta_Medica, Paciente, Medico] # Incluye los nombres completos
+    nombre_exportacion = 'consultas'
+    columnas_exportacion = [
+        ('id', 'id'),
+        ('fecha_consulta', 'fecha_consulta'),
+        ('estado', 'estado'),
+        ('motivo', 'motivo'),
+        ('diagnostico', 'diagnostico'),
+        ('paciente_id', 'paciente_id'),
+        ('paciente_rut', 'paciente__rut'),
+        ('paciente_nombre', 'paciente__nombre'),
+        ('paciente_apellido', 'paciente__apellido'),
+        ('medico_id', 'medico_id'),
+        ('medico_nombre', 'medico__nombre'),
+        ('medico_apellido', 'medico__apellido'),
+    ]
 
-class TratamientoViewSet(viewsets.ModelViewSet):
+class TratamientoViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, viewsets.ModelViewSet):
     """Endpoint de la API para la gestión de Tratamientos."""
     queryset = Tratamiento.objects.all()
     serializer_class = TratamientoSerializer
+    campos_ordenamiento = ORDENAMIENTO_TRATAMIENTO
+    modelos_version = [Tratamiento]
 
-class MedicamentoViewSet(viewsets.ModelViewSet):
+class MedicamentoViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, RespuestaCacheadaMixin, CargaMasivaMixin, viewsets.ModelViewSet):
     """Endpoint de la API para la gestión de Medicamentos."""
     queryset = Medicamento.objects.all()
     serializer_class = MedicamentoSerializer
+    campos_ordenamiento = ORDENAMIENTO_MEDICAMENTO
+    modelos_version = [Medicamento]
 
-class RecetaMedicaViewSet(viewsets.ModelViewSet):
-    """Endpoint de la API para la gestión de Recetas Médicas."""
-    queryset = Receta_Medica.objects.all()
+class RecetaMedicaViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, CargaMasivaMixin, ExportacionMixin, ListadoRapidoMixin, viewsets.ModelViewSet):
+    """Endpoint de la API para la gestión de Recetas Médicas, con soporte para filtrado y exportación."""
+    queryset = Receta_Medica.objects.select_related('medicamento') # 'medicamento_nombre' sin consultas por fila
     serializer_class = RecetaMedicaSerializer
+    campos_ordenamiento = ORDENAMIENTO_RECETA
+    filterset_class = RecetaMedicaFilter # Aplica también a la exportación
+    modelos_version = [Receta_Medica, Medicamento] # Incluye 'medicamento_nombre'
+    nombre_exportacion = 'recetas'
+    columnas_exportacion = [
+        ('id', 'id'),
+        ('consulta_id', 'consulta_id'),
+        ('medicamento_id', 'medicamento_id'),
+        ('medicamento_nombre', 'medicamento__nombre'),
+        ('medicamento_laboratorio', 'medicamento__laboratorio'),
+        ('dosis', 'dosis'),
+        ('frecuencia', 'frecuencia'),
+        ('duracion', 'duracion'),
+        ('cantidad', 'cantidad'),
+    ]
+
+
+# ======================================================================
+# VISTAS DE AUTOCOMPLETADO (JSON paginado para los selectores de FK)
+# Reemplazan los <select> con todas las filas de la tabla: el widget
+# AutocompletarSelect solo pide las coincidencias de lo que se escribe.
+# ======================================================================
+
+class AutocompletarView(generics.ListAPIView):
+    """
+    Base de los endpoints de autocompletado. Retorna {id, texto} de las filas
+    cuyo algún 'campos_prefijo' comienza con ?q= (UPPER(campo) LIKE 'Q%', que
+    usa los índices de trigramas), paginadas por cursor.
+    """
+    serializer_class = AutocompletarSerializer
+    campos_prefijo = [] # Se define en cada subclase
+    filter_backends = [] # Solo se filtra por ?q=
 
+    def filtro_busqueda(self, texto):
+        """Condición OR de prefijo sobre los campos de búsqueda."""
+        condicion = Q()
+        for campo in self.campos_prefijo:
+            condicion |= Q(**{f'{campo}__istartswith': texto})
+        return condicion
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        texto = self.request.query_params.get('q', '').strip()
+        if texto:
+            queryset = queryset.filter(self.filtro_busqueda(texto))
+        return queryset
+
+class PacienteAutocompletarView(AutocompletarView):
+    """Autocompletado de Pacientes por nombre, apellido o RUT."""
+    queryset = Paciente.objects.all()
+    campos_prefijo = ['nombre', 'apellido', 'rut']
+
+class MedicoAutocompletarView(AutocompletarView):
+    """Autocompletado de Médicos por nombre, apellido o RUT."""
+    queryset = Medico.objects.all()
+    campos_prefijo = ['nombre', 'apellido', 'rut']
+
+class MedicamentoAutocompletarView(RespuestaCacheadaMixin, AutocompletarView):
+    """Autocompletado de Medicamentos por nombre o laboratorio (respuestas en caché)."""
+    queryset = Medicamento.objects.all()
+    campos_prefijo = ['nombre', 'laboratorio']
+    modelos_version = [Medicamento]
+
+class ConsultaMedicaAutocompletarView(AutocompletarView):
+    """Autocompletado de Consultas Médicas por ID o por nombre/apellido del paciente."""
+    queryset = Consulta_Medica.objects.select_related('paciente') # str(consulta) muestra al paciente
+    campos_prefijo = ['paciente__nombre', 'paciente__apellido']
+    pagination_class = ConsultaMedicaCursorPagination # Las más recientes primero
+
+    def filtro_busqueda(self, texto):
+        if texto.isdigit():
+            return Q(id=int(texto))
+        return super().filtro_busqueda(texto)
+
+# ======================================================================
+# ESTADÍSTICAS DE CONSULTAS (lectura del resumen diario precalculado)
+# ======================================================================
+
+class EstadisticasConsultasView(APIView):
+    """
+    GET /api/estadisticas/consultas/?desde=AAAA-MM-DD&hasta=AAAA-MM-DD&agrupar=medico|especialidad|departamento
+    Cantidad de consultas por estado en el rango de días, agrupadas por médico,
+    especialidad o departamento. Lee Estadistica_Diaria_Consulta (una fila por
+    día, médico y estado) en lugar de agregar toda la tabla Consulta_Medica.
+    """
+    presupuesto_consultas = 1 # Una sola agregación sobre el resumen
+
+    # agrupar -> (ID del grupo, nombre del grupo), ambos vistos desde el resumen
+    AGRUPACIONES = {
+        'medico': (F('medico_id'), Concat('medico__nombre', Value(' '), 'medico__apellido')),
+        'especialidad': (F('medico__especialidad_id'), F('medico__especialidad__nombre')),
+        'departamento': (F('medico__especialidad__departamento_id'), F('medico__especialidad__departamento__nombre')),
+    }
+
+    def get(self, request):
+        parametros = EstadisticasConsultasParametrosSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        desde = parametros.validated_data.get('desde')
+        hasta = parametros.validated_data.get('hasta')
+        agrupar = parametros.validated_data['agrupar']
+
+        resumen = Estadistica_Diaria_Consulta.objects.all()
+        if desde:
+            resumen = resumen.filter(fecha__gte=desde)
+        if hasta:
+            resumen = resumen.filter(fecha__lte=hasta)
+
+        grupo_id, grupo_nombre = self.AGRUPACIONES[agrupar]
+        por_estado = {
+            estado.lower(): Sum('cantidad', filter=Q(estado=estado), default=0)
+            for estado, _ in ESTADO_CONSULTA_CHOICES
+        }
+        filas = (
+            resumen.values(grupo_id=grupo_id, nombre=grupo_nombre)
+            .annotate(**por_estado, total=Sum('cantidad', default=0))
+            .filter(total__gt=0)
+            .order_by('nombre', 'grupo_id')
+        )
+        return Response({
+            'desde': desde,
+            'hasta': hasta,
+            'agrupar': agrupar,
+            'resultados': [{'id': fila.pop('grupo_id'), **fila} for fila in filas],
+        })
+
+# ======================================================================
+# BÚSQUEDA UNIFICADA (documentos de búsqueda con tsvector e índice GIN)
+# ======================================================================
+
+class BusquedaClinicaView(APIView):
+    """
+    GET /api/busqueda/?q=texto&tipo=paciente|consulta&paciente=<id>&limite=20
+    Busca a la vez por nombre y RUT del paciente, motivo y diagnóstico de la
+    consulta, tratamientos y medicamentos recetados, con la sintaxis de
+    websearch_to_tsquery ("frase", -palabra, or). Lee solo Documento_Busqueda
+    (índice GIN) en lugar de un icontains por listado, y retorna los
+    'limite' documentos más relevantes: coincidencias en el paciente pesan
+    más que en la consulta, y estas más que en tratamientos y recetas.
+    """
+    presupuesto_consultas = 1 # Una sola lectura con JOIN a paciente y consulta
+
+    def get(self, request):
+        parametros = BusquedaParametrosSerializer(data=request.query_params)
+        parametros.is_valid(raise_exception=True)
+        datos = parametros.validated_data
+
+        consulta_texto = SearchQuery(datos['q'], config=CONFIG_BUSQUEDA, search_type='websearch')
+        documentos = Documento_Busqueda.objects.filter(documento=consulta_texto)
+        if 'tipo' in datos:
+            documentos = documentos.filter(consulta__isnull=datos['tipo'] == 'paciente')
+        if 'paciente' in datos:
+            documentos = documentos.filter(paciente_id=datos['paciente'])
+        filas = (
+            documentos.annotate(relevancia=SearchRank(F('documento'), consulta_texto))
+            # Empates: primero el paciente y luego sus consultas más recientes
+            .order_by('-relevancia', F('fecha').desc(nulls_first=True), '-id')
+            .values(
+                'relevancia', 'paciente_id', 'paciente__rut', 'paciente__nombre', 'paciente__apellido',
+                'consulta_id', 'consulta__fecha_consulta', 'consulta__motivo', 'consulta__diagnostico', 'consulta__estado',
+            )[:datos['limite']]
+        )
+        return Response({'q': datos['q'], 'resultados': [self.resultado(fila) for fila in filas]})
+
+    @staticmethod
+    def resultado(fila):
+        return {
+            'tipo': 'consulta' if fila['consulta_id'] else 'paciente',
+            'relevancia': round(fila['relevancia'], 4),
+            'paciente': {
+                'id': fila['paciente_id'], 'rut': fila['paciente__rut'],
+                'nombre': fila['paciente__nombre'], 'apellido': fila['paciente__apellido'],
+            },
+            'consulta': fila['consulta_id'] and {
+                'id': fila['consulta_id'], 'fecha_consulta': fila['consulta__fecha_consulta'],
+                'motivo': fila['consulta__motivo'], 'diagnostico': fila['consulta__diagnostico'],
+                'estado': fila['consulta__estado'],
+            },
+        }
+
+# ======================================================================
+# VISTAS ASÍNCRONAS DE LECTURA (ASGI)
+# Bajo ASGI, una vista síncrona ocupa un hilo durante todo el request. Estas
+# vistas leen con el ORM asíncrono y arman la respuesta con PlanLectura
+# (filas de values()), así que el event loop queda libre mientras se espera
+# a la base de datos o al cliente. Devuelven el mismo JSON que list() y
+# retrieve() de los ViewSets, con los mismos filtros, ?fields= y cursor;
+# ?expand= no se ofrece (requiere instancias del modelo). Bajo WSGI también
+# funcionan, pero Django las ejecuta con async_to_sync, sin ganancia.
+# ======================================================================
+
+class LecturaAsincronaView(View):
+    """
+    GET <ruta>/ (listado paginado por cursor) y GET <ruta>/<pk>/ (detalle).
+    Se configura como un ViewSet: queryset, serializer_class, filterset_class,
+    campos_ordenamiento y pagination_class.
+    """
+    queryset = None
+    serializer_class = None
+    filterset_class = None
+    campos_ordenamiento = {}
+    pagination_class = KeysetCursorPagination
+
+    async def get(self, request, pk=None):
+        peticion = Request(request) # query_params y build_absolute_uri para el serializador y el paginador
+        try:
+            plan = PlanLectura.para(self.serializer_class(context={'request': peticion}))
+        except ValidationError as error: # ?fields= o ?expand= inválidos
+            return self.respuesta(error.detail, codigo=status.HTTP_400_BAD_REQUEST)
+        if plan is None:
+            return self.respuesta(
+                {'expand': ['No disponible en la API asíncrona.']}, codigo=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = self.queryset.all()
+        if pk is not None:
+            fila = await queryset.values(*plan.rutas).filter(pk=pk).afirst()
+            if fila is None:
+                return self.respuesta({'detail': str(NotFound.default_detail)}, codigo=status.HTTP_404_NOT_FOUND)
+            return self.respuesta(plan.representar([fila])[0])
+
+        if self.filterset_class is not None and set(request.GET) & set(self.filterset_class.base_filters):
+            # Validar un ModelChoiceFilter consulta la BD con el ORM síncrono
+            queryset, errores = await sync_to_async(self.filtrar)(request, queryset)
+            if errores:
+                return self.respuesta(errores, codigo=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            with medir_fase('filtros'):
+                queryset = OrdenamientoIndexadoFilter().filter_queryset(peticion, queryset, self)
+        except ValidationError as error: # ?ordering= fuera de 'campos_ordenamiento'
+            return self.respuesta(error.detail, codigo=status.HTTP_400_BAD_REQUEST)
+
+        paginador = self.pagination_class()
+        orden = [*queryset.query.order_by, *paginador.ordering]
+        columnas = dict.fromkeys([*plan.rutas, *(campo.lstrip('-') for campo in orden if isinstance(campo, str))])
+        try:
+            pagina = await paginador.apaginate_queryset(queryset.values(*columnas), peticion, view=self)
+        except NotFound as error: # Cursor inválido
+            return self.respuesta({'detail': str(error.detail)}, codigo=status.HTTP_404_NOT_FOUND)
+        return self.respuesta(paginador.datos_paginados(plan.representar(pagina)))
+
+    def filtrar(self, request, queryset):
+        """Retorna (queryset filtrado, None) o (None, errores) si algún filtro es inválido."""
+        with medir_fase('filtros'):
+            filterset = self.filterset_class(request.GET, queryset=queryset, request=request)
+            if not filterset.is_valid():
+                return None, filterset.errors
+            return filterset.qs, None
+
+    @staticmethod
+    def respuesta(datos, codigo=status.HTTP_200_OK):
+        with medir_fase('render'): # JsonResponse codifica el JSON al crearse
+            return JsonResponse(datos, status=codigo, json_dumps_params={'ensure_ascii': False})
+
+class PacienteAsincronoView(LecturaAsincronaView):
+    queryset = Paciente.objects.all()
+    serializer_class = PacienteSerializer
+    filterset_class = PacienteFilter
+    campos_ordenamiento = ORDENAMIENTO_PACIENTE
+
+class MedicoAsincronoView(LecturaAsincronaView):
+    queryset = Medico.objects.all()
+    serializer_class = MedicoSerializer
+    filterset_class = MedicoFilter
+    campos_ordenamiento = ORDENAMIENTO_MEDICO
+
+class ConsultaMedicaAsincronaView(LecturaAsincronaView):
+    queryset = Consulta_Medica.objects.all()
+    serializer_class = ConsultaMedicaSerializer
+    filterset_class = ConsultaMedicaFilter
+    campos_ordenamiento = ORDENAMIENTO_CONSULTA
+    pagination_class = ConsultaMedicaCursorPagination
+
+class ConsultaMedicaExportacionAsincronaView(View):
+    """GET /api/async/consultas/export/?formato=csv|ndjson: misma exportación que ConsultaMedicaViewSet.export."""
+    async def get(self, request):
+        formato = request.GET.get('formato', 'csv')
+        if formato not in FORMATOS_EXPORTACION:
+            return LecturaAsincronaView.respuesta(
+                {'formato': [f"Formato no soportado. Opciones: {', '.join(FORMATOS_EXPORTACION)}."]},
+                codigo=status.HTTP_400_BAD_REQUEST,
+            )
+        queryset = Consulta_Medica.objects.all()
+        if set(request.GET) & set(ConsultaMedicaFilter.base_filters):
+            filterset = ConsultaMedicaFilter(request.GET, queryset=queryset, request=request)
+            if not await sync_to_async(filterset.is_valid)():
+                return LecturaAsincronaView.respuesta(filterset.errors, codigo=status.HTTP_400_BAD_REQUEST)
+            queryset = filterset.qs
+        return respuesta_exportacion_asincrona(
+            queryset.order_by('pk').using(router.db_for_read(Consulta_Medica)), ConsultaMedicaViewSet.columnas_exportacion, formato, 'consultas'
+        )
+
+# ======================================================================
+# MÉTRICAS DEL PROCESO (formato de texto de Prometheus)
+# ======================================================================
+
+class MetricasView(View):
+    """
+    GET /metrics/: histograma de latencia por ruta, tiempo por fase y
+    consultas SQL que acumula TiemposServidorMiddleware. Solo responde con
+    CLINICA_METRICAS activo y a las IP de CLINICA_METRICAS_IPS (el scraper
+    local); para el resto la ruta no existe.
+    """
+    def get(self, request):
+        if not settings.CLINICA_METRICAS or request.META.get('REMOTE_ADDR') not in settings.CLINICA_METRICAS_IPS:
+            return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        return HttpResponse(metricas_proceso.exposicion(), content_type='text/plain; version=0.0.4; charset=utf-8')
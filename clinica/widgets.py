@@ -0,0 +1,56 @@
+# clinica/widgets.py
+
+# Bloque de Importaciones
+# ======================================================================
+from django import forms # Clases base de widgets de Django
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+# ======================================================================
+# WIDGET DE AUTOCOMPLETADO PARA LLAVES FORÁNEAS
+# Un <select> normal de ModelChoiceField genera un <option> por cada fila de
+# la tabla. Este widget solo genera la opción seleccionada; el resto se carga
+# bajo demanda desde un endpoint de autocompletado (static/clinica/autocompletar.js).
+# ======================================================================
+
+class AutocompletarSelect(forms.Select):
+    """
+    Select que no recorre el queryset completo del campo. Recibe el nombre de
+    la URL del endpoint de autocompletado (ej: 'autocompletar-pacientes').
+    """
+    template_name = 'clinica/widgets/autocompletar_select.html'
+
+    class Media:
+        js = ['clinica/autocompletar.js']
+
+    def __init__(self, url_name, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocompletar-url'] = reverse(self.url_name)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        """Construye las opciones solo con el valor vacío y los valores seleccionados."""
+        opciones_completas = self.choices
+        queryset = getattr(opciones_completas, 'queryset', None)
+        if queryset is None:
+            return super().optgroups(name, value, attrs)
+
+        seleccionados = [valor for valor in value if valor not in ('', None)]
+        opciones = []
+        if opciones_completas.field.empty_label is not None:
+            opciones.append(('', opciones_completas.field.empty_label))
+        if seleccionados:
+            try:
+                opciones += [opciones_completas.choice(obj) for obj in queryset.filter(pk__in=seleccionados)]
+            except (ValueError, ValidationError):
+                pass # Valor inválido enviado por el usuario: el formulario reportará el error
+
+        self.choices = opciones
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = opciones_completas
@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'salud_vital.settings')
+# Bajo ASGI cada request corre en un hilo distinto: las conexiones persistentes
+# (por hilo) no se reutilizan y se acumulan; se usa el pool de psycopg
+os.environ.setdefault('CLINICA_DB_CONEXIONES', 'pool')
 
 application = get_asgi_application()
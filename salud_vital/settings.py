@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -37,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres', # Búsquedas de PostgreSQL (trigramas)
         # Mis apps
     'clinica',
     # Librerías
@@ -51,6 +54,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'clinica.middleware.TiemposServidorMiddleware', # Server-Timing y /metrics/ (solo si CLINICA_METRICAS)
+    'clinica.middleware.ConsultasSQLMiddleware', # Monitor de consultas SQL (solo si CLINICA_MONITOR_SQL)
+    'clinica.middleware.LecturaEnReplicaMiddleware', # Lecturas en réplicas (solo si hay CLINICA_DB_REPLICAS)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -82,17 +88,73 @@ WSGI_APPLICATION = 'salud_vital.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Conexión y manejo de conexiones desde variables de entorno (CLINICA_DB_*).
+# CLINICA_DB_CONEXIONES elige cómo se reutilizan las conexiones:
+#   'nueva':       una conexión por request (CONN_MAX_AGE = 0); el costo de conectar se paga siempre
+#   'persistente': cada hilo conserva su conexión CLINICA_DB_CONN_MAX_AGE segundos y la
+#                  verifica antes de reutilizarla (CONN_HEALTH_CHECKS). Adecuado para WSGI.
+#   'pool':        pool de psycopg por proceso (requiere psycopg[pool]); cada conexión se
+#                  verifica al entregarse. Recomendado bajo ASGI, donde cada request corre en
+#                  un hilo distinto y las conexiones persistentes no se reutilizarían.
+# Los límites (CLINICA_DB_POOL_MIN/MAX) son por worker: workers x MAX < max_connections de PostgreSQL.
+CLINICA_DB_CONEXIONES = os.environ.get('CLINICA_DB_CONEXIONES', 'persistente')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'eva_2',
-        'USER': 'postgres',
-        'PASSWORD': '5850',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('CLINICA_DB_NOMBRE', 'eva_2'),
+        'USER': os.environ.get('CLINICA_DB_USUARIO', 'postgres'),
+        'PASSWORD': os.environ.get('CLINICA_DB_CLAVE', '5850'),
+        'HOST': os.environ.get('CLINICA_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('CLINICA_DB_PUERTO', '5432'),
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('CLINICA_DB_CONNECT_TIMEOUT', 5)), # Segundos
+        },
     }
 }
 
+if CLINICA_DB_CONEXIONES == 'persistente':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('CLINICA_DB_CONN_MAX_AGE', 60))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True # Descarta conexiones caídas antes de usarlas
+elif CLINICA_DB_CONEXIONES == 'pool':
+    # Con el pool, CONN_HEALTH_CHECKS hace que Django lo cree con check=ConnectionPool.check_connection
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': int(os.environ.get('CLINICA_DB_POOL_MIN', 2)),
+        'max_size': int(os.environ.get('CLINICA_DB_POOL_MAX', 10)),
+        'timeout': float(os.environ.get('CLINICA_DB_POOL_TIMEOUT', 10)), # Espera máxima por una conexión libre
+        'max_idle': float(os.environ.get('CLINICA_DB_POOL_MAX_IDLE', 300)), # Cierra las sobrantes inactivas
+        'max_lifetime': float(os.environ.get('CLINICA_DB_POOL_MAX_LIFETIME', 3600)), # Renueva las conexiones
+    }
+elif CLINICA_DB_CONEXIONES != 'nueva':
+    raise ImproperlyConfigured(
+        f"CLINICA_DB_CONEXIONES debe ser 'nueva', 'persistente' o 'pool' (recibido: {CLINICA_DB_CONEXIONES!r})."
+    )
+
+# Réplicas de lectura (ver clinica/routers.py): CLINICA_DB_REPLICAS es una lista separada
+# por comas de '[nombre@]host[:puerto]'; lo que falte se toma del primario. Ejemplo local,
+# con una copia de la base en el mismo servidor: CLINICA_DB_REPLICAS=eva_2_replica@localhost
+# Cada réplica queda como 'replica_1', 'replica_2', ... con la misma configuración de conexiones.
+CLINICA_DB_REPLICAS = []
+for numero, replica in enumerate(filter(None, os.environ.get('CLINICA_DB_REPLICAS', '').split(',')), start=1):
+    nombre, _, servidor = replica.strip().rpartition('@')
+    host, _, puerto = servidor.partition(':')
+    alias = f'replica_{numero}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'NAME': nombre or DATABASES['default']['NAME'],
+        'HOST': host or DATABASES['default']['HOST'],
+        'PORT': puerto or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'}, # En las pruebas las réplicas apuntan al primario
+    }
+    CLINICA_DB_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['clinica.routers.ReplicaRouter']
+# Segundos que un cliente lee del primario después de escribir
+CLINICA_REPLICA_FIJACION_SEGUNDOS = int(os.environ.get('CLINICA_REPLICA_FIJACION_SEGUNDOS', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -139,8 +201,51 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# Paginación de las vistas HTML: sobre este número de filas (estimado por el
+# planificador de PostgreSQL) se muestra el total aproximado en vez de un COUNT(*)
+CLINICA_CONTEO_ESTIMADO_UMBRAL = 10000
+
+# Monitor de consultas SQL por request (clinica.middleware.ConsultasSQLMiddleware).
+# Opt-in: agrega cabeceras X-SQL-*, reporta patrones N+1 (consultas con la misma
+# forma repetidas CLINICA_N_MAS_1_UMBRAL veces) y controla el atributo
+# 'presupuesto_consultas' de cada vista; en modo estricto el exceso lanza un error.
+CLINICA_MONITOR_SQL = False
+CLINICA_N_MAS_1_UMBRAL = 5
+CLINICA_PRESUPUESTO_ESTRICTO = False
+
+# Tiempos por fase y métricas (clinica.middleware.TiemposServidorMiddleware, clinica/metricas.py).
+# Opt-in (CLINICA_METRICAS=1): agrega la cabecera Server-Timing (SQL, filtros,
+# serialización, render y total) y acumula por ruta el histograma de latencia
+# que GET /metrics/ expone en formato Prometheus, solo para CLINICA_METRICAS_IPS.
+CLINICA_METRICAS = os.environ.get('CLINICA_METRICAS', '') == '1'
+CLINICA_METRICAS_IPS = ['127.0.0.1', '::1']
+
+# Caché de datos de referencia y versiones de los ETag (ver clinica/cache.py).
+# LocMemCache por defecto es por proceso: con él los ETag/304, las respuestas en
+# caché y las opciones de los <select> se desactivan ('check --deploy' lo avisa).
+# Con varios workers se requiere un backend compartido:
+#   CLINICA_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#   CLINICA_CACHE_LOCATION=redis://localhost:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CLINICA_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CLINICA_CACHE_LOCATION', 'clinica'),
+    }
+}
+CLINICA_CACHE = 'default' # Alias de CACHES que usa la aplicación
+# None: se decide por el backend (LocMemCache y DummyCache no son compartidos).
+# CLINICA_CACHE_COMPARTIDA=1 solo si corre un único proceso (ej: runserver)
+CLINICA_CACHE_COMPARTIDA = {'1': True, '0': False}.get(os.environ.get('CLINICA_CACHE_COMPARTIDA', ''))
+CLINICA_CACHE_SEGUNDOS = 300 # Tiempo de vida de las respuestas (las escrituras las invalidan antes)
+
 # Configuración de DRF y Documentación
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'] # Filtros DRF
+    'DEFAULT_FILTER_BACKENDS': [
+        'django_filters.rest_framework.DjangoFilterBackend', # Filtros DRF
+        'clinica.filters.OrdenamientoIndexadoFilter', # ?ordering= validado contra 'campos_ordenamiento' de la vista
+    ],
+    # Paginación por cursor (keyset): costo constante por página a cualquier profundidad
+    'DEFAULT_PAGINATION_CLASS': 'clinica.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': 50,
 }